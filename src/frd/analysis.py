@@ -1,10 +1,8 @@
 import numpy as np
-import pandas as pd
 from pathlib import Path
 import os
 # from os.path import join
 # import pickle
-from scipy import stats
 
 import frd.save_data as save_data
 
@@ -12,26 +10,153 @@ def four_moments(array):
     '''
     Given data dict, return the mean, variance, skew, and kurtosis for ethe agreements data for each parameterization.
     '''
+    from scipy import stats #imported on first use, scipy is slow to import and only needed for analysis
     mean = np.mean(array)
     variance = np.var(array)
     skew = stats.skew(array)
     kurtosis = stats.kurtosis(array)
     return [mean, variance, skew, kurtosis]
 
-def get_moments(filename, param_names, save=True, data_dir=Path("./data")):
+STAT_COLS = ['mean','variance','skew','kurtosis','mean_ci_low','mean_ci_high'] #cols of a moments file after the params
+BOOT_CHUNK_SIZE = 2**22 #max resample counts held at once per bootstrap group
+
+def data_to_long(data:dict):
+    '''
+    Long-format view of experiment data: one entry per parameterization and iteration
+
+    RETURNS
+    -------
+    keys (list): param tuples of the parameterizations
+    group_ids (np.ndarray): index in keys of each entry
+    values (np.ndarray): agreement of each entry
+    '''
+    keys = list(data.keys())
+    lengths = np.fromiter((len(v) for v in data.values()), dtype=int, count=len(keys))
+    values = np.concatenate([np.asarray(v, dtype=float) for v in data.values()]) if keys else np.zeros(0)
+    return keys, np.repeat(np.arange(len(keys)), lengths), values
+
+def grouped_moments(group_ids:np.ndarray, values:np.ndarray, n_groups:int)->np.ndarray:
+    '''
+    Mean, variance, skew, and kurtosis of the values of each group, with one bincount per moment over all the groups at once.
+    Same definitions as four_moments (population variance, biased skew, Fisher kurtosis), and nan skew and kurtosis where the variance
+    is zero up to float resolution, as in scipy
+
+    RETURNS
+    -------
+    moments (np.ndarray): n_groups x 4
+    '''
+    counts = np.bincount(group_ids, minlength=n_groups)
+    mean = np.bincount(group_ids, weights=values, minlength=n_groups) / counts
+    mean += np.bincount(group_ids, weights=values - mean[group_ids], minlength=n_groups) / counts #corrects the rounding of the sums, so constant groups have zero deviations
+    deviations = values - mean[group_ids]
+    squares = deviations*deviations
+    m2 = np.bincount(group_ids, weights=squares, minlength=n_groups) / counts
+    m3 = np.bincount(group_ids, weights=squares*deviations, minlength=n_groups) / counts
+    m4 = np.bincount(group_ids, weights=squares*squares, minlength=n_groups) / counts
+    zero = m2 <= (np.finfo(float).resolution*mean)**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skew = np.where(zero, np.nan, m3 / m2**1.5)
+        kurtosis = np.where(zero, np.nan, m4 / m2**2) - 3
+    return np.column_stack([mean, m2, skew, kurtosis])
+
+def bootstrap_group(args)->np.ndarray:
+    '''
+    Percentile bootstrap confidence interval for the mean of one group of values, with a random stream derived from seed and the group index
+
+    NOTES
+    -----
+    A resample of n values is drawn as multinomial counts of the distinct values (agreements take at most n_issues+1 values),
+    which has the same distribution as drawing n indices with replacement at a fraction of the cost
+    '''
+    values, n_boot, ci, seed, group = args
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(group,)))
+    n = len(values)
+    distinct, counts = np.unique(values, return_counts=True)
+    means = np.empty(n_boot)
+    chunk = max(1, BOOT_CHUNK_SIZE // len(distinct))
+    for start in range(0, n_boot, chunk):
+        stop = min(start+chunk, n_boot)
+        means[start:stop] = rng.multinomial(n, counts/n, size=stop-start) @ distinct / n
+    alpha = (1-ci)/2
+    return np.quantile(means, [alpha, 1-alpha])
+
+def bootstrap_mean_ci(group_ids:np.ndarray, values:np.ndarray, n_groups:int, n_boot:int=1000, ci:float=0.95, seed:int=0, n_procs:int=1)->np.ndarray:
+    '''
+    Percentile bootstrap confidence intervals for the mean of each group, resampling n_boot times
+
+    PARAMS
+    ------
+    n_procs (int): Number of processes the groups are split across. Must be 1 inside a daemonic process (e.g. a Pool worker)
+
+    RETURNS
+    -------
+    intervals (np.ndarray): n_groups x 2, low and high end of each group's interval
+
+    NOTES
+    -----
+    Each group resamples with its own random stream (see bootstrap_group), so the intervals only depend on seed, not on n_procs
+    '''
+    order = np.argsort(group_ids, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(np.bincount(group_ids, minlength=n_groups))))
+    sorted_values = values[order]
+    tasks = [(sorted_values[starts[g]:starts[g+1]], n_boot, ci, seed, g) for g in range(n_groups)]
+    if n_procs <= 1 or n_groups <= 1:
+        intervals = [bootstrap_group(t) for t in tasks]
+    else:
+        import multiprocessing as mp
+        with mp.Pool(min(n_procs, n_groups)) as pool:
+            intervals = pool.map(bootstrap_group, tasks, chunksize=max(1, n_groups // (4*n_procs)))
+    return np.asarray(intervals).reshape(n_groups, 2)
+
+def moments_from_data(data:dict, param_names:list, n_boot:int=1000, ci:float=0.95, seed:int=0, n_procs:int=1):
+    '''
+    Compute moments for each parameterization from experiment data in memory, in one grouped pass over the long format of the data,
+    and bootstrap confidence intervals for the means
+
+    PARAMS
+    ------
+    n_boot (int): Number of bootstrap resamples for the confidence intervals of the means, None to skip them
+    ci (float): Confidence level of the intervals
+    seed (int): Seed of the bootstrap, fixed so that rebuilding the moments of the same data gives the same file
+    n_procs (int): Number of processes to bootstrap with (see bootstrap_mean_ci)
+
+    RETURNS
+    -------
+    df (pd.DataFrame): has col for each parameter val and columns for mean, variance, skew, and kurtosis of the agreements data,
+                        and mean_ci_low and mean_ci_high if n_boot is given, row for each parameterization
+    '''
+    import pandas as pd
+    keys, group_ids, values = data_to_long(data)
+    stats = grouped_moments(group_ids, values, len(keys))
+    if n_boot:
+        stats = np.column_stack([stats, bootstrap_mean_ci(group_ids, values, len(keys), n_boot=n_boot, ci=ci, seed=seed, n_procs=n_procs)])
+    df = pd.DataFrame(stats, columns=STAT_COLS[:stats.shape[1]])
+    params = pd.DataFrame([list(k) for k in keys], columns=param_names)
+    return pd.concat([params, df], axis=1)
+
+def save_moments(df, experiment_name:str, data_dir=Path("./data"))->str:
+    '''
+    Save moments as <experiment_name>_moments.csv (left untouched if unchanged). Returns the filename
+    '''
+    filename = experiment_name+'_moments.csv'
+    save_data.write_if_changed(os.path.join(Path(data_dir), filename), df.to_csv().encode())
+    return filename
+
+def get_moments(filename, param_names, save=True, data_dir=Path("./data"), n_procs:int=1):
     '''
     Load data from file, compute moments for each parameterization in that experiment, then save analysis as csv
 
+    PARAMS
+    ------
+    n_procs (int): Number of processes to bootstrap the confidence intervals of the means with (see moments_from_data)
+
     RETURNS
     -------
-    df (pd.DataFrame): has col for each parameter val and columns for mean, variance, skew, and kurtosis of the agreements data, row for each parameterization
+    df (pd.DataFrame): has col for each parameter val and columns for mean, variance, skew, kurtosis, and the confidence interval of the mean
+                        of the agreements data, row for each parameterization
     '''
     data = save_data.unpickle_data(filename, data_dir=data_dir)
-    path = Path(data_dir)
-
-    analyzed = [list(params) + four_moments(agreements) for params, agreements in data.items()]
-    df = pd.DataFrame(analyzed, columns = param_names+['mean','variance','skew','kurtosis'])
+    df = moments_from_data(data, param_names, n_procs=n_procs)
     if save == True: 
-        filename = filename.partition('_data')[0]+'_moments.csv'
-        df.to_csv(os.path.join(path, filename))
+        filename = save_moments(df, filename.partition('_data')[0], data_dir=data_dir)
     return df, filename
\ No newline at end of file
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import logging
+import time
+import multiprocessing as mp
+from multiprocessing import Pool
+from pathlib import Path
+
+from . import helper as helper
+
+'''
+Make-style incremental build of the artifacts derived from experiment data: _data -> _moments.csv -> plots.
+A target is stale if it is missing or if the content hash of one of its sources changed since it was last built.
+The hashes of the sources used for each target are kept in a manifest in data_dir.
+The code that builds a target is one of its sources, so changing analysis.py rebuilds the moments and changing plot.py rebuilds the plots.
+Independent targets are built in parallel across processes.
+During a run, Pipeline builds the targets of each experiment in the background as soon as its simulation finishes, from the data in memory.
+'''
+
+MANIFEST = '.build_manifest.json'
+
+def file_hash(path)->str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_manifest(data_dir)->dict:
+    path = os.path.join(data_dir, MANIFEST)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest:dict, data_dir)->None:
+    path = os.path.join(data_dir, MANIFEST)
+    with open(path+'.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path+'.tmp', path)
+
+def source_hashes(sources:list, hashes:dict)->dict:
+    '''
+    Content hashes of the sources of a target. hashes is a memo shared across targets so each file is hashed once per build
+    '''
+    for s in sources:
+        if str(s) not in hashes: hashes[str(s)] = file_hash(s)
+    return {str(s):hashes[str(s)] for s in sources}
+
+def is_stale(target, sources:dict, manifest:dict)->bool:
+    '''
+    A target is stale if it does not exist or was last built from sources with different content
+    '''
+    return not os.path.isfile(target) or manifest.get(str(target)) != sources
+
+def experiment_param_names(experiment_params:dict)->list:
+    '''
+    Names of the params of an experiment from its config, in the order of the keys in its data file
+    '''
+    merged = helper.merge_dicts([experiment_params["profile_param_vals"], experiment_params["election_param_vals"], experiment_params["del_voting_param_vals"]])
+    return helper.params_dict_to_tuples(merged)[1]
+
+def build_moments(args):
+    from . import analysis as analysis
+    datafile, param_names, data_dir, n_procs = args
+    _, momentsfile = analysis.get_moments(datafile, param_names, save=True, data_dir=data_dir, n_procs=n_procs)
+    return momentsfile
+
+def render_plot(args):
+    plotname, plot_func, kwargs = args
+    plot_func(save=True, show=False, **kwargs)
+    return plotname
+
+def run_tasks(func, tasks:list, n_procs:int)->list:
+    '''
+    Run independent tasks in parallel, or in this process if there is at most one task or one process
+    '''
+    if len(tasks) <= 1 or n_procs <= 1:
+        return [func(t) for t in tasks]
+    with Pool(min(n_procs, len(tasks))) as pool:
+        return pool.map(func, tasks)
+
+def build(experiments:dict, data_dir=Path("../data"), plot_dir=Path("../plots"), y_var='mean', n_procs=None, force=False)->dict:
+    '''
+    Rebuild the stale moments and plots of the given experiments
+
+    PARAMS
+    ------
+    experiments (dict): keys are experiment names, values are their params as in config.json (used to name the columns of the moments)
+    **n_procs (int): Number of processes to build targets with. Defaults to the number of CPUs.
+    **force (bool): Rebuild every target, stale or not
+
+    RETURNS
+    -------
+    built (dict): 'moments' and 'plots' lists of the targets that were rebuilt
+    '''
+    from . import analysis as analysis #imported here so importing build stays cheap (plot loads matplotlib, seaborn, and pandas)
+    from . import plot as plot
+    start = time.perf_counter()
+    if n_procs is None: n_procs = mp.cpu_count()
+    os.makedirs(plot_dir, exist_ok=True)
+    manifest = load_manifest(data_dir)
+    hashes = {}
+    built = {'moments':[], 'plots':[]}
+
+    #data -> moments
+    moment_tasks, moment_sources = [], {}
+    for experiment_name, experiment_params in experiments.items():
+        datafile = experiment_name+'_data'
+        if not os.path.isfile(os.path.join(data_dir, datafile)):
+            logging.warning(f'No data file for experiment {experiment_name}, cannot build its moments')
+            continue
+        target = os.path.join(data_dir, experiment_name+'_moments.csv')
+        sources = source_hashes([os.path.join(data_dir, datafile), analysis.__file__], hashes)
+        if force or is_stale(target, sources, manifest):
+            moment_tasks.append([datafile, experiment_param_names(experiment_params), data_dir, 1])
+            moment_sources[target] = sources
+    if len(moment_tasks) == 1: moment_tasks[0][3] = n_procs #a single moments file is built in this process, so it can bootstrap across processes
+    for momentsfile in run_tasks(build_moments, moment_tasks, n_procs):
+        target = os.path.join(data_dir, momentsfile)
+        manifest[target] = moment_sources[target]
+        built['moments'].append(momentsfile)
+    save_manifest(manifest, data_dir)
+
+    #moments -> plots
+    plot_tasks, plot_sources = [], {}
+    for experiment_name in experiments.keys():
+        momentsfile = experiment_name+'_moments.csv'
+        if not os.path.isfile(os.path.join(data_dir, momentsfile)): continue
+        sources = source_hashes([os.path.join(data_dir, momentsfile), plot.__file__], hashes)
+        for plotname, plot_func, kwargs in plot.plot_targets(momentsfile, y_var=y_var, data_dir=data_dir, plot_dir=plot_dir):
+            if force or is_stale(plotname, sources, manifest):
+                plot_tasks.append((plotname, plot_func, kwargs))
+                plot_sources[plotname] = sources
+    for plotname in run_tasks(render_plot, plot_tasks, n_procs):
+        manifest[plotname] = plot_sources[plotname]
+        built['plots'].append(plotname)
+    save_manifest(manifest, data_dir)
+
+    logging.info(f'Rebuilt {len(built["moments"])} moments files and {len(built["plots"])} plots in {time.perf_counter()-start:.2f}s')
+    return built
+
+def pipeline_task(args)->dict:
+    '''
+    Save the data of one experiment, then build its moments from the data in memory (not from the saved file) and render its plots, if they are stale.
+    Runs in a Pipeline worker, so it only reads the manifest and returns the entries to record in it
+
+    RETURNS
+    -------
+    built (dict): 'moments' and 'plots' lists of the targets that were rebuilt, and 'manifest' entries (target:sources) for them
+    '''
+    from . import save_data as save_data
+    from . import analysis as analysis
+    from . import plot as plot
+    experiment_name, data, param_names, data_dir, plot_dir, y_var, force = args
+    manifest = load_manifest(data_dir)
+    hashes = {}
+    built = {'moments':[], 'plots':[], 'manifest':{}}
+    datafile = save_data.pickle_data(data, experiment_name=experiment_name, data_dir=data_dir)
+    target = os.path.join(data_dir, experiment_name+'_moments.csv')
+    sources = source_hashes([os.path.join(data_dir, datafile), analysis.__file__], hashes)
+    if force or is_stale(target, sources, manifest):
+        momentsfile = analysis.save_moments(analysis.moments_from_data(data, param_names, n_procs=1), experiment_name, data_dir=data_dir) #pipeline workers cannot start processes
+        built['moments'].append(momentsfile)
+        built['manifest'][target] = sources
+    momentsfile = experiment_name+'_moments.csv'
+    sources = source_hashes([target, plot.__file__], hashes)
+    for plotname, plot_func, kwargs in plot.plot_targets(momentsfile, y_var=y_var, data_dir=data_dir, plot_dir=plot_dir):
+        if force or is_stale(plotname, sources, manifest):
+            render_plot((plotname, plot_func, kwargs))
+            built['plots'].append(plotname)
+            built['manifest'][plotname] = sources
+    return built
+
+class Pipeline():
+    '''
+    Background workers that save the data of finished experiments and build their moments and plots while the simulation of the next experiments
+    proceeds, used as a context manager inside the simulate.WorkerPool of the run.
+    Workers are started on the first submission with the start method of the WorkerPool and log through its queue.
+    Only the parent writes the manifest, in collect().
+
+    PARAMS
+    ------
+    worker_pool (simulate.WorkerPool): Pool of the run's simulation workers
+    **n_workers (int): Number of background workers
+    **force (bool): Rebuild every target, stale or not
+    '''
+    def __init__(self, worker_pool, n_workers:int=1, data_dir=Path("../data"), plot_dir=Path("../plots"), y_var='mean', force=False) -> None:
+        self.worker_pool = worker_pool
+        self.n_workers = n_workers
+        self.data_dir, self.plot_dir, self.y_var, self.force = data_dir, plot_dir, y_var, force
+        self.pool = None
+        self.pending = []
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None:
+            if exc_type is None:
+                self.pool.close()
+                self.pool.join()
+            else:
+                self.pool.terminate()
+
+    def submit(self, experiment_name:str, data:dict, param_names:list)->str:
+        '''
+        Queue saving the data of an experiment and building its moments and plots. Returns the name of the data file
+        '''
+        from . import log_queue as log_queue
+        if self.pool is None:
+            os.makedirs(self.plot_dir, exist_ok=True)
+            log_q = self.worker_pool.get_log_queue()
+            self.pool = self.worker_pool.ctx.Pool(self.n_workers, initializer=log_queue.init_worker, initargs=(log_q, logging.getLogger().level))
+        logging.info(f'Queueing saving, moments, and plots of experiment {experiment_name} in the background')
+        self.pending.append(self.pool.apply_async(pipeline_task, ((experiment_name, data, param_names, self.data_dir, self.plot_dir, self.y_var, self.force),)))
+        return experiment_name+'_data'
+
+    def collect(self)->dict:
+        '''
+        Wait for every submitted experiment and record what was built in the manifest
+
+        RETURNS
+        -------
+        built (dict): 'moments' and 'plots' lists of the targets that were rebuilt
+        '''
+        built = {'moments':[], 'plots':[]}
+        if not self.pending:
+            return built
+        manifest = load_manifest(self.data_dir)
+        for result in self.pending:
+            task_built = result.get()
+            manifest.update(task_built['manifest'])
+            built['moments'] += task_built['moments']
+            built['plots'] += task_built['plots']
+        save_manifest(manifest, self.data_dir)
+        self.pending = []
+        logging.info(f'Rebuilt {len(built["moments"])} moments files and {len(built["plots"])} plots in the background pipeline ({time.perf_counter()-self.start:.2f}s since it started)')
+        return built
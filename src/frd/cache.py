@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import pickle
+import logging
+
+from . import __version__
+
+'''
+Content-addressed cache of experiment results. An entry is keyed by a hash of the experiment params, the random seed, and the package version,
+and stores the agreements data of every iteration run so far (in iteration order), so a rerun with more iterations only computes the missing ones.
+'''
+
+def experiment_key(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, seed:int, sim_options:dict=None)->str:
+    '''
+    Hash of everything the results of an experiment depend on, except the number of iterations
+    sim_options are simulation options that change results (e.g. coupled profiles), left out of the key when None so default runs keep their keys
+
+    NOTES
+    -----
+    The key does not depend on the experiment name, so renaming an experiment (or copying it under another name) still hits the cache
+    Bump frd.__version__ whenever a change to the package changes simulation results, to invalidate the cache
+    '''
+    content = {'profile_param_vals':profile_param_vals, 'election_param_vals':election_param_vals, 'del_voting_param_vals':del_voting_param_vals,
+               'seed':seed, 'version':__version__}
+    if sim_options: content['sim_options'] = sim_options
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+def cache_file(key:str, cache_dir)->str:
+    return os.path.join(cache_dir, key+'.pkl')
+
+def load(key:str, cache_dir)->tuple:
+    '''
+    Load a cache entry
+
+    RETURNS
+    -------
+    data (dict): keys are tuples of param values, values are lists of agreements in iteration order ({} if there is no entry)
+    n_iter (int): number of iterations in the entry (0 if there is no entry)
+    '''
+    filename = cache_file(key, cache_dir)
+    if not os.path.isfile(filename):
+        return {}, 0
+    with open(filename, 'rb') as input_file:
+        entry = pickle.load(input_file)
+    logging.info(f'Cache entry {key} found with {entry["n_iter"]} iterations')
+    return entry['data'], entry['n_iter']
+
+def store(key:str, data:dict, n_iter:int, cache_dir)->str:
+    '''
+    Write a cache entry, replacing any existing entry with the same key. Writes to a temporary file first so an interrupted run cannot corrupt the entry.
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = cache_file(key, cache_dir)
+    with open(filename+'.tmp', 'w+b') as output_file:
+        pickle.dump({'n_iter':n_iter, 'data':data, 'version':__version__}, output_file)
+    os.replace(filename+'.tmp', filename)
+    logging.info(f'Cache entry {key} stored with {n_iter} iterations')
+    return filename
+
+def first_iters(data:dict, n_iter:int)->dict:
+    '''
+    Keep only the first n_iter iterations of the agreements data
+    '''
+    return {k:v[:n_iter] for k, v in data.items()}
@@ -0,0 +1,286 @@
+import heapq
+import math
+import numpy as np
+from typing import Callable
+
+'''
+Engines for committee rules with diminishing returns (submodular objectives): lazy greedy selection and swap local search.
+
+Thiele rules score a committee W by sum over ballots b of weight_b * (marginal(0) + ... + marginal(k_b - 1)), where k_b is the number of
+winners ballot b approves. PAV has marginal(k) = 1/(k+1) and Chamberlin-Courant (CC) has marginal(k) = 1 if k == 0 else 0.
+CC-Borda scores a committee by sum over ballots of weight_b * the Borda score of the ballot's favourite winner.
+
+All gains are kept in integer units (PAV marginals are scaled by lcm(1..n_winners+1)) so that ties between cands are exact,
+and are broken in favour of the lowest cand id, as in RAV. Integer gains are floats while they stay below 2**53, and Python ints
+(object arrays) beyond that, which lcm(1..n_winners+1) alone exceeds for n_winners >= 41.
+'''
+
+def lazy_greedy(initial_gains:np.ndarray, n_winners:int, marginal_gain:Callable, select:Callable)->list:
+    '''
+    Pick n_winners cands one at a time, each with the largest marginal gain given the cands already picked
+
+    PARAMS
+    ------
+    initial_gains (np.ndarray): Gain of each cand on the empty committee
+    marginal_gain (Callable): marginal_gain(c) is the current gain of cand c
+    select (Callable): select(c) updates the state marginal_gain reads when c is picked
+
+    RETURNS
+    -------
+    winners (list): cand ids in order of selection
+
+    NOTES
+    -----
+    Gains never increase as the committee grows, so a gain computed in an earlier round is an upper bound.
+    The priority queue holds (-gain, cand, round the gain was computed in) and only the top cand is re-evaluated:
+    it is picked if its gain is fresh, else its gain is recomputed and it is pushed back.
+    '''
+    heap = [(-g, c, 0) for c, g in enumerate(initial_gains)]
+    heapq.heapify(heap)
+    winners = []
+    while len(winners) < n_winners and heap:
+        neg_gain, c, computed = heapq.heappop(heap)
+        if computed == len(winners):
+            winners.append(c)
+            select(c)
+        else:
+            heapq.heappush(heap, (-marginal_gain(c), c, len(winners)))
+    return winners
+
+def pav_marginals(n_winners:int, total_weight:float=1.0)->np.ndarray:
+    '''
+    PAV marginals 1/(k+1) for k = 0..n_winners, in units of 1/lcm(1..n_winners+1) so they are integers
+
+    PARAMS
+    ------
+    total_weight (float): Number of voters, which bounds every gain by total_weight*lcm(1..n_winners+1)
+
+    RETURNS
+    -------
+    marginals (np.ndarray): floats if every gain is exact as a float (below 2**53), else Python ints (dtype object)
+    '''
+    unit = math.lcm(*range(1, n_winners+2))
+    marginals = [unit // (k+1) for k in range(n_winners+1)]
+    if unit*total_weight < 2**53:
+        return np.array(marginals, dtype=float)
+    return np.array(marginals, dtype=object)
+
+def exact_weights(weights:np.ndarray, marginals:np.ndarray)->np.ndarray:
+    '''
+    Ballot weights in the type of the marginals: Python ints for Python int marginals, so products and sums of gains stay exact
+    '''
+    if marginals.dtype == object:
+        return np.rint(weights).astype(np.int64).astype(object)
+    return weights
+
+def cand_sums(cand_ids:np.ndarray, values:np.ndarray, n_cands:int)->np.ndarray:
+    '''
+    Sum of values of each cand: one bincount for floats, an unbuffered add for Python ints (bincount would round them to floats)
+    '''
+    if values.dtype != object:
+        return np.bincount(cand_ids, weights=values, minlength=n_cands)
+    sums = np.zeros(n_cands, dtype=object)
+    np.add.at(sums, cand_ids, values)
+    return sums
+
+def cc_marginals(n_winners:int)->np.ndarray:
+    '''
+    Chamberlin-Courant marginals: only a ballot's first approved winner counts
+    '''
+    marginals = np.zeros(n_winners+1)
+    marginals[0] = 1
+    return marginals
+
+def thiele_greedy(approvals, weights:np.ndarray, n_winners:int, marginals:np.ndarray)->list:
+    '''
+    Lazy greedy selection for a Thiele rule
+
+    PARAMS
+    ------
+    approvals (profiles.ApprovalSets): approved cand ids of each ballot
+    weights (np.ndarray): Number of voters with each ballot
+    marginals (np.ndarray): marginals[k] is the value of a ballot's (k+1)th approved winner (see pav_marginals, cc_marginals)
+    '''
+    weights = exact_weights(weights, marginals)
+    ballots_of, starts = approvals.by_cand()
+    n_won = np.zeros(len(approvals), dtype=int)
+    initial_gains = cand_sums(approvals.cand_ids, (weights*marginals[0])[approvals.ballot_ids()], approvals.n_cands)
+
+    def marginal_gain(c):
+        ballots = ballots_of[starts[c]:starts[c+1]]
+        return weights[ballots] @ marginals[n_won[ballots]]
+
+    def select(c):
+        n_won[ballots_of[starts[c]:starts[c+1]]] += 1
+
+    return lazy_greedy(initial_gains, min(n_winners, approvals.n_cands), marginal_gain, select)
+
+def thiele_local_search(approvals, weights:np.ndarray, winners:list, marginals:np.ndarray, max_passes:int=10)->list:
+    '''
+    Improve a Thiele committee by swaps: for each winner w in turn, replace it by the non-winner whose gain on the committee without w
+    is largest, if that gain is strictly more than w's contribution. Repeats until a pass makes no swap (or max_passes passes).
+
+    NOTES
+    -----
+    The gains of all non-winners for one w are one bincount over the approvals, using the winner counts of the ballots without w
+    '''
+    winners = list(winners)
+    weights = exact_weights(weights, marginals)
+    n_cands = approvals.n_cands
+    ballot_of = approvals.ballot_ids()
+    is_winner = np.zeros(n_cands, dtype=bool)
+    is_winner[winners] = True
+    n_won = np.bincount(ballot_of[is_winner[approvals.cand_ids]], minlength=len(approvals))
+    for _ in range(max_passes):
+        swapped = False
+        for i, w in enumerate(winners):
+            approves_w = np.bincount(ballot_of[approvals.cand_ids == w], minlength=len(approvals))
+            n_won_without = n_won - approves_w
+            loss = np.sum(weights*approves_w*marginals[n_won_without])
+            values = weights*marginals[n_won_without] #value of one more approved winner to each ballot
+            gains = cand_sums(approvals.cand_ids, values[ballot_of], n_cands)
+            gains[is_winner] = -1
+            c = int(np.argmax(gains))
+            if gains[c] > loss:
+                n_won = n_won_without + np.bincount(ballot_of[approvals.cand_ids == c], minlength=len(approvals))
+                is_winner[w], is_winner[c] = False, True
+                winners[i] = c
+                swapped = True
+        if not swapped: break
+    return winners
+
+def cc_borda_greedy(scores:np.ndarray, weights:np.ndarray, n_winners:int)->list:
+    '''
+    Lazy greedy selection for Chamberlin-Courant with Borda scores
+
+    PARAMS
+    ------
+    scores (np.ndarray): n_ballots x n_cands, scores[b][c] is the Borda score ballot b gives cand c
+    weights (np.ndarray): Number of voters with each ballot
+    '''
+    best = np.zeros(len(scores), dtype=scores.dtype) #Borda score of each ballot's favourite winner so far
+
+    def marginal_gain(c):
+        return weights @ np.maximum(scores[:,c] - best, 0)
+
+    def select(c):
+        np.maximum(best, scores[:,c], out=best)
+
+    return lazy_greedy(weights @ scores, min(n_winners, scores.shape[1]), marginal_gain, select)
+
+def cc_borda_local_search(scores:np.ndarray, weights:np.ndarray, winners:list, max_passes:int=10)->list:
+    '''
+    Improve a CC-Borda committee by swaps, as in thiele_local_search
+
+    NOTES
+    -----
+    Without w, each ballot's favourite winner is its best winner other than w. The gains of all non-winners for one w are one
+    n_ballots x n_cands array operation.
+    '''
+    winners = list(winners)
+    n_cands = scores.shape[1]
+    is_winner = np.zeros(n_cands, dtype=bool)
+    is_winner[winners] = True
+    for _ in range(max_passes):
+        swapped = False
+        for i, w in enumerate(winners):
+            others = [x for x in winners if x != w]
+            best_without = scores[:, others].max(axis=1) if others else np.zeros(len(scores), dtype=scores.dtype)
+            loss = np.sum(weights*np.maximum(scores[:,w] - best_without, 0))
+            gains = weights @ np.maximum(scores - best_without[:,None], 0)
+            gains = np.where(is_winner, -1, gains)
+            c = int(np.argmax(gains))
+            if gains[c] > loss:
+                is_winner[w], is_winner[c] = False, True
+                winners[i] = c
+                swapped = True
+        if not swapped: break
+    return winners
+
+def seq_phragmen_order(approvals, weights:np.ndarray, tol:float=1e-9)->list:
+    '''
+    Sequential Phragmén: each selected cand puts a load of 1 on the voters who approve it, shared so that their total loads are equal.
+    Each round selects the cand whose approvers would end up with the smallest (equal) load: (1 + sum of their loads) / number of approvers.
+
+    RETURNS
+    -------
+    order (list): every cand id in order of selection. The committee of size k is the first k cands (the rule is committee monotone).
+                    Cands nobody approves come last, lowest id first.
+
+    NOTES
+    -----
+    Loads are floats, so cands whose new loads are within a relative tol of the smallest are tied, and the lowest id wins the tie.
+    Every round is a bincount of the loads over the approvals, no per-voter loop.
+    '''
+    n_cands = approvals.n_cands
+    ballot_of = approvals.ballot_ids()
+    support = approvals.counts(weights) #number of voters approving each cand
+    loads = np.zeros(len(approvals)) #load of each voter of each ballot
+    selectable = support > 0
+    order = []
+    while selectable.any():
+        load_sums = np.bincount(approvals.cand_ids, weights=(weights*loads)[ballot_of], minlength=n_cands)
+        new_loads = np.full(n_cands, np.inf)
+        new_loads[selectable] = (1 + load_sums[selectable]) / support[selectable]
+        c = int(np.flatnonzero(new_loads <= new_loads.min()*(1+tol))[0])
+        loads[ballot_of[approvals.cand_ids == c]] = new_loads[c]
+        selectable[c] = False
+        order.append(c)
+    is_selected = np.zeros(n_cands, dtype=bool)
+    is_selected[order] = True
+    return order + list(np.flatnonzero(~is_selected))
+
+def mes_order(approvals, weights:np.ndarray, n_winners:int, tol:float=1e-9)->list:
+    '''
+    Method of Equal Shares (approval utilities, every cand costs the same) for a committee of n_winners, completed by approval count
+
+    Every voter starts with an equal share of the budget for n_winners cands. Each round, a cand is affordable if its approvers have enough budget
+    left to pay for it, and it costs each approver min(their budget, rho) where rho is as small as possible.
+    The affordable cand with the smallest rho is selected, until no cand is affordable.
+
+    RETURNS
+    -------
+    order (list): every cand id, the cands selected by MES in order of selection, then the rest by approval count (most first, lowest id first among ties)
+
+    NOTES
+    -----
+    Units: each voter's budget is n_winners and a cand costs n_voters, so a voter has n_winners/n_voters of the cost of a cand.
+    MES is not committee monotone, so the order only gives the committee of size n_winners (its first n_winners cands).
+    Every round finds rho for all cands at once: the approvals are sorted by (cand, budget), and rho of a cand is found at the first approver
+    (in increasing budget) who can pay the rest of the cost at an equal share, using within-cand cumulative sums. Ties are within a relative tol, lowest id first.
+    '''
+    n_cands = approvals.n_cands
+    ballot_of = approvals.ballot_ids()
+    cost = float(np.sum(weights))
+    budgets = np.full(len(approvals), float(n_winners)) #budget left of each voter of each ballot
+    support = approvals.counts(weights)
+    counts = np.bincount(approvals.cand_ids, minlength=n_cands) #approvals (entries) of each cand
+    starts = np.concatenate(([0], np.cumsum(counts)))
+    has_support = counts > 0
+    is_selected = np.zeros(n_cands, dtype=bool)
+    order = []
+    while True:
+        entries = np.lexsort((budgets[ballot_of], approvals.cand_ids)) #by cand, then by budget
+        cands, ballots = approvals.cand_ids[entries], ballot_of[entries]
+        x, w = budgets[ballots], weights[ballots]
+        paid_before = np.cumsum(w*x) - w*x #paid by approvers with less budget (their whole budget), within the cand
+        w_before = np.cumsum(w) - w
+        paid_before -= paid_before[starts[cands]]
+        w_before -= w_before[starts[cands]]
+        rho = (cost - paid_before) / (support[cands] - w_before)
+        first_valid = np.where(rho <= x*(1+tol), np.arange(len(entries)), len(entries))
+        rhos = np.full(n_cands, np.inf)
+        if len(entries):
+            first = np.minimum.reduceat(first_valid, starts[:-1][has_support])
+            found = first < len(entries) #a cand has no valid approver if its approvers cannot afford it
+            rhos[np.flatnonzero(has_support)[found]] = rho[first[found]]
+        affordable = np.bincount(approvals.cand_ids, weights=(weights*budgets)[ballot_of], minlength=n_cands) >= cost*(1-tol)
+        rhos[~affordable | is_selected] = np.inf
+        if len(order) >= n_cands or not np.isfinite(rhos.min()): break
+        c = int(np.flatnonzero(rhos <= rhos.min()*(1+tol))[0])
+        approvers = ballot_of[approvals.cand_ids == c]
+        budgets[approvers] = np.maximum(budgets[approvers] - rhos[c], 0)
+        is_selected[c] = True
+        order.append(c)
+    rest = np.flatnonzero(~is_selected)
+    return order + list(rest[np.argsort(-support[rest], kind='stable')])
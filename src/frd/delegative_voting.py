@@ -1,10 +1,14 @@
 import numpy as np
 import copy
+import math
 import logging
 
 from . import helper as helper
 from . import profiles as profiles
 from . import election_rules as rules
+from . import reference as reference
+
+TIE_RTOL = 1e-9 #relative tolerance of weighted majority ties for float weights (approval delegation)
 
 def majority(binary_matrix)->np.ndarray:
     '''
@@ -44,6 +48,34 @@ def weighted_majority(binary_matrix:np.ndarray, weights)->np.ndarray:
                 else np.random.binomial(1, 0.5) for i in range(n_issues)]
     return np.array(outcomes)
 
+def stacked_weighted_majority(c_prefs:np.ndarray, rep_weights:np.ndarray, rtol=0.0)->np.ndarray:
+    '''
+    Weighted majority voting by the cands on every issue, where cand weights can be different for each issue,
+    for one weighting or a stack of weightings (e.g. one per delegation param combination)
+
+    PARAMS
+    -------
+    c_prefs (np.ndarray): Size n_cands x n_issues, cell values are {0,1}
+    rep_weights (np.ndarray): Size n_issues x n_cands, or n_weightings x n_issues x n_cands, with non-negative weights
+    rtol (float or np.ndarray): An issue is tied if its yes and no weights differ by at most rtol times its total weight.
+                                0 for exact (integer) weights, or one value per weighting (size n_weightings x 1)
+
+    RETURNS
+    --------
+    outcomes (np.ndarray): binary array of len n_issues, or n_weightings x n_issues
+
+    NOTES
+    -----
+    Ties are broken with one coin flip per tied issue, in the order of the weightings and then of the issues
+    '''
+    vote_sums = np.sum(c_prefs.T * rep_weights, axis=-1)
+    weight_sums = np.sum(rep_weights, axis=-1)
+    margins = 2*vote_sums - weight_sums
+    ties = np.abs(margins) <= rtol*weight_sums
+    outcomes = (margins > 0).astype(int)
+    outcomes[ties] = np.random.binomial(1, 0.5, size=np.count_nonzero(ties))
+    return outcomes
+
 class RD():
     '''
     Elect reps, apply default weighting, take (weighted) majority vote, then compare to voter majority outcomes
@@ -107,7 +139,7 @@ class RD():
         return float(agreement)
     
     def run_RD(self, quick=False)->float:
-        logging.debug(f'run_RD running with quick set to {quick}')
+        logging.debug('run_RD running with quick set to %s', quick)
         if quick == False:
             self.elect_reps()
             self.pull_rep_prefs()
@@ -158,8 +190,7 @@ class FRD():
         self.delegator_ids = []
         self.election_rule = rules.rule_dispatcher(election_rule)
         self.rep_ids = []
-        self.weighting = {i:np.zeros((self.n_voters, self.n_cands)) for i in range(self.n_issues)}
-        self.rep_weights = {i:np.zeros(self.n_cands) for i in range(self.n_issues)}
+        self.rep_weights = np.zeros((self.n_issues, self.n_cands), dtype=np.int64) #row i is the total weight of each cand on issue i, in units of 1/weight_scale() of a vote
         self.voter_majority_outcomes = self.profile.get_voter_majority()
 
     def elect_reps(self):
@@ -174,9 +205,20 @@ class FRD():
     #     self.rep_prefs = c_prefs[self.rep_ids,:]
     #     return self.rep_prefs
 
+    def weight_scale(self)->int:
+        '''
+        Number of weight units in one vote. Weights are kept as integer multiples of 1/weight_scale() of a vote,
+        so that every share a voter can give (1/n_reps by default, 1/best_k to best k reps) is exact and weighted majority ties are exact.
+        Approval delegation shares (1/m to m approved reps) are floats in the same units, see approval_delegation
+        '''
+        if self.del_style == 'best_k' and self.best_k:
+            return math.lcm(self.n_reps, self.best_k)
+        return self.n_reps
+
     def default_weighting(self):
         '''
-        Set default weight given by each voter to each rep on each issue
+        Set default weight given by each voter to each rep on each issue (before delegation every voter gives the same weights,
+        so only the total per issue is kept)
 
         TO DO
         ------
@@ -184,11 +226,12 @@ class FRD():
         
         '''
         if self.default == 'uniform':
-            for i in range(self.n_issues):
-                for v in range(self.n_voters):
-                    self.weighting[i][v] = [1/self.n_reps if c in self.rep_ids else 0 for c in range(self.n_cands)]
+            voter_weights = np.zeros(self.n_cands, dtype=np.int64)
+            voter_weights[self.rep_ids] = self.weight_scale() // self.n_reps
+            self.rep_weights = np.tile(self.n_voters*voter_weights, (self.n_issues, 1))
         else:
             raise ValueError(f'Default {self.default} not implemented for FRD')
+        return self.rep_weights
 
     def select_n_delegators(self):
         '''
@@ -210,11 +253,8 @@ class FRD():
         with probability 2*(|p_v - 0.5|).
         '''
         intensities = self.profile.get_v_intensities()
-        self.delegator_ids = []
-        for v in range(self.n_voters):
-            if np.random.binomial(1, 2*np.abs(intensities[v]-0.5), 1) == 1:
-                self.delegator_ids.append(v)
-        # print('delegator ids: ', self.delegator_ids)
+        delegates = np.random.binomial(1, 2*np.abs(intensities-0.5)) #one draw per voter, all at once
+        self.delegator_ids = np.nonzero(delegates)[0]
         return self.delegator_ids
 
     def incisive_delegation(self):
@@ -227,44 +267,94 @@ class FRD():
         NOTES
         --------
         Assumnes that delegator ids already determined in self.delegator_ids
+        The designated rep for each pref on an issue is the first cand (among all cands, not only reps) with that pref.
+        All issues are handled at once: the delegators voting 0 (1) on an issue move their default weight to the designated 0 (1) rep of the issue.
 
         '''
-        v_prefs, c_prefs = self.profile.get_issue_prefs()
-        # print(f'delegators: {self.delegator_ids}')
-        for i in range(self.n_issues):
-            r0 = np.where(c_prefs[:,i] == 0)[0].tolist() #rep who votes 0 on this issue
-            r1 = np.where(c_prefs[:,i] == 1)[0].tolist() #rep who votes 1 on this issue
-            for v in self.delegator_ids:
-                if r0 and v_prefs[v,i] == 0:
-                     self.weighting[i][v] = np.zeros(self.n_cands)
-                     self.weighting[i][v,r0[0]] = 1
-                elif r1 and v_prefs[v,i] == 1:
-                    self.weighting[i][v] = np.zeros(self.n_cands)
-                    self.weighting[i][v,r1[0]] = 1
-        #print(f'Incisive weighting: {self.weighting}')
-        return self.weighting
+        c_prefs = self.profile.get_issue_prefs()[1]
+        scale = self.weight_scale()
+        issues = np.arange(self.n_issues)
+        n_zeros, n_ones = self.profile.issue_tallies(self.delegator_ids) #delegators voting 0 and 1 on each issue
+        moved = np.zeros(self.n_issues, dtype=np.int64) #delegators leaving default on each issue
+        for pref, n_pref in ((0, n_zeros), (1, n_ones)):
+            is_pref = c_prefs == pref
+            has_rep = is_pref.any(axis=0) #otherwise the delegators voting pref stick with default
+            rep = np.argmax(is_pref, axis=0) #first cand with pref on each issue
+            n_delegated = np.where(has_rep, n_pref, 0)
+            self.rep_weights[issues, rep] += scale*n_delegated
+            moved += n_delegated
+        voter_default = np.zeros(self.n_cands, dtype=np.int64)
+        voter_default[self.rep_ids] = scale // self.n_reps
+        self.rep_weights -= np.outer(moved, voter_default)
+        return self.rep_weights
     
     def find_best_k(self):
+        '''
+        The best k reps of each delegator: the first k reps in their order (fewer if there are fewer than k reps)
+
+        RETURNS
+        -------
+        best_ks (np.ndarray): Size n_ballots x min(best_k, n_reps), row b is the cand ids of the best reps of the delegators with ballot b, best first
+        n_delegators (np.ndarray): Number of delegators with each ballot (1 per delegator, unless the profile is compressed into voter types)
+
+        NOTES
+        -----
+        Draws the delegators again (select_n_delegators)
+        All delegators at once: mask the reps in the order matrix and keep those whose running count of reps is at most k
+        '''
         self.select_n_delegators()
-        orders = self.profile.get_orders()
-        best_ks = {v:[] for v in range(self.n_voters)}
-        for v in self.delegator_ids:
-            for c in orders[v]:
-                if c in self.rep_ids:
-                    best_ks[v].append([c])
-                    if len(best_ks[v]) == self.best_k:
-                        break
-        return best_ks
+        orders, n_delegators = self.profile.voter_orders(self.delegator_ids)
+        is_rep = np.zeros(self.n_cands, dtype=bool)
+        is_rep[self.rep_ids] = True
+        rep_in_order = is_rep[orders]
+        best = rep_in_order & (np.cumsum(rep_in_order, axis=1) <= self.best_k)
+        return orders[best].reshape(len(orders), min(self.best_k, len(self.rep_ids))), n_delegators
     
     def best_k_delegation(self):
-        #use the top k reps from each voter to create delegations
-        best_k = self.find_best_k()
-        for v in self.delegator_ids:
-            for r in best_k[v]:
-                for i in range(self.n_issues):
-                    self.weighting[i][v,r] = 1.0/len(best_k[v])
-        return self.weighting
+        '''
+        Each delegator gives weight 1/k to each of their best k reps on every issue, replacing their default weight 1/n_reps for those reps
+        (the default weight on their other reps is kept)
+        '''
+        best_ks, n_delegators = self.find_best_k()
+        scale = self.weight_scale()
+        n_delegations = np.bincount(best_ks.ravel(), weights=np.repeat(n_delegators, best_ks.shape[1]), minlength=self.n_cands).astype(np.int64) #number of delegators with each cand in their best k
+        self.rep_weights += (scale//max(1, best_ks.shape[1]) - scale//self.n_reps) * n_delegations
+        return self.rep_weights
     
+    def approval_delegation(self):
+        '''
+        Each delegator who approves at least one rep splits their vote equally among the reps they approve, on every issue, instead of their default weight.
+        Delegators who approve no rep stick with default.
+
+        NOTES
+        -----
+        Assumes that delegator ids already determined in self.delegator_ids
+        Works on the sparse approvals of the delegators (profile.voter_approvals): one bincount over the approved reps of all delegators
+        Shares of 1/m of a vote for every m up to n_reps have no common integer unit of practical size (lcm(1..m) overflows int64 for m > 42),
+        so the rep weights become floats and weighted majority ties are compared with a relative tolerance (TIE_RTOL)
+        '''
+        approvals, n_delegators = self.profile.voter_approvals(self.delegator_ids)
+        scale = self.weight_scale()
+        is_rep = np.zeros(self.n_cands, dtype=bool)
+        is_rep[self.rep_ids] = True
+        approves_rep = is_rep[approvals.cand_ids]
+        rep_ballots = approvals.ballot_ids()[approves_rep] #ballot of each approval of a rep
+        n_approved_reps = np.bincount(rep_ballots, minlength=len(approvals))
+        delegates = n_approved_reps > 0
+        shares = np.zeros(len(approvals))
+        shares[delegates] = n_delegators[delegates] * scale / n_approved_reps[delegates] #weight each ballot gives to each of its approved reps
+        delegated = np.bincount(approvals.cand_ids[approves_rep], weights=shares[rep_ballots], minlength=self.n_cands)
+        voter_default = np.zeros(self.n_cands, dtype=np.int64)
+        voter_default[self.rep_ids] = scale // self.n_reps
+        self.rep_weights = self.rep_weights + delegated - np.sum(n_delegators[delegates])*voter_default
+        return self.rep_weights
+
+    def tie_rtol(self)->float:
+        '''
+        Relative tolerance of weighted majority ties: 0 for exact integer weights, TIE_RTOL for float weights
+        '''
+        return TIE_RTOL if np.issubdtype(self.rep_weights.dtype, np.floating) else 0.0
+
     def weight_reps(self):
         self.default_weighting()
         if self.n_delegators is not None and self.profile.get_v_intensities() is None:
@@ -277,8 +367,8 @@ class FRD():
             self.best_k_delegation()
         elif self.del_style == 'incisive':
             self.incisive_delegation()
-        self.rep_weights= {i:np.sum(self.weighting[i],axis=0) for i in range(self.n_issues)}
-        #print(f'weighting: {self.weighting}')
+        elif self.del_style == 'approval':
+            self.approval_delegation()
         #print(f'rep_weights: {self.rep_weights}')
         return self.rep_weights
     
@@ -286,25 +376,7 @@ class FRD():
         '''
         Computes weighted majority vote on each issue, where rep weights can be different for each issue
         '''
-
-        outcomes = []
-        for i in range(self.n_issues):
-            #print(f'\nissue: {i}')
-            rep_weights  = self.rep_weights[i]
-            #print(f'rep weights after delegation: ', rep_weights)
-            c_prefs = self.profile.get_issue_prefs()[1]
-            #print(f'cand prefs: {c_prefs[:,i]}')
-            #print(f'voter prefs: {self.profile.get_issue_prefs()[0][:,i]}')
-
-            weighted_profile = (c_prefs.T * rep_weights).T
-            #print(f'weighted profile: {weighted_profile[:,i]}')
-
-            vote_sum = np.sum(weighted_profile[:,i])
-            weight_sum = np.sum(rep_weights, dtype=float)
-            outcomes+=[1 if vote_sum > weight_sum/2.0 
-                        else 0 if vote_sum < weight_sum/2.0 
-                        else np.random.binomial(1, 0.5)]
-        return outcomes
+        return stacked_weighted_majority(self.profile.get_issue_prefs()[1], self.rep_weights, rtol=self.tie_rtol())
 
     def outcome_agreement(self):
         rep_outcomes = self.weighted_majority()
@@ -327,6 +399,45 @@ class FRD():
     def run_FRD(self, quick=False):
         if quick == False:
             self.elect_reps()
+        if reference.is_reference():
+            return self.run_reference([(self.default, self.del_style, self.best_k, self.n_delegators)])[0]
         self.weight_reps()
         agreement = self.outcome_agreement()
-        return agreement
\ No newline at end of file
+        return agreement
+
+    def run_FRD_batch(self, del_voting_params:list)->list:
+        '''
+        Run FRD with the current reps for several delegation param combinations: the rep weights of every combination are computed first,
+        then the outcomes of all of them in one stacked weighted majority vote
+
+        PARAMS
+        ------
+        del_voting_params (list): tuples of (default, del_style, best_k, n_delegators)
+
+        RETURNS
+        -------
+        agreements (list): one per combination, in order
+
+        NOTES
+        -----
+        Draws the same random numbers as calling run_FRD for each combination, but in a different order
+        (all delegator draws, then all tie-breaking draws)
+        '''
+        if not del_voting_params: return []
+        if reference.is_reference():
+            return self.run_reference(del_voting_params)
+        weights, rtols = [], []
+        for default, del_style, best_k, n_delegators in del_voting_params:
+            self.set_delegation_params(default=default, del_style=del_style, best_k=best_k, n_delegators=n_delegators)
+            weights.append(self.weight_reps()) #weight_reps makes a new array each time
+            rtols.append(self.tie_rtol())
+        #integer weights stacked with float ones become floats, exact below 2**53, and keep exact ties (rtol 0)
+        outcomes = stacked_weighted_majority(self.profile.get_issue_prefs()[1], np.stack(weights), rtol=np.array(rtols)[:,None])
+        return [float(x) for x in np.count_nonzero(outcomes == self.voter_majority_outcomes, axis=1) / self.n_issues]
+
+    def run_reference(self, del_voting_params:list)->list:
+        '''
+        Run the original implementation (reference.ReferenceFRD) with the current reps for each delegation param combination, one at a time
+        '''
+        return [reference.ReferenceFRD(self.profile, self.rep_ids, self.n_reps, del_style, best_k, n_delegators, default).run()
+                for default, del_style, best_k, n_delegators in del_voting_params]
@@ -1,12 +1,13 @@
+import functools
 import numpy as np
 from typing import Tuple, Callable #to type hint tuples
 # import itertools
 # import copy
 
-import whalrus
-
 from . import helper as helper
 from . import profiles as profiles
+from . import committee as committee
+from . import reference as reference
 
 '''
 All election rules return two values: a list of rep ids of winning cands, and the scores of all cands from the election (not just the rep scores)
@@ -53,7 +54,7 @@ def score_orders(profile, score_vector)->np.ndarray:
     
     PARAMS
     ------
-    profile (np.ndarray): Profile object with orders attribute (dict of 1D numpy arrays)
+    profile (np.ndarray): Profile object with orders attribute (dict of 1D numpy arrays), or a StreamingProfile
                             The value ordermap[v][j] is the cand that voter v ranks in position j (0 <= j < n_cands)
     score_vector (np.ndarray): 1D array with score increase a cand gets based on the rank a voter gives them
             Example: with 4 cands and Borda, score_vector is [3,2,1,0]
@@ -61,22 +62,19 @@ def score_orders(profile, score_vector)->np.ndarray:
     RETURNS
     -------
     scores (np.ndarray): 1D array of non-negative scores of len n_cands, in order (score cand with id x is in position x)
-    
-    TODO
+
+    NOTES
     -----
-    Rewrite to run faster. Currently using nested for loops which are easy to read, but slow.
+    Scores only depend on how many voters rank each cand in each position (profile.get_position_counts()),
+    which also weights voter types if the profile is compressed and is accumulated over chunks by a StreamingProfile
     '''
     n_cands = profile.get_n_cands()
-    orders = profile.get_orders()
+    score_vector = np.asarray(score_vector)
 
     if n_cands != len(score_vector):
         raise ValueError(f'Score vector {score_vector} has length not equal to num cands: {n_cands}')
     
-    scores = np.zeros_like(score_vector)
-    for order in orders.values():
-        for rank, c_id in enumerate(order):
-            scores[c_id] += score_vector[rank]
-    return scores
+    return profile.get_position_counts() @ score_vector
 
 def scoring_rule(profile:profiles.Profile, score_vector, n_winners, seed=None)->Tuple[np.ndarray, np.ndarray]:
     '''
@@ -112,8 +110,7 @@ def max_approval(profile:profiles.Profile, n_winners:int, seed=None)->Tuple[np.n
     '''
     Elects the n_winners cands with the most total approvals from voters, breaking ties randomly
     '''
-    approval_indicators = list(profile.get_approval_indicators().values())
-    approval_counts = np.sum(np.vstack(approval_indicators), axis=0)
+    approval_counts = profile.get_approval_counts()
     winners = helper.array1D_to_sorted(approval_counts, seed)[:,2][-n_winners:]
     return winners, approval_counts
 
@@ -121,28 +118,135 @@ def rav(profile:profiles.Profile, n_winners:int)->Tuple[np.ndarray, np.ndarray]:
     '''
     Implements Re-weighted Approval Voting with lexicographic teibreaking
     The election scores are approval counts, determined by the profile not really by the rule
+
+    NOTES
+    -----
+    Each round works on the sparse approvals (profile.get_approvals(), an ApprovalSets): every approval of a ballot with w winners
+    is worth 1/(w+1) (times the voter type count if compressed), cand scores are a bincount of these, and the winner of the round
+    is the non-winner with the highest score, lowest id first among ties
     '''
     n_cands = profile.get_n_cands()
-    candidates = list(range(n_cands))
     approvals = profile.get_approvals()
+    ballot_weights = profile.get_ballot_weights() #voters per approval ballot if the profile is compressed
+    weights = np.ones(len(approvals)) if ballot_weights is None else ballot_weights.astype(float)
+    ballot_of = approvals.ballot_ids() #ballot of each approval
+    n_won = np.zeros(len(approvals), dtype=int) #number of winners approved by each ballot
+    is_winner = np.zeros(n_cands, dtype=bool)
     result = []
-    # approvals = {v_id:v_pref for v_id, v_pref in enumerate(approvals)}
     while len(result) < n_winners:
-        # Select the winner weighted 1/approval set intersection.
-        non_winners = set(candidates) - set(result)
-        c_scores = {c:0 for c in non_winners}
-        for v_id, v_pref in approvals.items():
-            # every non-winning approved candidate get 1/intersection points..
-            intersect = len(set(result).intersection(v_pref)) + 1
-            for c in non_winners:
-                if c in v_pref:
-                    c_scores[c] += 1.0 / intersect
-        # choose the highest score...
-        #print(c_scores)
-        order = [k for k in sorted(c_scores, key=c_scores.get, reverse=True)]
-        result.append(order[0])
+        c_scores = np.bincount(approvals.cand_ids, weights=weights[ballot_of] / (n_won[ballot_of] + 1), minlength=n_cands)
+        c_scores[is_winner] = -1
+        winner = int(np.argmax(c_scores))
+        result.append(winner)
+        is_winner[winner] = True
+        n_won += np.bincount(ballot_of[approvals.cand_ids == winner], minlength=len(approvals))
     return np.asarray(result), max_approval(profile, n_winners)[1] #election scores are approval counts
 
+def ballot_weights_of(profile, n_ballots:int)->np.ndarray:
+    '''
+    Number of voters with each ballot (all 1 unless the profile is compressed)
+    '''
+    ballot_weights = profile.get_ballot_weights()
+    return np.ones(n_ballots) if ballot_weights is None else ballot_weights.astype(float)
+
+def pav(profile:profiles.Profile, n_winners:int, local_search:bool=True)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Proportional Approval Voting: the committee maximizing sum over voters of 1 + 1/2 + ... + 1/k, where k is the number of winners the voter approves
+    The election scores are approval counts
+
+    NOTES
+    -----
+    Exact PAV is NP-hard. The committee is built by lazy greedy selection (RAV, with exact rather than float ties)
+    and then refined by swap local search if local_search is True (see committee.py)
+    '''
+    approvals = profile.get_approvals()
+    weights = ballot_weights_of(profile, len(approvals))
+    marginals = committee.pav_marginals(n_winners, np.sum(weights))
+    winners = committee.thiele_greedy(approvals, weights, n_winners, marginals)
+    if local_search:
+        winners = committee.thiele_local_search(approvals, weights, winners, marginals)
+    return np.asarray(winners), profile.get_approval_counts()
+
+def chamberlin_courant(profile:profiles.Profile, n_winners:int, local_search:bool=False)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Approval Chamberlin-Courant: the committee maximizing the number of voters who approve at least one winner
+    The election scores are approval counts
+
+    NOTES
+    -----
+    Lazy greedy selection, refined by swap local search if local_search is True (see committee.py)
+    '''
+    approvals = profile.get_approvals()
+    weights = ballot_weights_of(profile, len(approvals))
+    marginals = committee.cc_marginals(n_winners)
+    winners = committee.thiele_greedy(approvals, weights, n_winners, marginals)
+    if local_search:
+        winners = committee.thiele_local_search(approvals, weights, winners, marginals)
+    return np.asarray(winners), profile.get_approval_counts()
+
+def borda_score_matrix(profile:profiles.Profile)->np.ndarray:
+    '''
+    n_ballots x n_cands, entry [b][c] is the Borda score (n_cands-1 - position) ballot b gives cand c
+    '''
+    n_cands = profile.get_n_cands()
+    orders = np.array(list(profile.get_orders().values()), dtype=int).reshape(-1, n_cands)
+    scores = np.empty_like(orders)
+    np.put_along_axis(scores, orders, np.arange(n_cands-1, -1, -1), axis=1)
+    return scores
+
+def cc_borda(profile:profiles.Profile, n_winners:int, local_search:bool=False)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Borda Chamberlin-Courant: the committee maximizing the sum over voters of the Borda score of their favourite winner
+    The election scores are Borda scores
+
+    NOTES
+    -----
+    Lazy greedy selection, refined by swap local search if local_search is True (see committee.py)
+    '''
+    scores = borda_score_matrix(profile)
+    weights = ballot_weights_of(profile, len(scores))
+    winners = committee.cc_borda_greedy(scores, weights, n_winners)
+    if local_search:
+        winners = committee.cc_borda_local_search(scores, weights, winners)
+    return np.asarray(winners), weights @ scores
+
+def selection_order(profile:profiles.Profile, key, order_func:Callable)->list:
+    '''
+    Full selection order of a committee rule on a profile, computed once per profile (and approval params) and then reused for every n_winners
+    '''
+    orders = profile.get_committee_orders()
+    if key not in orders:
+        orders[key] = order_func()
+    return orders[key]
+
+def seq_phragmen(profile:profiles.Profile, n_winners:int)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Sequential Phragmén with lowest id tie-breaking (see committee.seq_phragmen_order)
+    The election scores are approval counts
+
+    NOTES
+    -----
+    The rule is committee monotone, so one selection order per profile gives the committees of every size
+    '''
+    approvals = profile.get_approvals()
+    weights = ballot_weights_of(profile, len(approvals))
+    order = selection_order(profile, 'seq_phragmen', lambda: committee.seq_phragmen_order(approvals, weights))
+    return np.asarray(order[:n_winners]), profile.get_approval_counts()
+
+def mes(profile:profiles.Profile, n_winners:int)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Method of Equal Shares with approval utilities, completed by approval count, with lowest id tie-breaking (see committee.mes_order)
+    The election scores are approval counts
+
+    NOTES
+    -----
+    Voter budgets depend on the committee size, so there is one selection order per n_winners
+    '''
+    approvals = profile.get_approvals()
+    weights = ballot_weights_of(profile, len(approvals))
+    order = selection_order(profile, ('mes', n_winners), lambda: committee.mes_order(approvals, weights, n_winners))
+    return np.asarray(order[:n_winners]), profile.get_approval_counts()
+
 def max_agreement(profile, n_winners, seed=None)->Tuple[np.ndarray, np.ndarray]:
     '''
     Takes the top n_winners cands with the largest sum of scores from the candidates
@@ -153,14 +257,14 @@ def max_agreement(profile, n_winners, seed=None)->Tuple[np.ndarray, np.ndarray]:
     Rename, because the scores from voters do not have to be equal to agreements with cands
     
     '''
-    agreements = list(profile.get_agreements().values())
-    agreement_sums = np.sum(np.vstack(agreements), axis=0)
+    agreement_sums = profile.get_agreement_sums()
     augmented_agreements = helper.array1D_to_sorted(agreement_sums, seed)
     agreements_tiebroken = augmented_agreements[:,0]
     winners = augmented_agreements[:,2][-n_winners:].astype(int)
     return winners, agreement_sums
 
 def irv_whalrus(profile, n_winners)->Tuple[np.ndarray, np.ndarray]:
+    import whalrus #imported on first use so workers that never run IRV do not pay for it
     whalrus_orders = profile.get_whalrus_orders()
     rule = whalrus.RuleIRV(whalrus_orders, tie_break=whalrus.Priority.RANDOM)
     return rule.strict_order_[:n_winners], np.ones(profile.get_n_cands()) #election_scores are uniform
@@ -172,6 +276,8 @@ def rule_dispatcher(rule_name:str)->Callable:
     '''
     if not isinstance(rule_name, str):
         raise ValueError(f'Rule name must be a string, cannot be: {rule_name}')
+    if reference.is_reference() and rule_name.lower() in reference.RULES:
+        return reference.RULES[rule_name.lower()]
     if rule_name.lower() == 'borda':
         return borda
     elif rule_name.lower() == 'plurality':
@@ -182,6 +288,20 @@ def rule_dispatcher(rule_name:str)->Callable:
         return max_approval
     elif rule_name.lower() == 'rav':
         return rav
+    elif rule_name.lower() == 'pav':
+        return pav
+    elif rule_name.lower() == 'cc':
+        return chamberlin_courant
+    elif rule_name.lower() == 'cc_ls':
+        return functools.partial(chamberlin_courant, local_search=True)
+    elif rule_name.lower() == 'cc_borda':
+        return cc_borda
+    elif rule_name.lower() == 'cc_borda_ls':
+        return functools.partial(cc_borda, local_search=True)
+    elif rule_name.lower() == 'seq_phragmen':
+        return seq_phragmen
+    elif rule_name.lower() == 'mes':
+        return mes
     elif rule_name.lower() == 'max_agreement':
         return max_agreement
     elif rule_name.lower() =='irv':
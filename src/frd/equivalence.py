@@ -0,0 +1,162 @@
+import logging
+import math
+import numpy as np
+
+from . import helper as helper
+from . import profiles as profiles
+from . import election_rules as rules
+from . import delegative_voting as d_voting
+from . import reference as reference
+from . import simulate as simulate
+
+'''
+Equivalence harness for the fast code paths against the reference backend (reference.py).
+
+Exact checks run the fast and reference implementations on the same profile from the same random state, and require equal results:
+scores, winners (ties are broken by the same draws), rep weights and delegators, and weighted majority outcomes.
+Approvals are drawn differently by the two backends (random tie-breaking among equally distant cands),
+so the check is that every voter approves the same number of cands at the same distances.
+
+The distributional check (compare_moments) runs whole iterations of an experiment with each backend on independent seeds
+and compares the agreement moments of every parameter combination, for the paths whose random draws differ.
+'''
+
+def same_state(seed:int, *funcs)->list:
+    '''
+    Call each func from the same random state
+    '''
+    results = []
+    for func in funcs:
+        np.random.seed(seed)
+        results.append(func())
+    return results
+
+def result(check:str, passed, detail:str='')->dict:
+    return {'check':check, 'passed':passed, 'detail':detail}
+
+def check_rules(profile:profiles.Profile, n_winners:int, seed:int=0)->list:
+    '''
+    Exact checks of the election rules and profile derivations with a fast rewrite, on one profile (with approvals and orders derived)
+
+    RETURNS
+    -------
+    results (list of dicts): check name, passed (True, False, or None if the check could not run), and detail
+    '''
+    results = []
+    n_cands = profile.get_n_cands()
+    for name, score_vector in [('borda', np.arange(n_cands-1, -1, -1, dtype=int)), ('plurality', np.eye(1, n_cands, dtype=int)[0])]:
+        fast, ref = rules.score_orders(profile, score_vector), reference.score_orders(profile, score_vector)
+        results.append(result(f'score_orders_{name}', bool(np.array_equal(fast, ref)), f'{fast} vs {ref}'))
+    for name in ['borda', 'plurality', 'max_approval', 'rav']:
+        fast, ref = same_state(seed, lambda: rules.rule_dispatcher(name)(profile, n_winners), lambda: reference.RULES[name](profile, n_winners))
+        passed = np.array_equal(fast[0], ref[0]) and np.array_equal(fast[1], ref[1])
+        results.append(result(name, bool(passed), f'winners {fast[0]} vs {ref[0]}'))
+
+    distances = profile.get_distances()
+    fast_approvals = profile.get_approvals()
+    np.random.seed(seed)
+    ref_approvals = reference.distances_to_approvals(profile)
+    mismatched = [v for v in range(profile.get_n_voters())
+                  if not np.array_equal(np.sort(distances[v, fast_approvals[v]]), np.sort(distances[v, ref_approvals[v]]))]
+    results.append(result('distances_to_approvals', not mismatched, f'voters with different approved distances: {mismatched[:10]}'))
+
+    try:
+        fast, ref = same_state(seed, lambda: rules.irv_whalrus(profile, n_winners), lambda: reference.irv_whalrus(profile, n_winners))
+        results.append(result('irv', bool(np.array_equal(fast[0], ref[0])), f'winners {fast[0]} vs {ref[0]}'))
+    except Exception as e: #whalrus does not run on every python version
+        results.append(result('irv', None, f'{type(e).__name__}: {e}'))
+    return results
+
+def check_frd(profile:profiles.Profile, rep_ids, del_voting_params:list, seed:int=0)->list:
+    '''
+    Exact checks of FRD delegation and weighted majority against reference.ReferenceFRD with the same reps, for each (default, del_style, best_k, n_delegators)
+
+    NOTES
+    -----
+    Rep weights are compared as fractions of a vote (FRD keeps integer units of 1/weight_scale()).
+    Outcomes are compared on the issues that are not exact weighted majority ties: the reference compares float sums and can miss
+    an exact tie by rounding, after which the two draw different tie-breaking coin flips. The number of such issues is reported.
+    '''
+    results = []
+    c_prefs = profile.get_issue_prefs()[1]
+    for default, del_style, best_k, n_delegators in del_voting_params:
+        name = f'frd_{del_style}_{best_k}_{n_delegators}'
+        frd = d_voting.FRD(profile, 'random_winners', len(rep_ids), del_style, best_k, n_delegators, default=default)
+        frd.set_rep_ids(rep_ids)
+        ref = reference.ReferenceFRD(profile, rep_ids, len(rep_ids), del_style, best_k, n_delegators, default=default)
+        same_state(seed, frd.weight_reps, ref.weight_reps)
+        fast_weights = frd.rep_weights / frd.weight_scale()
+        ref_weights = np.array([ref.rep_weights[i] for i in range(profile.get_n_issues())])
+        same_delegators = np.array_equal(np.sort(frd.delegator_ids), np.sort(ref.delegator_ids))
+        results.append(result(name+'_weights', bool(same_delegators and np.allclose(fast_weights, ref_weights, rtol=0, atol=1e-9)),
+                              f'max weight difference {np.max(np.abs(fast_weights-ref_weights)):.3g}, same delegators: {same_delegators}'))
+
+        fast_outcomes, ref_outcomes = same_state(seed, lambda: d_voting.stacked_weighted_majority(c_prefs, frd.rep_weights, rtol=frd.tie_rtol()), ref.weighted_majority)
+        weight_sums = np.sum(frd.rep_weights, axis=-1)
+        ties = np.abs(2*np.sum(c_prefs.T * frd.rep_weights, axis=-1) - weight_sums) <= frd.tie_rtol()*weight_sums
+        agree = np.asarray(fast_outcomes)[~ties] == np.asarray(ref_outcomes)[~ties]
+        results.append(result(name+'_outcomes', bool(agree.all()), f'{np.count_nonzero(~agree)} non-tied issues differ, {np.count_nonzero(ties)} exact ties'))
+    return results
+
+def run_exact_checks(n_profiles:int, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, app_k, app_thresh, n_reps:int,
+                     del_voting_params:list=None, seed:int=0):
+    '''
+    Run check_rules and check_frd on n_profiles random profiles
+
+    PARAMS
+    ------
+    del_voting_params (list): tuples of (default, del_style, best_k, n_delegators), by default incisive and best_k delegation with n_voters//4 delegators
+
+    RETURNS
+    -------
+    df (pd.DataFrame): a row per profile and check, with cols profile, check, passed, and detail
+    '''
+    import pandas as pd
+    if del_voting_params is None:
+        del_voting_params = [('uniform', 'incisive', None, n_voters//4), ('uniform', 'best_k', min(3, n_reps), n_voters//4)]
+    rows = []
+    for i in range(n_profiles):
+        np.random.seed(helper.iteration_seed(seed, i))
+        profile = profiles.Profile(n_voters, n_cands, n_issues, voters_p, cands_p, app_k, app_thresh)
+        profile.new_instance()
+        rep_ids = np.random.choice(n_cands, n_reps, replace=False)
+        for row in check_rules(profile, n_reps, seed=i) + check_frd(profile, rep_ids, del_voting_params, seed=i):
+            rows.append({'profile':i, **row})
+    df = pd.DataFrame(rows)
+    failed = df[df['passed'] == False]
+    if len(failed):
+        logging.warning(f'{len(failed)} exact equivalence checks failed: {sorted(set(failed["check"]))}')
+    return df
+
+def compare_moments(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, n_iter:int, seed:int=0, z_tol:float=4.0):
+    '''
+    Run n_iter iterations of an experiment with each backend (on independent seeds) and compare the mean and variance of agreement
+    of every parameter combination
+
+    RETURNS
+    -------
+    df (pd.DataFrame): params, mean and variance with each backend, and z score of the difference of the means
+
+    NOTES
+    -----
+    Logs a warning for each combination whose |z| exceeds z_tol
+    '''
+    import pandas as pd
+    agreements = {}
+    for b, backend in enumerate(reference.BACKENDS):
+        with reference.use_backend(backend):
+            for it in range(n_iter):
+                np.random.seed(helper.iteration_seed(seed, b*n_iter + it))
+                for k, v in simulate.single_iter(profile_param_vals, election_param_vals, del_voting_param_vals).items():
+                    agreements.setdefault(k, {}).setdefault(backend, []).append(v[0])
+    param_names = list(helper.merge_dicts([profile_param_vals, election_param_vals, del_voting_param_vals]).keys())
+    rows = []
+    for key, by_backend in agreements.items():
+        fast, ref = np.asarray(by_backend['fast']), np.asarray(by_backend['reference'])
+        se = math.sqrt(fast.var()/len(fast) + ref.var()/len(ref))
+        diff = fast.mean() - ref.mean()
+        z = diff/se if se > 0 else (0.0 if diff == 0 else np.inf)
+        if abs(z) > z_tol:
+            logging.warning(f'Mean agreement of the fast backend is {z:.1f} standard errors from the reference for params {key}')
+        rows.append(list(key) + [fast.mean(), ref.mean(), fast.var(), ref.var(), n_iter, z])
+    return pd.DataFrame(rows, columns=param_names+['fast_mean','reference_mean','fast_variance','reference_variance','n_iter','z'])
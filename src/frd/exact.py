@@ -0,0 +1,235 @@
+import math
+import itertools
+import logging
+from pathlib import Path
+import numpy as np
+
+from . import helper as helper
+from . import save_data as save_data
+
+'''
+Exact evaluation of the agreement distribution for cases where it is tractable, instead of Monte Carlo simulation.
+
+Closed form: RD with uniform default and random_winners, with independent Bernoulli issue prefs.
+Reps are chosen independently of the prefs, so rep prefs are i.i.d. Bernoulli(cands_p) like all cand prefs,
+and issues are independent. The voter majority on an issue is 1 with probability q_v (a binomial tail, ties broken uniformly at random),
+and the rep majority is 1 with probability q_r. The outcome agrees with the voter majority on each issue independently with probability
+a = q_v*q_r + (1-q_v)*(1-q_r), so agreement ~ Binomial(n_issues, a) / n_issues.
+
+Small instances: enumerate_exact enumerates every issue pref profile (weighted by its probability) for rules whose only randomness
+is uniform tie-breaking among cands with equal scores, and handles the tie-breaking exactly.
+'''
+
+def majority_prob(n:int, p:float)->float:
+    '''
+    Probability that the majority of n i.i.d. Bernoulli(p) votes is 1, with ties broken uniformly at random
+    '''
+    from scipy import stats #imported on first use, scipy is slow to import
+    prob = stats.binom.sf(n//2, n, p) #P(X > floor(n/2))
+    if n % 2 == 0:
+        prob += 0.5*stats.binom.pmf(n//2, n, p)
+    return float(prob)
+
+def issue_agreement_prob(n_voters:int, voters_p:float, n_reps:int, cands_p:float)->float:
+    '''
+    Probability that the majority of n_reps reps with Bernoulli(cands_p) prefs agrees with the majority of n_voters voters with Bernoulli(voters_p) prefs on an issue
+    '''
+    q_v, q_r = majority_prob(n_voters, voters_p), majority_prob(n_reps, cands_p)
+    return q_v*q_r + (1-q_v)*(1-q_r)
+
+def pmf_moments(pmf:np.ndarray)->list:
+    '''
+    Mean, variance, skew, and (excess) kurtosis of agreement = k/n_issues where pmf[k] = P(k issues agree).
+    Same definitions as analysis.four_moments (population variance, biased skew, Fisher kurtosis), nan where they are undefined.
+    '''
+    n_issues = len(pmf)-1
+    x = np.arange(n_issues+1) / n_issues
+    mean = np.sum(pmf*x)
+    variance = np.sum(pmf*(x-mean)**2)
+    if variance <= 1e-15:
+        return [float(mean), 0.0, np.nan, np.nan]
+    skew = np.sum(pmf*(x-mean)**3) / variance**1.5
+    kurtosis = np.sum(pmf*(x-mean)**4) / variance**2 - 3
+    return [float(mean), float(variance), float(skew), float(kurtosis)]
+
+def binomial_moments(n_issues:int, a:float)->list:
+    '''
+    Mean, variance, skew, and (excess) kurtosis of Binomial(n_issues, a) / n_issues
+    '''
+    v = a*(1-a)
+    if v == 0:
+        return [a, 0.0, np.nan, np.nan]
+    return [a, v/n_issues, (1-2*a)/math.sqrt(n_issues*v), (1-6*v)/(n_issues*v)]
+
+def is_tractable(params:dict)->bool:
+    '''
+    Whether the agreement distribution of a parameter combination has a closed form (see module notes)
+    '''
+    return (params.get('election_rules') == 'random_winners'
+            and params.get('delegation_style') is None
+            and params.get('default_style') == 'uniform'
+            and params.get('intensity_dist') is None
+            and params.get('pref_model') in (None, 'bernoulli')
+            and params.get('voters_p') is not None
+            and params['n_reps'] <= params['n_cands'])
+
+def exact_moments(params:dict)->list:
+    '''
+    Exact mean, variance, skew, and kurtosis of agreement for a tractable parameter combination
+
+    PARAMS
+    ------
+    params (dict): keys are param names, values are single param values (one combination from an experiment)
+    '''
+    if not is_tractable(params):
+        raise ValueError(f'No closed form for the agreement distribution with params: {params}')
+    a = issue_agreement_prob(params['n_voters'], params['voters_p'], params['n_reps'], params['cands_p'])
+    return binomial_moments(params['n_issues'], a)
+
+def parse_param(s:str):
+    '''
+    Convert a param value as stored in data keys (string) back to None, int, float, bool, or str
+    '''
+    if s == 'None': return None
+    if s in ('True', 'False'): return s == 'True'
+    for t in (int, float):
+        try: return t(s)
+        except ValueError: pass
+    return s
+
+def exact_moments_table(experiment_params:dict):
+    '''
+    Moments of every tractable combination of an experiment, in the format of analysis.get_moments, without simulating
+
+    PARAMS
+    ------
+    experiment_params (dict): keys are param names, values are lists of param values (merged profile, election, and del voting params)
+
+    RETURNS
+    -------
+    df (pd.DataFrame): col for each param and cols for mean, variance, skew, and kurtosis, row for each tractable combination
+    '''
+    import pandas as pd
+    combos, param_names = helper.params_dict_to_tuples(experiment_params)
+    rows = []
+    for combo in combos:
+        params = dict(zip(param_names, combo))
+        if is_tractable(params):
+            rows.append(list(combo) + exact_moments(params))
+    return pd.DataFrame(rows, columns=param_names+['mean','variance','skew','kurtosis'])
+
+def validate_against_data(filename, param_names:list, data_dir=Path("../data"), z_tol=4.0):
+    '''
+    Compare the exact moments with the Monte Carlo results in a data file for every tractable combination
+
+    RETURNS
+    -------
+    df (pd.DataFrame): params, exact and Monte Carlo mean and variance, z score of the Monte Carlo mean (its standard error is sqrt(exact variance / n_iter)),
+                       and lag 1 autocorrelation of the agreements in iteration order
+
+    NOTES
+    -----
+    Logs a warning for each combination whose |z| exceeds z_tol
+    The standard error assumes independent iterations. Seeded runs (helper.iteration_seed) have no autocorrelation, while data from before per-iteration
+    seeding can have a large one, which makes the z scores too large.
+    '''
+    import pandas as pd
+    data = save_data.unpickle_data(filename, data_dir=data_dir)
+    rows = []
+    for key, agreements in data.items():
+        params = dict(zip(param_names, [parse_param(x) for x in key]))
+        if not is_tractable(params): continue
+        mean, variance, _, _ = exact_moments(params)
+        n_iter = len(agreements)
+        mc_mean, mc_variance = float(np.mean(agreements)), float(np.var(agreements))
+        z = (mc_mean-mean)/math.sqrt(variance/n_iter) if variance > 0 else (0.0 if mc_mean == mean else np.inf)
+        x = np.asarray(agreements) - mc_mean
+        autocorr = float(np.dot(x[:-1], x[1:]) / np.dot(x, x)) if n_iter > 1 and np.dot(x, x) > 0 else np.nan
+        if abs(z) > z_tol:
+            logging.warning(f'Monte Carlo mean {mc_mean} in {filename} is {z:.1f} standard errors from the exact mean {mean} for params {key}')
+        rows.append(list(key) + [mean, mc_mean, variance, mc_variance, n_iter, z, autocorr])
+    return pd.DataFrame(rows, columns=param_names+['exact_mean','mc_mean','exact_variance','mc_variance','n_iter','z','lag1_autocorr'])
+
+def winner_sets(scores:np.ndarray, n_winners:int)->list:
+    '''
+    Every set of winners of a top-n_winners election with uniform random tie-breaking, with its probability
+
+    RETURNS
+    -------
+    list of (winners (np.ndarray), probability (float))
+    '''
+    order = np.sort(scores)[::-1]
+    cutoff = order[n_winners-1]
+    above = np.nonzero(scores > cutoff)[0]
+    tied = np.nonzero(scores == cutoff)[0]
+    n_needed = n_winners - len(above)
+    subsets = list(itertools.combinations(tied, n_needed))
+    return [(np.concatenate((above, np.asarray(s, dtype=int))), 1/len(subsets)) for s in subsets]
+
+def majority_one_prob(prefs:np.ndarray)->np.ndarray:
+    '''
+    Probability that the (unweighted) majority on each issue is 1, with ties broken uniformly at random. Rows are agents, columns are issues.
+    '''
+    ones = np.sum(prefs, axis=0)
+    n = prefs.shape[0]
+    return np.where(ones > n/2, 1.0, np.where(ones < n/2, 0.0, 0.5))
+
+def poisson_binomial_pmf(probs:np.ndarray)->np.ndarray:
+    '''
+    pmf of the number of successes of independent Bernoulli trials with the given success probabilities
+    '''
+    pmf = np.array([1.0])
+    for p in probs:
+        pmf = np.convolve(pmf, [1-p, p])
+    return pmf
+
+def enumerate_exact(n_voters:int, n_cands:int, n_issues:int, voters_p:float, cands_p:float, election_rule:str, n_reps:int, app_thresh:float=0.5, max_bits:int=20):
+    '''
+    Exact distribution of RD agreement (uniform default) by enumerating every voter and cand issue pref profile of a small instance
+
+    PARAMS
+    ------
+    election_rule (str): 'random_winners', 'max_agreement', or 'max_approval'. max_approval assumes app_k >= n_cands,
+                        so voters approve exactly the cands whose distance is below app_thresh.
+    max_bits (int): Refuse instances with more than max_bits binary prefs (there are 2**(bits) profiles)
+
+    RETURNS
+    -------
+    moments (list): mean, variance, skew, and kurtosis of agreement
+    pmf (np.ndarray): pmf[k] = P(outcome agrees with voter majority on exactly k issues)
+
+    NOTES
+    -----
+    Rules that break ties within each voter's ranking (borda, plurality, irv) or use lexicographic tie-breaking (rav) are not supported
+    '''
+    if election_rule not in ('random_winners', 'max_agreement', 'max_approval'):
+        raise ValueError(f'Exact enumeration not supported for rule: {election_rule}')
+    n_bits = (n_voters + n_cands)*n_issues
+    if n_bits > max_bits:
+        raise ValueError(f'Instance has {n_bits} binary prefs, too many to enumerate (max_bits={max_bits})')
+
+    def profiles(n_agents, p):
+        for bits in itertools.product((0, 1), repeat=n_agents*n_issues):
+            prefs = np.asarray(bits).reshape(n_agents, n_issues)
+            ones = int(np.sum(prefs))
+            yield prefs, p**ones * (1-p)**(prefs.size-ones)
+
+    cand_profiles = list(profiles(n_cands, cands_p))
+    pmf = np.zeros(n_issues+1)
+    for v_pref, v_prob in profiles(n_voters, voters_p):
+        if v_prob == 0: continue
+        voter_one = majority_one_prob(v_pref)
+        for c_pref, c_prob in cand_profiles:
+            if c_prob == 0: continue
+            distances = np.sum(v_pref[:, None] != c_pref, axis=2) / n_issues
+            if election_rule == 'random_winners':
+                scores = np.ones(n_cands)
+            elif election_rule == 'max_agreement':
+                scores = np.sum(1-distances, axis=0)
+            else:
+                scores = np.sum(distances < app_thresh, axis=0)
+            for winners, w_prob in winner_sets(scores, n_reps):
+                rep_one = majority_one_prob(c_pref[winners])
+                agree = voter_one*rep_one + (1-voter_one)*(1-rep_one)
+                pmf += v_prob*c_prob*w_prob*poisson_binomial_pmf(agree)
+    return pmf_moments(pmf), pmf
@@ -23,6 +23,13 @@ def create_tiebreakers(n_vals, dtype=int, seed=None)->np.ndarray:
     else:
         raise ValueError('Invalid dtype for create_tiebreakers: {dtype}')
 
+def iteration_seed(seed:int, iteration:int)->int:
+    '''
+    Derive the random seed of one iteration of an experiment from the experiment seed, so that every iteration has its own independent
+    random stream that does not depend on which worker runs it or on how many iterations are run
+    '''
+    return int(np.random.SeedSequence(seed, spawn_key=(iteration,)).generate_state(1)[0])
+
 def array1D_to_sorted(array:np.ndarray, seed:int=None, tiebreakers=None, dtype=int):
     '''
     Does sort/argsort with ties are broken randomly instead of lexicographically.
@@ -0,0 +1,78 @@
+import re
+import numpy as np
+
+'''
+Distributions of voter preference intensities. A voter's intensity is the probability that they prefer 1 on each issue (a personalized voters_p),
+and with intensity-based delegation it also sets how likely they are to delegate (see FRD.intensity_delegators).
+
+An intensity_dist param is a spec string naming a registered distribution, with optional numeric args, e.g.
+    'uniform'               uniform on [0.5, 1] (the original intensity experiments)
+    'uniform(0,1)'          uniform on [0, 1]
+    'beta(2,5)'             beta with a=2, b=5
+    'truncnorm(0.75,0.1)'   normal with mean 0.75 and sd 0.1 truncated to [0, 1]
+or a mixture of them, with weights that are normalized to sum to 1, e.g.
+    '0.5*beta(8,2)+0.5*beta(2,8)'
+New distributions are added with register_intensity_dist, they are drawn for all voters at once (no per-voter loop).
+'''
+
+def uniform_intensities(n_voters:int, low:float=0.5, high:float=1.0)->np.ndarray:
+    return np.random.uniform(low=low, high=high, size=(n_voters,))
+
+def beta_intensities(n_voters:int, a:float, b:float)->np.ndarray:
+    return np.random.beta(a, b, size=(n_voters,))
+
+def truncnorm_intensities(n_voters:int, mean:float, sd:float, low:float=0.0, high:float=1.0)->np.ndarray:
+    from scipy import stats #imported on first use, scipy is slow to import
+    return stats.truncnorm.rvs((low-mean)/sd, (high-mean)/sd, loc=mean, scale=sd, size=n_voters) #drawn from numpy's global random state
+
+INTENSITY_DISTS = {'uniform':uniform_intensities, 'beta':beta_intensities, 'truncnorm':truncnorm_intensities}
+
+def register_intensity_dist(name:str, func)->None:
+    '''
+    Make a distribution available to intensity_dist specs. func(n_voters, *args) must return a 1D array of n_voters intensities in [0,1]
+    '''
+    if not re.fullmatch(r'\w+', name):
+        raise ValueError(f'Intensity dist name must be alphanumeric: {name}')
+    INTENSITY_DISTS[name] = func
+
+_COMPONENT = re.compile(r'\s*(?:([0-9.]+)\s*\*)?\s*(\w+)\s*(?:\(([^)]*)\))?\s*')
+
+def parse_intensity_dist(spec:str)->list:
+    '''
+    Parse an intensity_dist spec string
+
+    RETURNS
+    -------
+    components (list): (weight, name, args) for each component of the mixture, weights sum to 1
+    '''
+    components = []
+    for term in spec.split('+'):
+        match = _COMPONENT.fullmatch(term)
+        if match is None or match.group(2) not in INTENSITY_DISTS:
+            raise ValueError(f'Intensity dist not available: {spec}')
+        weight, name, args = match.groups()
+        args = [float(a) for a in args.split(',')] if args and args.strip() else []
+        components.append((float(weight) if weight else 1.0, name, args))
+    total = sum(w for w, _, _ in components)
+    if total <= 0:
+        raise ValueError(f'Intensity dist mixture weights must sum to a positive number: {spec}')
+    return [(w/total, name, args) for w, name, args in components]
+
+def draw_intensities(spec:str, n_voters:int)->np.ndarray:
+    '''
+    Draw the intensities of n_voters voters from the distribution given by an intensity_dist spec
+
+    NOTES
+    -----
+    For a mixture, the component of each voter is drawn first, then every component draws the intensities of all its voters at once
+    '''
+    components = parse_intensity_dist(spec)
+    if len(components) == 1:
+        _, name, args = components[0]
+        return INTENSITY_DISTS[name](n_voters, *args)
+    labels = np.random.choice(len(components), size=n_voters, p=[w for w, _, _ in components])
+    intensities = np.empty(n_voters)
+    for j, (_, name, args) in enumerate(components):
+        members = labels == j
+        intensities[members] = INTENSITY_DISTS[name](int(np.count_nonzero(members)), *args)
+    return intensities
@@ -0,0 +1,63 @@
+import contextlib
+import logging
+import logging.handlers
+
+'''
+Logging for parallel experiments: workers put their log records on a queue and one listener thread in the parent writes them
+with the parent's handlers (e.g. the frd.log file handler set by basicConfig), so workers never format to or contend for the log file.
+
+The per-profile and per-election messages of single_iter are sampled: only the iterations picked by sim_parallel's log_every are logged in detail,
+and every iteration counts its events instead, which the parent sums and logs once per experiment.
+'''
+
+@contextlib.contextmanager
+def queue_logging(ctx):
+    '''
+    Route the root logger of the parent through a queue to a listener thread that writes with the root logger's handlers, for the duration of the block
+
+    PARAMS
+    ------
+    ctx: multiprocessing context the workers are started with (see simulate.pool_context)
+
+    RETURNS
+    -------
+    queue: the queue to pass to init_worker, or None if the root logger has no handlers (nothing would be written)
+    '''
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        yield None
+        return
+    queue = ctx.Queue()
+    listener = logging.handlers.QueueListener(queue, *handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(queue)]
+    listener.start()
+    try:
+        yield queue
+    finally:
+        root.handlers = handlers
+        listener.stop() #writes the records still on the queue, then joins the listener thread
+
+def init_worker(queue, level:int)->None:
+    '''
+    Pool initializer: send the worker's log records to the parent's queue (or drop them if queue is None)
+    Replaces handlers inherited from the parent (with the fork start method), so only the parent's listener writes to the log file
+    '''
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(queue)] if queue is not None else [logging.NullHandler()]
+    root.setLevel(level)
+
+def log_event(counts:dict, detail:bool, event:str, msg:str, *args, level:int=logging.INFO)->None:
+    '''
+    Count an event of an iteration, and log it if the iteration is logged in detail.
+    msg is %-formatted with args only if the record is emitted.
+    '''
+    if counts is not None:
+        counts[event] = counts.get(event, 0) + 1
+    if detail:
+        logging.log(level, msg, *args, stacklevel=2) #attribute the record to the caller
+
+def merge_counts(counts:dict, new_counts:dict)->dict:
+    for k, v in new_counts.items():
+        counts[k] = counts.get(k, 0) + v
+    return counts
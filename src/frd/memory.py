@@ -0,0 +1,136 @@
+import tracemalloc
+import resource
+import contextlib
+import itertools
+import logging
+import os
+
+'''
+Memory instrumentation for experiments: peak allocation per stage and parameter combination (measured with tracemalloc in the workers)
+and a preflight estimate of the peak memory of a parameter grid, used to warn before launching a grid that does not fit in memory.
+'''
+
+WORKER_BASELINE_BYTES = 100*2**20 #rough footprint of an idle worker (interpreter, numpy)
+
+class StageTracker():
+    '''
+    Records the peak memory allocated (in bytes, above what was allocated when the stage started) by each stage of an iteration,
+    keyed by (stage, params) where params is the tuple of parameter values the stage depends on.
+    Keeps the max over all the times a stage is run with the same params.
+    '''
+    def __init__(self) -> None:
+        self.peaks = {}
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, stage:str, params:tuple):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            key = (stage, params)
+            self.peaks[key] = max(self.peaks.get(key, 0), peak)
+
+    def get_peaks(self)->dict:
+        return self.peaks
+
+def stage(tracker, stage:str, params:tuple):
+    '''
+    Context manager for a stage that is traced if tracker is a StageTracker and is a no-op if tracker is None
+    '''
+    if tracker is None:
+        return contextlib.nullcontext()
+    return tracker.stage(stage, params)
+
+def max_rss_bytes()->int:
+    '''
+    Peak resident set size of the current process in bytes (ru_maxrss is in kilobytes on Linux)
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def merge_peaks(peaks:dict, new_peaks:dict)->dict:
+    '''
+    Keep the max peak per key when merging the peaks of an iteration into those of the experiment
+    '''
+    for k, v in new_peaks.items():
+        peaks[k] = max(peaks.get(k, 0), v)
+    return peaks
+
+def estimate_iter_bytes(n_voters:int, n_cands:int, n_issues:int, frd:bool=False, approvals:bool=True, ordinals:bool=True, agreements:bool=True, n_ballots:int=None, app_k:int=None)->int:
+    '''
+    Estimate the peak bytes needed by one iteration for one parameter combination
+
+    NOTES
+    -----
+    The big transient is the n_voters x n_cands x n_issues boolean broadcast in Profile.issues_to_distances.
+    The rest are the issue prefs, the n_voters x n_cands derived profiles (distances, orders, agreements),
+    the sparse approvals (at most app_k cand ids per voter), and in FRD the n_issues x n_cands rep weights
+    If the profile is compressed into voter types, the derived profiles and the broadcast have n_ballots rows instead of n_voters
+    '''
+    if n_ballots is None: n_ballots = n_voters
+    issue_prefs = 8*(n_voters + n_cands)*n_issues
+    voter_cand = 8*n_ballots*n_cands
+    derived = 2*voter_cand #hamming distances and normalized distances
+    if approvals: derived += 8*n_ballots*(min(n_cands, app_k if app_k is not None else n_cands) + 1) #cand ids and offsets
+    if ordinals: derived += voter_cand
+    if agreements: derived += voter_cand
+    broadcast = n_ballots*n_cands*n_issues #bool
+    rep_weights = 8*n_cands*n_issues if frd else 0
+    return issue_prefs + derived + broadcast + rep_weights
+
+def estimate_grid_bytes(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, coupled:bool=False, compress:bool=False, stream_chunk_size:int=None)->int:
+    '''
+    Estimate the peak bytes of one iteration over the largest combination in the grid of an experiment
+    (plus the common random numbers held for the whole iteration if profiles are coupled)
+    Streaming profiles only hold one chunk of voters at a time
+    '''
+    election_rules = set(election_param_vals.get('election_rules', []))
+    frd = del_voting_param_vals.get('delegation_style', [None]) != [None]
+    approvals = not election_rules.isdisjoint(['max_approval', 'rav', 'pav', 'cc', 'cc_ls', 'seq_phragmen', 'mes']) or 'approval' in del_voting_param_vals.get('delegation_style', [])
+    app_k = max(profile_param_vals.get('app_k', [None]), key=lambda k: -1 if k is None else k)
+    ordinals = not election_rules.isdisjoint(['borda', 'plurality', 'cc_borda', 'cc_borda_ls', 'irv'])
+    agreements = 'max_agreement' in election_rules
+    sizes = itertools.product(profile_param_vals['n_voters'], profile_param_vals['n_cands'], profile_param_vals['n_issues'])
+    if stream_chunk_size:
+        sizes = [(min(v, stream_chunk_size), c, s) for v, c, s in sizes]
+    peak = max(estimate_iter_bytes(v, c, s, frd, approvals, ordinals, agreements, n_ballots=min(v, 2**s) if compress else None, app_k=app_k) for v, c, s in sizes)
+    if coupled:
+        peak += 8*(max(profile_param_vals['n_voters']) + max(profile_param_vals['n_cands']))*max(profile_param_vals['n_issues'])
+    return peak
+
+def available_bytes():
+    '''
+    Physical memory available on this machine, or None if it cannot be determined
+    '''
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def preflight(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, n_workers:int, memory_budget=None, experiment_name=None, coupled:bool=False, compress:bool=False, stream_chunk_size:int=None)->int:
+    '''
+    Estimate the peak memory of running an experiment on n_workers workers and warn if it exceeds the memory budget
+
+    PARAMS
+    ------
+    memory_budget (int): Bytes the experiment may use. If None, the physical memory currently available is used.
+
+    RETURNS
+    -------
+    estimate (int): Estimated peak bytes over all workers
+    '''
+    estimate = n_workers * (WORKER_BASELINE_BYTES + estimate_grid_bytes(profile_param_vals, election_param_vals, del_voting_param_vals, coupled=coupled, compress=compress, stream_chunk_size=stream_chunk_size))
+    if memory_budget is None: memory_budget = available_bytes()
+    logging.info(f'Preflight memory estimate for {experiment_name}: {estimate/2**20:.0f} MiB on {n_workers} workers (budget: {memory_budget})')
+    if memory_budget is not None and estimate > memory_budget:
+        msg = f'Experiment {experiment_name} is estimated to need {estimate/2**20:.0f} MiB on {n_workers} workers, which exceeds the memory budget of {memory_budget/2**20:.0f} MiB'
+        logging.warning(msg)
+    return estimate
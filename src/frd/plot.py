@@ -9,6 +9,7 @@ from os.path import isfile, join
 import logging
 
 from . import helper as helper
+from . import analysis as analysis
 
 #Given a data file with experiments, we want to generate line plots
 #Each line plot has an x_var, and y_var, and a l_var determining what each line represents (e.g. rules)
@@ -131,26 +132,62 @@ def create_subtitle(x_var:str, y_var:str, params:dict):
 #         plt.show()
 
 
-def plot_one_var(filename, experiment_name, x_var:str, y_var='mean', save=True, show=False, data_dir=Path("./data")):
+def plot_name(experiment_name, x_var:str, y_var:str, plot_dir=Path("../plots"))->str:
+    '''
+    Path of the png file a plot of y_var vs x_var for an experiment is saved to
+    '''
+    return os.path.join(plot_dir, experiment_name+'_'+y_var+'_vs_'+x_var+'.png')
+
+def hue_palette(df:pd.DataFrame, l_var:str)->dict:
+    '''
+    Color of each level of l_var (sorted if numeric, else in order of appearance), passed to the lineplot and to add_error_bands
+    so that each band is drawn in the color of its line
+    '''
+    levels = df[l_var].unique()
+    if pd.api.types.is_numeric_dtype(df[l_var]): levels = np.sort(levels)
+    return dict(zip(levels, sns.color_palette(n_colors=len(levels))))
+
+def add_error_bands(p, df:pd.DataFrame, x_var:str, y_var:str, l_var:str=None, colors=None)->None:
+    '''
+    Shade the confidence interval of the mean around each line of a lineplot, in the color of its line,
+    if y_var is the mean and the moments have confidence intervals (mean_ci_low and mean_ci_high cols)
+
+    PARAMS
+    ------
+    colors: The color of the line if l_var is None, else a dict of the color of each level of l_var (the lineplot's palette, see hue_palette)
+    '''
+    if y_var != 'mean' or not {'mean_ci_low', 'mean_ci_high'}.issubset(df.columns): return
+    if l_var is None:
+        groups = [(df, colors if colors is not None else sns.color_palette()[0])]
+    else:
+        if colors is None: colors = hue_palette(df, l_var)
+        groups = [(df[df[l_var] == level], color) for level, color in colors.items()]
+    for group, color in groups:
+        if pd.api.types.is_numeric_dtype(group[x_var]): group = group.sort_values(x_var)
+        p.fill_between(group[x_var], group['mean_ci_low'], group['mean_ci_high'], color=color, alpha=0.2, linewidth=0)
+
+def plot_one_var(filename, experiment_name, x_var:str, y_var='mean', save=True, show=False, data_dir=Path("./data"), plot_dir=Path("../plots")):
     logging.info(f'Creating one line plot for experiment {experiment_name}')
     check_filetype(filename, 'csv')
     df = pd.read_csv(os.path.join(data_dir,filename))
     df[x_var] = df[x_var].apply(lambda x: var_to_title(x))
     sns.set(rc={"figure.figsize":(8, 8)})
     sns.set_style("white")
-    p = sns.lineplot(data=df, x=x_var, y=y_var)
+    color = sns.color_palette()[0]
+    p = sns.lineplot(data=df, x=x_var, y=y_var, color=color)
+    add_error_bands(p, df, x_var, y_var, colors=color)
     title, xlabel, ylabel = label_plot(x_var, y_var)
     if y_var == 'mean': p.set_yticks(np.arange(0,101,10)/100)
     p.set(title=title, xlabel=xlabel, ylabel=ylabel)
     if save:
         fig = p.get_figure()
-        plotname = os.path.join("../plots", experiment_name+'_'+y_var+'_vs_'+x_var)
+        plotname = plot_name(experiment_name, x_var, y_var, plot_dir)
         fig.savefig(plotname)
         if not show: plt.close(fig)
     if show:
         plt.show()
 
-def plot_two_var(filename, experiment_name, l_var:str, x_var:str, y_var='mean', save=True, show=False, data_dir=Path("./data")):
+def plot_two_var(filename, experiment_name, l_var:str, x_var:str, y_var='mean', save=True, show=False, data_dir=Path("./data"), plot_dir=Path("../plots")):
     logging.info(f'Creating two line plots for experiment {experiment_name}')
     check_filetype(filename, 'csv')
     df = pd.read_csv(os.path.join(data_dir,filename))
@@ -160,7 +197,9 @@ def plot_two_var(filename, experiment_name, l_var:str, x_var:str, y_var='mean',
     sns.set(rc={"figure.figsize":(8, 8)})
     sns.set_style("white")
     # p = sns.lineplot(data=df, x=x_var, y=y_var, hue=l_var, dashes=False, markers=True, style=l_var)
-    p = sns.lineplot(data=df, x=x_var, y=y_var, hue=l_var, dashes=False)
+    palette = hue_palette(df, l_var)
+    p = sns.lineplot(data=df, x=x_var, y=y_var, hue=l_var, hue_order=list(palette), palette=palette, dashes=False)
+    add_error_bands(p, df, x_var, y_var, l_var=l_var, colors=palette)
 
     #format the plot
     title, xlabel, ylabel = label_plot(x_var, y_var)
@@ -174,38 +213,45 @@ def plot_two_var(filename, experiment_name, l_var:str, x_var:str, y_var='mean',
     #Create figure for plot and save/show it
     if save: 
         fig = p.get_figure()
-        plotname = os.path.join("../plots", experiment_name+'_'+y_var+'_vs_'+x_var)
+        plotname = plot_name(experiment_name, x_var, y_var, plot_dir)
         fig.savefig(plotname)
         if not show: plt.close(fig)
     if show: 
         plt.show()
     
 
-def plot_moments(momentsfile:str, y_var:str='mean', save:bool=True, show:bool=False, data_dir=Path("./data")):
+def plot_targets(momentsfile:str, y_var:str='mean', data_dir=Path("./data"), plot_dir=Path("../plots"))->list:
     '''
-    Given file with moments data and a y_var, create a plot showing the behavior of the independent variable(s)
+    Given file with moments data and a y_var, list the plots to create for the independent variable(s) of the experiment
 
-    TODO
-    -----
-    determine if one var or two far then call the correct plotting function
-    Call this in compare_all to simplify
+    RETURNS
+    -------
+    targets (list of tuples): (plotname, plot_func, kwargs) where plotname is the png that plot_func(**kwargs) saves
     '''
-    #
     check_filetype(momentsfile, 'csv')
     experiment_name = momentsfile.partition('_moments')[0]
     df = pd.read_csv(os.path.join(data_dir,momentsfile))
-    varied = get_columns_with_multiple_unique_values(df.iloc[:,1:-4])#Only the independent variables, ignore index column
+    varied = get_columns_with_multiple_unique_values(df.iloc[:,1:].drop(columns=analysis.STAT_COLS, errors='ignore'))#Only the independent variables, ignore index column and moments
+    kwargs = {'filename':momentsfile, 'experiment_name':experiment_name, 'y_var':y_var, 'data_dir':data_dir, 'plot_dir':plot_dir}
     if len(varied) > 2:
         print(f'Moments file contains more than two independent variables, cannot automatically plot comparisons: {momentsfile}')
+        return []
     elif len(varied) == 2:
-        print(f"Independent variables: {varied[0]} and {varied[1]}")
-        plot_two_var(momentsfile, experiment_name, l_var=varied[0], x_var=varied[1], y_var=y_var, save=save, show=show, data_dir=data_dir)
-        plot_two_var(momentsfile, experiment_name, l_var=varied[1], x_var=varied[0], y_var=y_var, save=save, show=show, data_dir=data_dir)
+        return [(plot_name(experiment_name, varied[1], y_var, plot_dir), plot_two_var, dict(kwargs, l_var=varied[0], x_var=varied[1])),
+                (plot_name(experiment_name, varied[0], y_var, plot_dir), plot_two_var, dict(kwargs, l_var=varied[1], x_var=varied[0]))]
     elif len(varied) == 1:
-        plot_one_var(momentsfile, experiment_name, x_var=varied[0], y_var=y_var, save=save, show=show, data_dir=data_dir)
+        return [(plot_name(experiment_name, varied[0], y_var, plot_dir), plot_one_var, dict(kwargs, x_var=varied[0]))]
+    return []
+
+def plot_moments(momentsfile:str, y_var:str='mean', save:bool=True, show:bool=False, data_dir=Path("./data"), plot_dir=Path("../plots")):
+    '''
+    Given file with moments data and a y_var, create a plot showing the behavior of the independent variable(s)
+    '''
+    for _, plot_func, kwargs in plot_targets(momentsfile, y_var=y_var, data_dir=data_dir, plot_dir=plot_dir):
+        plot_func(save=save, show=show, **kwargs)
 
 
-def compare_all(data_dir=Path("./data"), y_var='mean', save=True, show=True)->None:
+def compare_all(data_dir=Path("./data"), y_var='mean', save=True, show=True, plot_dir=Path("../plots"))->None:
     '''
     For all experiments with 1 or 2 independent variables, read in the moments, and create a line plot
     The variable for the y-axis is given, and the x_var and l_var are inferred
@@ -222,7 +268,7 @@ def compare_all(data_dir=Path("./data"), y_var='mean', save=True, show=True)->No
 
     #for each experiment, read in the data and plot based on number of idnependent variables
     for idx,f in enumerate(momentfiles):
-        plot_moments(f, y_var=y_var, save=save, show=show, data_dir=data_dir)
+        plot_moments(f, y_var=y_var, save=save, show=show, data_dir=data_dir, plot_dir=plot_dir)
 
 def get_columns_with_multiple_unique_values(df:pd.DataFrame)->list:
     '''
@@ -0,0 +1,121 @@
+import re
+import numpy as np
+
+'''
+Structured models of voter and cand issue prefs, as an alternative to independent Bernoulli draws.
+A model first draws a "world" shared by the voters and cands of a profile (e.g. bloc positions or issue directions),
+then the prefs of any number of agents from it, as whole matrices (no per-agent loop).
+
+A pref_model profile param is a spec string naming a registered model, with optional numeric args, e.g.
+    'bernoulli'             independent Bernoulli(p) prefs (the default)
+    'polarized(0.9)'        two blocs with opposite positions, agents agree with their bloc on each issue with probability 0.9 (cohesion).
+                            p is the share of agents in the first bloc.
+    'spatial(2)'            ideal points in a 2D Euclidean space, each issue is a random direction and an agent prefers 1 iff their projection
+                            is above the cutoff that makes P(1) = p. 'spatial(2,0.5)' adds N(0, 0.5**2) noise to the projections.
+    'mallows(0.25)'         Mallows noise around a reference pref vector: P(prefs) is proportional to 0.25**(Hamming distance to the reference),
+                            so each issue flips with probability 0.25/1.25. 'mallows(0.25,3)' draws each agent around one of 3 references. p is not used.
+where p is voters_p for voters and cands_p for cands.
+
+Every model has a batched form: with batch=b, worlds and prefs get a leading axis of size b, i.e. b independent profiles drawn at once.
+rng is np.random (the global random state) or a np.random.RandomState.
+New models are added with register_pref_model.
+'''
+
+def bernoulli_world(n_issues:int, rng=np.random, batch:int=None)->dict:
+    return {}
+
+def bernoulli_agents(world:dict, n_agents:int, n_issues:int, p, rng=np.random, batch:int=None)->np.ndarray:
+    return rng.binomial(1, p, size=batch_shape(batch, n_agents, n_issues))
+
+def polarized_world(n_issues:int, cohesion:float=0.9, rng=np.random, batch:int=None)->dict:
+    return {'position':rng.binomial(1, 0.5, size=batch_shape(batch, n_issues))} #first bloc's position, the second bloc's is its complement
+
+def polarized_agents(world:dict, n_agents:int, n_issues:int, p, cohesion:float=0.9, rng=np.random, batch:int=None)->np.ndarray:
+    first_bloc = rng.random_sample(batch_shape(batch, n_agents, 1)) < p
+    position = world['position'][..., None, :]
+    bloc_position = np.where(first_bloc, position, 1-position)
+    defects = rng.random_sample(batch_shape(batch, n_agents, n_issues)) >= cohesion
+    return bloc_position ^ defects
+
+def spatial_world(n_issues:int, dim:float=2, noise:float=0.0, rng=np.random, batch:int=None)->dict:
+    directions = rng.normal(size=batch_shape(batch, int(dim), n_issues))
+    return {'directions':directions / np.linalg.norm(directions, axis=-2, keepdims=True)} #unit vector of each issue
+
+def spatial_agents(world:dict, n_agents:int, n_issues:int, p, dim:float=2, noise:float=0.0, rng=np.random, batch:int=None)->np.ndarray:
+    from scipy import special #imported on first use, scipy is slow to import
+    points = rng.normal(size=batch_shape(batch, n_agents, int(dim)))
+    projections = points @ world['directions'] #N(0,1) on every issue
+    if noise:
+        projections = projections + noise*rng.normal(size=projections.shape)
+    cutoff = special.ndtri(1-p) * np.sqrt(1 + noise**2) #P(projection > cutoff) = p
+    return (projections > cutoff).astype(int)
+
+def mallows_world(n_issues:int, phi:float=0.5, n_refs:float=1, rng=np.random, batch:int=None)->dict:
+    return {'references':rng.binomial(1, 0.5, size=batch_shape(batch, int(n_refs), n_issues))}
+
+def mallows_agents(world:dict, n_agents:int, n_issues:int, p, phi:float=0.5, n_refs:float=1, rng=np.random, batch:int=None)->np.ndarray:
+    references = world['references']
+    which = rng.randint(references.shape[-2], size=batch_shape(batch, n_agents))
+    centers = np.take_along_axis(references, which[..., None], axis=-2) if batch else references[which]
+    flips = rng.random_sample(batch_shape(batch, n_agents, n_issues)) < phi / (1 + phi)
+    return centers ^ flips
+
+PREF_MODELS = {'bernoulli':(bernoulli_world, bernoulli_agents),
+               'polarized':(polarized_world, polarized_agents),
+               'spatial':(spatial_world, spatial_agents),
+               'mallows':(mallows_world, mallows_agents)}
+
+def register_pref_model(name:str, world_func, agents_func)->None:
+    '''
+    Make a model available to pref_model specs.
+    world_func(n_issues, *args, rng=, batch=) returns a dict, agents_func(world, n_agents, n_issues, p, *args, rng=, batch=) returns a binary array
+    of shape (n_agents, n_issues), or (batch, n_agents, n_issues) if batch is given
+    '''
+    if not re.fullmatch(r'\w+', name):
+        raise ValueError(f'Pref model name must be alphanumeric: {name}')
+    PREF_MODELS[name] = (world_func, agents_func)
+
+def batch_shape(batch:int, *shape)->tuple:
+    return shape if batch is None else (batch,) + shape
+
+_SPEC = re.compile(r'\s*(\w+)\s*(?:\(([^)]*)\))?\s*')
+
+def parse_pref_model(spec)->tuple:
+    '''
+    Parse a pref_model spec string (None is 'bernoulli')
+
+    RETURNS
+    -------
+    name (str), args (list of floats)
+    '''
+    if spec is None:
+        return 'bernoulli', []
+    match = _SPEC.fullmatch(spec)
+    if match is None or match.group(1) not in PREF_MODELS:
+        raise ValueError(f'Pref model not available: {spec}')
+    name, args = match.groups()
+    return name, [float(a) for a in args.split(',')] if args and args.strip() else []
+
+def is_bernoulli(spec)->bool:
+    return parse_pref_model(spec)[0] == 'bernoulli'
+
+def draw_world(spec, n_issues:int, rng=np.random, batch:int=None)->dict:
+    name, args = parse_pref_model(spec)
+    return PREF_MODELS[name][0](n_issues, *args, rng=rng, batch=batch)
+
+def draw_agents(spec, world:dict, n_agents:int, n_issues:int, p, rng=np.random, batch:int=None)->np.ndarray:
+    name, args = parse_pref_model(spec)
+    return PREF_MODELS[name][1](world, n_agents, n_issues, p, *args, rng=rng, batch=batch)
+
+def draw_issue_prefs(spec, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, rng=np.random, batch:int=None):
+    '''
+    Draw a world, then the voter and cand prefs of a profile from it
+
+    RETURNS
+    -------
+    v_pref (np.ndarray), c_pref (np.ndarray): n_voters x n_issues and n_cands x n_issues, with a leading batch axis if batch is given
+    '''
+    world = draw_world(spec, n_issues, rng=rng, batch=batch)
+    v_pref = draw_agents(spec, world, n_voters, n_issues, voters_p, rng=rng, batch=batch)
+    c_pref = draw_agents(spec, world, n_cands, n_issues, cands_p, rng=rng, batch=batch)
+    return v_pref, c_pref
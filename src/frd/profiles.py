@@ -2,13 +2,144 @@ from typing import Tuple #to type hint tuples
 import logging
 
 import numpy as np
-import whalrus
 
 from . import helper as helper
+from . import intensities as intensities
+from . import pref_models as pref_models
+from . import reference as reference
+
+class CoupledPrefs():
+    '''
+    Common random numbers for the issue prefs of every profile of a parameter sweep in one iteration.
+    One uniform matrix is drawn for voters and one for cands at the largest grid size, and each sweep point takes a prefix of the voters/cands/issues
+    and thresholds it against its p (pref is 1 iff uniform < p). Each point has the same distribution as with independent draws,
+    but neighbouring points share their randomness, so differences between them have lower variance.
+
+    NOTES
+    -----
+    Intensities are drawn once per intensity_dist (at the max n_voters) and thresholded against in the same way.
+    Only issue prefs are coupled, elections, delegations, and tie-breaking still draw from the global random state.
+    '''
+    def __init__(self, max_voters:int, max_cands:int, max_issues:int) -> None:
+        self.max_voters = max_voters
+        self.v_uniforms = np.random.random((max_voters, max_issues))
+        self.c_uniforms = np.random.random((max_cands, max_issues))
+        self.v_intensities = {} #keys are intensity_dist specs
+
+    def issue_prefs(self, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, intensity_dist=None)->Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        RETURNS
+        -------
+        v_pref (np.ndarray), c_pref (np.ndarray), v_intensities (np.ndarray, or None if intensity_dist is None)
+        '''
+        v_intensities = None
+        if intensity_dist is None and voters_p is not None:
+            v_p = voters_p
+        elif intensity_dist is not None:
+            if intensity_dist not in self.v_intensities:
+                self.v_intensities[intensity_dist] = intensities.draw_intensities(intensity_dist, self.max_voters)
+            v_intensities = self.v_intensities[intensity_dist][:n_voters]
+            v_p = v_intensities[:,None]
+        else:
+            raise ValueError(f'Intensity dist is None but voters_p is also None')
+        v_pref = (self.v_uniforms[:n_voters, :n_issues] < v_p).astype(int)
+        c_pref = (self.c_uniforms[:n_cands, :n_issues] < cands_p).astype(int)
+        return v_pref, c_pref, v_intensities
+
+class ApprovalSets():
+    '''
+    Approval ballots in compressed sparse row form: ballot b approves the cands cand_ids[offsets[b]:offsets[b+1]] (best ranked first).
+    Memory is proportional to the total number of approvals instead of n_ballots x n_cands, so large cand pools with a small app_k stay cheap,
+    and counts and RAV rounds are bincounts over cand_ids.
+    Indexing and items() give the approved cand ids of a ballot, as with the dict of arrays approvals used to be.
+    '''
+    def __init__(self, cand_ids:np.ndarray, offsets:np.ndarray, n_cands:int) -> None:
+        self.cand_ids = np.asarray(cand_ids, dtype=int)
+        self.offsets = np.asarray(offsets, dtype=int) #length n_ballots+1
+        self.n_cands = n_cands
+
+    @classmethod
+    def from_rankings(cls, rankings:np.ndarray, n_approved:np.ndarray):
+        '''
+        Each ballot approves the first n_approved[b] cands of its ranking (only the first max(n_approved) columns of rankings are read)
+        '''
+        n_approved = np.asarray(n_approved, dtype=int)
+        width = int(n_approved.max()) if len(n_approved) else 0
+        in_prefix = np.arange(width) < n_approved[:,None]
+        offsets = np.concatenate(([0], np.cumsum(n_approved)))
+        return cls(rankings[:, :width][in_prefix], offsets, rankings.shape[1])
+
+    @classmethod
+    def from_dict(cls, approvals:dict, n_cands:int):
+        '''
+        From a dict whose values are the arrays of approved cand ids of each ballot, in ballot order
+        '''
+        rows = [np.asarray(a, dtype=int) for a in approvals.values()]
+        offsets = np.concatenate(([0], np.cumsum([len(r) for r in rows])))
+        return cls(np.concatenate(rows) if rows else np.empty(0, dtype=int), offsets, n_cands)
+
+    def __len__(self)->int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ballot:int)->np.ndarray:
+        return self.cand_ids[self.offsets[ballot]:self.offsets[ballot+1]]
+
+    def items(self):
+        return ((b, self[b]) for b in range(len(self)))
+
+    def lengths(self)->np.ndarray:
+        '''
+        Number of cands approved by each ballot
+        '''
+        return np.diff(self.offsets)
+
+    def ballot_ids(self)->np.ndarray:
+        '''
+        Ballot of each entry of cand_ids
+        '''
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def by_cand(self)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Transpose: the ballots approving cand c are ballots[starts[c]:starts[c+1]]
+        '''
+        order = np.argsort(self.cand_ids, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(np.bincount(self.cand_ids, minlength=self.n_cands))))
+        return self.ballot_ids()[order], starts
+
+    def counts(self, weights:np.ndarray=None)->np.ndarray:
+        '''
+        Number of approvals of each cand, with each ballot counted weights[b] times if weights are given
+        '''
+        entry_weights = None if weights is None else np.repeat(weights, self.lengths())
+        counts = np.bincount(self.cand_ids, weights=entry_weights, minlength=self.n_cands)
+        return counts if weights is None else counts.astype(np.asarray(weights).dtype)
+
+    def rows(self, ballots:np.ndarray):
+        '''
+        ApprovalSets of the given ballots only, in the given order
+        '''
+        ballots = np.asarray(ballots, dtype=int)
+        lengths = self.lengths()[ballots]
+        starts = np.repeat(self.offsets[ballots], lengths)
+        within = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths) #position of each entry in its ballot
+        return ApprovalSets(self.cand_ids[starts + within], np.concatenate(([0], np.cumsum(lengths))), self.n_cands)
+
+    def to_indicators(self)->np.ndarray:
+        '''
+        Dense n_ballots x n_cands 0/1 matrix, indicators[b][c] = 1 iff ballot b approves cand c
+        '''
+        indicators = np.zeros((len(self), self.n_cands), dtype=int)
+        indicators[self.ballot_ids(), self.cand_ids] = 1
+        return indicators
 
 class Profile():
-    def __init__(self, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, app_k, app_thresh):
+    def __init__(self, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, app_k, app_thresh, compress:bool=False, pref_model:str=None):
         self.n_voters, self.n_cands = n_voters, n_cands
+        self.pref_model = pref_model #spec of a structured pref model (see pref_models.py), None for independent Bernoulli prefs
+        self.compress = compress #collapse voters with identical issue prefs into types (see compress_voters)
+        self.voter_types:np.ndarray = None #type (ballot) id of each voter, if compressed
+        self.ballot_weights:np.ndarray = None #number of voters of each type if compressed, None if every voter is their own ballot
         self.n_issues = n_issues
         self.voters_p, self.cands_p = voters_p, cands_p
 
@@ -20,8 +151,10 @@ class Profile():
         self.app_k:int = app_k #voters can approve at most app_k cands
         self.app_thresh:float = app_thresh #voters only approve of cand if dist between them is strictly below app_thresh
 
-        self.approvals = {} #dict of numpy arrays
-        self.approval_indicators = {} #dict of numpy arrays
+        self.rankings:np.ndarray = None #n_voters x n_cands, row v is the cand ids ordered by distance from v (closest first), ties broken randomly
+        self.approvals:ApprovalSets = None #approved cand ids of each ballot, in sparse row form
+        self.approval_counts:np.ndarray = None #number of voters approving each cand
+        self.committee_orders = {} #selection orders of committee rules (e.g. seq_phragmen), reset with the approvals
         # self.ordermaps = {} #dict of numpy arrays
         self.orders = {} #dict of numpy arrays
         self.whalrus_orders = None #whalrus Profile object made from orders
@@ -30,48 +163,130 @@ class Profile():
 
         self.voter_majority_outcomes = None
 
-    def create_issue_prefs(self, intensity_dist):
+    def create_issue_prefs(self, intensity_dist, coupled:CoupledPrefs=None):
         '''
         Create voter and cand prefs over issues and reset any values that were derived from voter/cands prefs 
         (e.g. distances, voter majority, and election profiles)
 
         RETURNS
         -------
-        v_pref (np.ndarray)(n_voters x n_issues): 2D binary numpy array of voter prefs over issues drawn from Bernoulli with param voters_p
+        v_pref (np.ndarray)(n_voters x n_issues): 2D binary numpy array of voter prefs over issues drawn from Bernoulli with param voters_p,
+                        or with a param per voter (their intensity) drawn from intensity_dist if it is not None
         c_pref (np.ndarray)(n_cands x n_issues): 2D binary numpy array of cand prefs over issues drawn from Bernoulli with param cands_p
 
         NOTES
         -------
         Since a single profile object may be used many times instead of creating a new profile in each instance, this method can be used to generate new issue prefs
         with the same parameters, and resets any values based on the issue prefs to prevent mismatch
+        If coupled is given, the prefs are taken from its common random numbers instead of new draws
+        If pref_model is a structured model, voter and cand prefs are drawn from it (see pref_models.py) instead
         '''
+        if not pref_models.is_bernoulli(self.pref_model):
+            if coupled is not None or intensity_dist is not None:
+                raise ValueError(f'Pref model {self.pref_model} cannot be combined with coupled profiles or intensity dists')
+            self.v_pref, self.c_pref = pref_models.draw_issue_prefs(self.pref_model, self.n_voters, self.n_cands, self.n_issues, self.voters_p, self.cands_p)
+            self.v_intensities = None
+            self.reset_derivatives()
+            if self.compress: self.compress_voters()
+            return self.v_pref, self.c_pref
+
+        if coupled is not None:
+            self.v_pref, self.c_pref, self.v_intensities = coupled.issue_prefs(self.n_voters, self.n_cands, self.n_issues, self.voters_p, self.cands_p, intensity_dist)
+            self.reset_derivatives()
+            if self.compress: self.compress_voters()
+            return self.v_pref, self.c_pref
 
         if intensity_dist is None and self.voters_p is not None:
             self.v_pref = np.random.binomial(1, self.voters_p, size=(self.n_voters, self.n_issues))
         elif intensity_dist is not None:
-            if intensity_dist == 'uniform':
-                logging.debug('Generating prefs from uniformly distributed intensities')
-                self.v_intensities = np.random.uniform(low=0.5, high=1, size=(self.n_voters,))
-            else:
-                raise ValueError(f'Intensity dist not available: {intensity_dist}')
-            self.v_pref = np.empty((self.n_voters, self.n_issues))
-            for v in range(self.n_voters):
-                self.v_pref[v] = np.random.binomial(1, self.v_intensities[v], size=(self.n_issues))
-            self.v_pref = np.round(self.v_pref) #is this necessary? aren't they already 0,1?
+            logging.debug('Generating prefs from intensities with dist %s', intensity_dist)
+            self.v_intensities = intensities.draw_intensities(intensity_dist, self.n_voters) #see intensities.py for the available dists
+            self.v_pref = np.random.binomial(1, self.v_intensities[:,None], size=(self.n_voters, self.n_issues)) #row v drawn with p = intensity of v
         else:
             raise ValueError(f'Intensity dist is None but voters_p is also None')
         self.c_pref = np.random.binomial(1, self.cands_p, size=(self.n_cands, self.n_issues))
         self.reset_derivatives()
+        if self.compress: self.compress_voters()
     
         return self.v_pref, self.c_pref
+
+    def compress_voters(self)->np.ndarray:
+        '''
+        Collapse voters with identical issue prefs into voter types (ballots) with multiplicity counts.
+        Distances, rankings, approvals, orders, and agreements are then computed once per type, and election rules weight each type by its count.
+
+        RETURNS
+        -------
+        self.ballot_weights (np.ndarray): number of voters of each type
+
+        NOTES
+        -----
+        Worth it when there are far more voters than possible pref vectors (2**n_issues), e.g. 100k voters and 10 issues
+        Voters of the same type share one random tie-break of their ranking (ties between cands at equal distance),
+        so the ballots of a type are perfectly correlated instead of independent when there are ties
+        Voter ids (e.g. delegators) are mapped to types with voter_ballots
+        '''
+        type_prefs, self.voter_types, self.ballot_weights = np.unique(self.v_pref, axis=0, return_inverse=True, return_counts=True)
+        self.voter_types = self.voter_types.reshape(-1) #flat, some numpy versions return the inverse with the shape of the input
+        self.type_prefs = type_prefs
+        return self.ballot_weights
+
+    def get_n_ballots(self)->int:
+        '''
+        Number of rows of the derived profiles: voter types if compressed, voters otherwise
+        '''
+        return self.n_voters if self.ballot_weights is None else len(self.ballot_weights)
+
+    def ballot_prefs(self)->np.ndarray:
+        '''
+        Issue prefs of each ballot: voter types if compressed, voters otherwise
+        '''
+        return self.v_pref if self.ballot_weights is None else self.type_prefs
+
+    def voter_ballots(self, voter_ids)->np.ndarray:
+        '''
+        Rows of the derived profiles (distances, rankings, orders) of the given voters
+        '''
+        voter_ids = np.asarray(voter_ids, dtype=int)
+        return voter_ids if self.ballot_weights is None else self.voter_types[voter_ids]
+
+    def issue_tallies(self, voter_ids)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Number of the given voters (e.g. delegators) who prefer 0 and who prefer 1 on each issue, tallied per voter type if compressed
+        '''
+        ballots, counts = np.unique(self.voter_ballots(voter_ids), return_counts=True)
+        prefs = self.ballot_prefs()[ballots]
+        return counts @ (prefs == 0), counts @ (prefs == 1)
+
+    def voter_orders(self, voter_ids)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Distinct orders of the given voters (one row per ballot, so per voter type if compressed) and the number of the voters with each
+        '''
+        ballots, counts = np.unique(self.voter_ballots(voter_ids), return_counts=True)
+        if self.orders == {}:
+            self.distances_to_orders()
+        orders = np.array([self.orders[b] for b in ballots], dtype=int).reshape(len(ballots), self.n_cands)
+        return orders, counts
     
+    def voter_approvals(self, voter_ids)->Tuple[ApprovalSets, np.ndarray]:
+        '''
+        Distinct approval ballots of the given voters (one per ballot, so per voter type if compressed) and the number of the voters with each
+        '''
+        ballots, counts = np.unique(self.voter_ballots(voter_ids), return_counts=True)
+        if self.approvals is None:
+            self.distances_to_approvals()
+        return self.approvals.rows(ballots), counts
+
     def reset_derivatives(self)->None:
         '''
         Reset all voters derived from issue prefs to be empty/None
         '''
         self.distances = None #np.empty((n_voters, n_cands))
-        self.approvals = {} #dict of numpy arrays
-        self.approval_indicators = {} #dict of numpy arrays
+        self.voter_types, self.ballot_weights = None, None
+        self.rankings = None
+        self.approvals = None
+        self.approval_counts = None
+        self.committee_orders = {}
         # self.ordermaps = {} #dict of numpy arrays
         self.orders = {} #dict of numpy arrays
         self.agreements = {} #dict of numpy arrays
@@ -81,18 +296,12 @@ class Profile():
         '''
         Compute the (unweighted) voter majority on every issue with random tiebreaking
         Tiebreaking only occurs if n_voters is even
-
-        TODO
-        ------
-        Speed up by removing for loop and just using array operations
+        If the profile is compressed, the prefs of each voter type are counted once per voter of the type (see compress_voters)
         '''
         self.voter_majority_outcomes = np.random.binomial(1, 0.5, size=(self.n_issues)) #initialized randomly so unchanged vals break ties randomly
-        for i in range(self.n_issues):
-            ones = np.sum(self.v_pref[:,i], axis=0)
-            if ones > self.n_voters / 2:
-                self.voter_majority_outcomes[i] = 1
-            elif ones < self.n_voters / 2:
-                self.voter_majority_outcomes[i] = 0
+        ones = np.sum(self.v_pref, axis=0) if self.ballot_weights is None else self.ballot_weights @ self.type_prefs
+        self.voter_majority_outcomes[ones > self.n_voters / 2] = 1
+        self.voter_majority_outcomes[ones < self.n_voters / 2] = 0
         return self.voter_majority_outcomes
         
     def issues_to_distances(self)->np.ndarray:
@@ -103,12 +312,27 @@ class Profile():
 
         RETURNS
         -------
-        distances (np.ndarray): 2D numpy array, size n_voters x n_cands containing floats in [0.0,1.0]
+        distances (np.ndarray): 2D numpy array, size n_voters (n_ballots if compressed) x n_cands containing floats in [0.0,1.0]
         '''
-        hamming_distances = np.sum(self.v_pref[:, None] != self.c_pref, axis=2)
+        hamming_distances = np.sum(self.ballot_prefs()[:, None] != self.c_pref, axis=2)
         self.distances = hamming_distances / self.n_issues
         return self.distances
 
+    def distances_to_rankings(self)->np.ndarray:
+        '''
+        Rank the cands of every voter by distance (closest first), breaking ties randomly. Computed once per instance,
+        orders and the approvals for every (app_k, app_thresh) are derived from it.
+
+        RETURNS
+        -------
+        self.rankings (np.ndarray): n_voters x n_cands, rankings[v][j] = c means voter v ranks cand c in position j
+        '''
+        if self.distances is None:
+            self.issues_to_distances()
+        tiebreakers = np.random.random((self.get_n_ballots(), self.n_cands))
+        self.rankings = np.lexsort((tiebreakers, self.distances), axis=1) #sorts by distance, then by tiebreaker
+        return self.rankings
+
     def distances_to_approvals(self):
         '''
         Voters report approvals of cands based on distances between their prefs
@@ -117,38 +341,55 @@ class Profile():
 
         RETURNS
         -----
-        self.approvals (dict of 1D np.ndarrays)(voter:binary array): valeus are binary arrays where 
-                        approvals[v][c] = 1 iff voter v approves cand c, else 0
-                        voter ids are keys of the dict, indices of the value array 
+        self.approvals (ApprovalSets): approvals[v] is the array of cand ids voter v approves, best ranked first
 
         NOTES
         -----
         If threshold is 1.0, then voter will approve exactly k cands.
         If k >= n_cands, voter will approve all cands whose distance from them is below the threshold
         If threshold = 0 or k = 0, voter will not approve any cands
+        The cands below the threshold are a prefix of the voter's ranking, so each voter approves the first min(k, number below threshold) cands of their ranking.
+        Changing app_k or app_thresh only recomputes the prefix lengths, not the rankings.
+        '''
+        self.committee_orders = {}
+        if reference.is_reference(): #original per-voter loop (see reference.py)
+            if self.distances is None:
+                self.issues_to_distances()
+            self.approvals = ApprovalSets.from_dict(reference.distances_to_approvals(self), self.n_cands)
+            return self.approvals
+        if self.rankings is None:
+            self.distances_to_rankings()
+        self.approvals = ApprovalSets.from_rankings(self.rankings, self.n_approved())
+        return self.approvals
 
+    def n_approved(self)->np.ndarray:
         '''
-        if self.distances is None:
-            self.issues_to_distances()
-        approvable = np.asarray(self.distances < self.app_thresh)
-        for v_id in range(self.n_voters):
-            if np.sum(approvable[v_id]) <= self.app_k:
-                #self.approval_indicators[v_id] = approvable[v_id]
-                self.approvals[v_id] = np.nonzero(approvable[v_id])[0]
-            else: #voter would approve more than k based on threshold if allowed to
-                distances_augmented = helper.array1D_to_sorted(self.distances[v_id], seed=None, tiebreakers=None)
-                self.approvals[v_id] = distances_augmented[:,2][:self.app_k].astype(int)
-                #self.approval_indicators[v_id] = np.asarray([1 if c in self.approvals[v_id] else 0 for c in range(self.n_cands)])
-        return self.approvals#, self.approval_indicators
+        Number of cands each voter approves with the current app_k and app_thresh (length of their approved prefix)
+        '''
+        n_below = np.count_nonzero(self.distances < self.app_thresh, axis=1)
+        return np.minimum(n_below, max(0, self.app_k))
     
+    def approvals_to_counts(self)->np.ndarray:
+        '''
+        Counts the approvals of each cand (self.approval_counts, used by max_approval), weighted by voter type counts if compressed
+        '''
+        if self.approvals is None:
+            self.distances_to_approvals()
+        self.approval_counts = self.approvals.counts(self.ballot_weights)
+        return self.approval_counts
+
     def approvals_to_indicators(self)->dict:
         '''
         Takes voters' approvals, which are arrays of integer cand ids, and turns them into indicator arrays where 1 at index means they approve cand with index=cand id
+
+        NOTES
+        -----
+        Dense (n_ballots x n_cands), only built on request. Election rules and delegation use the sparse approvals.
         '''
-        if self.approvals == {}:
+        if self.approvals is None:
             self.distances_to_approvals()
-        self.approval_indicators = {v_id:helper.subset_to_indicator(self.approvals[v_id], range(self.n_cands)) for v_id in range(self.n_voters)}
-        return self.approval_indicators
+        indicators = self.approvals.to_indicators()
+        return {v_id:indicators[v_id] for v_id in range(self.get_n_ballots())}
     
     def distances_to_orders(self)->dict:
         '''
@@ -159,9 +400,14 @@ class Profile():
         self.orders (dict of 1D np.ndarrays): keys are voter ids, each value is ordered list of cand ids of len n_cands
         self.ordermaps[v][3] = c means voter v ranks cand c in 4th place
         '''
-        if self.distances is None:
-            self.issues_to_distances()
-        self.orders = {v_id:helper.array1D_to_sorted(self.distances[v_id], seed=None)[:,2].astype(int) for v_id in range(self.n_voters)}
+        if reference.is_reference(): #original per-voter loop (see reference.py)
+            if self.distances is None:
+                self.issues_to_distances()
+            self.orders = reference.distances_to_orders(self)
+            return self.orders
+        if self.rankings is None:
+            self.distances_to_rankings()
+        self.orders = {v_id:self.rankings[v_id] for v_id in range(self.get_n_ballots())}
         return self.orders
     
     # def orders_to_ordermaps(self)->dict:
@@ -182,19 +428,21 @@ class Profile():
     #     return self.ordermaps
     
     def orders_to_whalrus(self):
+        import whalrus #imported on first use so workers that never run IRV do not pay for it
         if self.orders == {}:
             self.distances_to_orders()
-        self.whalrus_orders = whalrus.Profile([whalrus.BallotOrder(self.orders[v].tolist()) for v in range(self.n_voters)])
+        weights = None if self.ballot_weights is None else self.ballot_weights.tolist()
+        self.whalrus_orders = whalrus.Profile([whalrus.BallotOrder(self.orders[v].tolist()) for v in range(self.get_n_ballots())], weights=weights)
         return self.whalrus_orders
 
     
     def distances_to_agreements(self):
         if self.distances is None:
             self.issues_to_distances()
-        self.agreements = {v_id: 1 - self.distances[v_id] for v_id in range(self.n_voters)}
+        self.agreements = {v_id: 1 - self.distances[v_id] for v_id in range(self.get_n_ballots())}
         return self.agreements
     
-    def new_instance(self, intensity_dist=None, approvals = True, ordinals = True, agreements = True, whalrus_orders=True):
+    def new_instance(self, intensity_dist=None, approvals = True, ordinals = True, agreements = True, whalrus_orders=True, coupled:CoupledPrefs=None):
         '''
         Creates new profile, distances, and derived election profiles indicated by kwargs.
 
@@ -203,15 +451,16 @@ class Profile():
         Assumes the profile has already been used so all the relevant params are defined and stay the same
             (n_voters, n_cands, n_issues, voters_p, cands_p, and approval_params).
         This is to save time and memory creating new instances with consistent params without a new Profile object each time
+        If coupled is given, issue prefs come from its common random numbers (see CoupledPrefs)
         '''
-        self.create_issue_prefs(intensity_dist) #automatically resets all derivatives from issue prefs
+        self.create_issue_prefs(intensity_dist, coupled=coupled) #automatically resets all derivatives from issue prefs
         self.issues_to_distances()
         self.voter_majority_vote()
         if approvals: 
-            self.distances_to_approvals() #used for max_approval
+            self.distances_to_approvals() #used for rav and approval delegation
             logging.debug('created approvals')
-            self.approvals_to_indicators() #used for rav
-            logging.debug('created approval indicators')
+            self.approvals_to_counts() #used for max_approval
+            logging.debug('created approval counts')
         if ordinals:
             self.distances_to_orders() #used for scoring rules, e.g. Borda and Plurality
             logging.debug('created pref orders')
@@ -237,14 +486,26 @@ class Profile():
         self.v_pref = v_pref
         self.c_pref = c_pref
         self.reset_derivatives()
+        if self.compress: self.compress_voters()
         return self.v_pref, self.c_pref
     
-    def set_approval_params(self, k, threshold):
+    def set_approval_params(self, k, threshold, derive=False):
+        '''
+        Change app_k and app_thresh and reset the approvals. If derive is True, the approvals are rederived from the current rankings (no new draws)
+        '''
         self.app_k, self.app_thresh = k, threshold
-        self.approvals, self.approval_indicators = {}, {} #reset
+        self.approvals, self.approval_counts, self.committee_orders = None, None, {} #reset
+        if derive:
+            self.distances_to_approvals()
+            self.approvals_to_counts()
     
-    def set_approvals(self, approvals:dict):
-        self.approvals = approvals
+    def set_approvals(self, approvals):
+        '''
+        Set the approvals from an ApprovalSets or a dict of arrays of approved cand ids (one per ballot, in order)
+        '''
+        self.approvals = approvals if isinstance(approvals, ApprovalSets) else ApprovalSets.from_dict(approvals, self.n_cands)
+        self.committee_orders = {}
+        self.approvals_to_counts()
 
     def set_orders(self, orders):
         self.orders = orders
@@ -259,12 +520,15 @@ class Profile():
     
     def get_n_voters(self):
         return self.n_voters
+
+    def get_ballot_weights(self):
+        return self.ballot_weights
     
     def get_n_issues(self):
         return self.n_issues
     
     def get_approval_params(self):
-        return self.approval_params
+        return self.app_k, self.app_thresh
 
     def get_issue_prefs(self):
         return self.v_pref, self.c_pref
@@ -273,7 +537,16 @@ class Profile():
         return self.approvals
     
     def get_approval_indicators(self):
-        return self.approval_indicators
+        return self.approvals_to_indicators()
+
+    def get_approval_counts(self):
+        return self.approval_counts
+
+    def get_committee_orders(self):
+        return self.committee_orders
+
+    def get_rankings(self):
+        return self.rankings
 
     def get_orders(self):
         return self.orders
@@ -286,6 +559,24 @@ class Profile():
 
     def get_agreements(self):
         return self.agreements
+
+    def get_agreement_sums(self)->np.ndarray:
+        '''
+        Sum of the agreements of all voters with each cand (weighted by voter type counts if compressed)
+        '''
+        if self.ballot_weights is None:
+            return np.sum(np.vstack(list(self.agreements.values())), axis=0)
+        return self.ballot_weights @ np.vstack(list(self.agreements.values()))
+
+    def get_position_counts(self)->np.ndarray:
+        '''
+        position_counts[c][j] = number of voters who rank cand c in position j (scoring rules only need these counts)
+        '''
+        orders = np.array(list(self.orders.values()), dtype=int).reshape(-1, self.n_cands)
+        weights = np.ones(len(orders), dtype=int) if self.ballot_weights is None else self.ballot_weights
+        flat = orders*self.n_cands + np.arange(self.n_cands) #index of (cand, position)
+        counts = np.bincount(flat.ravel(), weights=np.repeat(weights, self.n_cands), minlength=self.n_cands**2)
+        return counts.reshape(self.n_cands, self.n_cands).astype(int)
     
     def get_voter_majority(self):
         return self.voter_majority_outcomes
\ No newline at end of file
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+import numpy as np
+
+'''
+Live progress of an experiment run by sim_parallel: throughput overall and per worker, completed and pending iterations and grid combinations, and an ETA.
+The parent updates a ProgressReporter with the completion notice of each iteration (which carries the worker's name and the iteration's runtime)
+and reports at most once every interval seconds, to the console and log and as one JSON line appended to a progress file.
+'''
+
+def format_seconds(seconds:float)->str:
+    if seconds is None or not np.isfinite(seconds): return '?'
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m{seconds:02d}s' if hours else f'{minutes}m{seconds:02d}s'
+
+class ProgressReporter():
+    '''
+    PARAMS
+    ------
+    experiment_name (str): Name reported with each record
+    n_iter (int): Number of iterations to run
+    n_combos (int): Number of parameter combinations each iteration runs (the grid without the combinations it skips)
+    progress_file (str or Path): JSON lines file each report is appended to (its directory is created if needed), or None.
+                                 If it cannot be written, a warning is logged and the file is no longer written
+    interval (float): Minimum seconds between reports
+    console (bool): Print reports to the console
+
+    NOTES
+    -----
+    Times are wall clock times of the workers' completions (iter_stats['finished']), not of when the parent reads the notices, so
+    iterations that finished while the parent was waiting on an earlier experiment of a shared WorkerPool count at their real times.
+    The overall rate is measured from the start of the first iteration (its completion time minus its runtime) to the latest completion,
+    not from submission, so experiments queued behind others are not penalized for waiting. The ETA counts from the latest completion.
+    Per-worker rates are iterations per second of the worker's busy time. A worker whose mean iteration time is more than
+    straggler_ratio times the median over workers is reported as a straggler.
+    '''
+    def __init__(self, experiment_name, n_iter:int, n_combos:int, progress_file=None, interval:float=10.0, console:bool=True, straggler_ratio:float=2.0) -> None:
+        self.experiment_name = experiment_name
+        self.n_iter = n_iter
+        self.n_combos = n_combos
+        self.progress_file = progress_file
+        if progress_file is not None:
+            try:
+                os.makedirs(Path(progress_file).parent, exist_ok=True)
+            except OSError as e:
+                self.disable_file(e)
+        self.interval = interval
+        self.console = console
+        self.straggler_ratio = straggler_ratio
+        self.done = 0
+        self.start, self.last_finished = None, None
+        self.last_report = time.time()
+        self.workers = {} #name: [iterations, busy seconds]
+
+    def update(self, iter_stats:dict)->None:
+        '''
+        Record one completed iteration, and report if the last report is at least interval seconds old
+        '''
+        now = time.time()
+        runtime = iter_stats.get('runtime', 0.0)
+        finished = iter_stats.get('finished', now)
+        self.start = finished - runtime if self.start is None else min(self.start, finished - runtime)
+        self.last_finished = finished if self.last_finished is None else max(self.last_finished, finished)
+        self.done += 1
+        worker = self.workers.setdefault(iter_stats.get('worker'), [0, 0.0])
+        worker[0] += 1
+        worker[1] += runtime
+        if now - self.last_report >= self.interval:
+            self.report(now)
+
+    def record(self, now:float, finished:bool=False)->dict:
+        elapsed = self.last_finished - self.start if self.start is not None else 0.0
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        pending = self.n_iter - self.done
+        eta = max(0.0, pending / rate - (now - self.last_finished)) if rate > 0 else None
+        worker_rates = {name:(n / busy if busy > 0 else None) for name, (n, busy) in self.workers.items()}
+        mean_times = {name:busy / n for name, (n, busy) in self.workers.items() if n}
+        median_time = float(np.median(list(mean_times.values()))) if mean_times else 0.0
+        stragglers = sorted(name for name, t in mean_times.items() if median_time > 0 and t > self.straggler_ratio*median_time)
+        return {'time':now, 'experiment':self.experiment_name, 'finished':finished,
+                'iterations_done':self.done, 'iterations_pending':pending,
+                'combos_done':self.done*self.n_combos, 'combos_pending':pending*self.n_combos,
+                'elapsed_seconds':elapsed, 'iterations_per_second':rate, 'eta_seconds':eta,
+                'worker_iterations_per_second':worker_rates, 'stragglers':stragglers}
+
+    def report(self, now:float=None, finished:bool=False)->dict:
+        if now is None: now = time.time()
+        self.last_report = now
+        record = self.record(now, finished=finished)
+        msg = (f'{self.experiment_name}: {record["iterations_done"]}/{self.n_iter} iterations ({record["combos_done"]} of {self.n_iter*self.n_combos} combination runs), '
+               f'{record["iterations_per_second"]:.2f} it/s on {len(self.workers)} workers, '
+               + (f'done in {format_seconds(record["elapsed_seconds"])}' if finished else f'ETA {format_seconds(record["eta_seconds"])}')
+               + (f', stragglers: {record["stragglers"]}' if record['stragglers'] else ''))
+        logging.info(msg)
+        if self.console: print(msg)
+        if self.progress_file is not None:
+            try:
+                with open(self.progress_file, 'a') as f:
+                    f.write(json.dumps(record)+'\n')
+            except OSError as e:
+                self.disable_file(e)
+        return record
+
+    def disable_file(self, error:OSError)->None:
+        '''
+        Stop writing the progress file after an error, so reporting never aborts the experiment
+        '''
+        logging.warning(f'Cannot write progress file {self.progress_file}, reporting to the console and log only: {error}')
+        self.progress_file = None
+
+    def close(self)->dict:
+        '''
+        Report the final throughput of the experiment
+        '''
+        return self.report(finished=True)
@@ -0,0 +1,266 @@
+import contextlib
+import numpy as np
+from typing import Tuple
+
+from . import helper as helper
+
+'''
+Reference backend: the original (loop-based) implementations of the code paths that have fast rewrites, kept as oracles.
+They are the implementations the published results were computed with, and frd/equivalence.py checks the fast paths against them.
+
+The backend is selected at runtime with set_backend('reference') or the use_backend context manager, and applies to the current process:
+    - Profile.distances_to_approvals and Profile.distances_to_orders use the per-voter loops below
+    - rule_dispatcher returns the reference borda, plurality, max_approval, rav, and irv (other rules have no reference and stay fast)
+    - FRD.run_FRD and FRD.run_FRD_batch run ReferenceFRD (per-voter float weights, per-issue majority)
+The reference backend only supports uncompressed, non-streaming profiles.
+'''
+
+BACKENDS = ('fast', 'reference')
+_backend = 'fast'
+
+def set_backend(name:str)->None:
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f'Backend must be one of {BACKENDS}, cannot be: {name}')
+    _backend = name
+
+def get_backend()->str:
+    return _backend
+
+def is_reference()->bool:
+    return _backend == 'reference'
+
+@contextlib.contextmanager
+def use_backend(name:str):
+    '''
+    Run a block with the given backend, restoring the previous one after
+    '''
+    previous = _backend
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous)
+
+def check_profile(profile)->None:
+    if profile.get_ballot_weights() is not None or not hasattr(profile, 'get_distances'):
+        raise ValueError('The reference backend only supports uncompressed, non-streaming profiles')
+
+## Profiles
+
+def distances_to_approvals(profile)->dict:
+    '''
+    Voters approve the cands whose distance is below app_thresh, or the app_k closest of them (ties broken randomly) if there are more than app_k
+
+    RETURNS
+    -------
+    approvals (dict of 1D np.ndarrays): keys are voter ids, values are the approved cand ids
+    '''
+    check_profile(profile)
+    distances = profile.get_distances()
+    app_k, app_thresh = profile.get_approval_params()
+    approvable = np.asarray(distances < app_thresh)
+    approvals = {}
+    for v_id in range(profile.get_n_voters()):
+        if np.sum(approvable[v_id]) <= app_k:
+            approvals[v_id] = np.nonzero(approvable[v_id])[0]
+        else: #voter would approve more than k based on threshold if allowed to
+            distances_augmented = helper.array1D_to_sorted(distances[v_id], seed=None, tiebreakers=None)
+            approvals[v_id] = distances_augmented[:,2][:app_k].astype(int)
+    return approvals
+
+def approvals_to_indicators(approvals:dict, n_cands:int)->dict:
+    return {v_id:helper.subset_to_indicator(a, range(n_cands)) for v_id, a in approvals.items()}
+
+def distances_to_orders(profile)->dict:
+    '''
+    RETURNS
+    -------
+    orders (dict of 1D np.ndarrays): keys are voter ids, each value is the cand ids ordered by distance (closest first, ties broken randomly)
+    '''
+    check_profile(profile)
+    distances = profile.get_distances()
+    return {v_id:helper.array1D_to_sorted(distances[v_id], seed=None)[:,2].astype(int) for v_id in range(profile.get_n_voters())}
+
+## Election rules
+
+def score_orders(profile, score_vector)->np.ndarray:
+    '''
+    Scores of the cands from the profile's orders and a score vector, one voter and one position at a time
+    '''
+    n_cands = profile.get_n_cands()
+    orders = profile.get_orders()
+    if n_cands != len(score_vector):
+        raise ValueError(f'Score vector {score_vector} has length not equal to num cands: {n_cands}')
+    scores = np.zeros_like(score_vector)
+    for order in orders.values():
+        for rank, c_id in enumerate(order):
+            scores[c_id] += score_vector[rank]
+    return scores
+
+def scoring_rule(profile, score_vector, n_winners, seed=None)->Tuple[np.ndarray, np.ndarray]:
+    scores = score_orders(profile, score_vector)
+    augmented_scores = helper.array1D_to_sorted(scores, seed)
+    winners = augmented_scores[:,2][-n_winners:].astype(int)
+    return winners, scores
+
+def plurality(profile, n_winners:int, seed=None)->Tuple[np.ndarray, np.ndarray]:
+    check_profile(profile)
+    score_vector = np.zeros(profile.get_n_cands(), dtype=int)
+    score_vector[0] += 1
+    return scoring_rule(profile, score_vector, n_winners, seed)
+
+def borda(profile, n_winners:int, seed=None)->Tuple[np.ndarray, np.ndarray]:
+    check_profile(profile)
+    n_cands = profile.get_n_cands()
+    return scoring_rule(profile, np.arange(n_cands-1, -1, -1, dtype=int), n_winners, seed)
+
+def max_approval(profile, n_winners:int, seed=None)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Approval counts from the dense indicators of the profile's approvals, top n_winners with ties broken randomly
+    '''
+    check_profile(profile)
+    approval_indicators = list(approvals_to_indicators(dict(profile.get_approvals().items()), profile.get_n_cands()).values())
+    approval_counts = np.sum(np.vstack(approval_indicators), axis=0)
+    winners = helper.array1D_to_sorted(approval_counts, seed)[:,2][-n_winners:]
+    return winners, approval_counts
+
+def rav(profile, n_winners:int)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    Re-weighted Approval Voting with lexicographic tie-breaking, rescoring every cand against every voter's approval set in each round
+    '''
+    check_profile(profile)
+    candidates = list(range(profile.get_n_cands()))
+    approvals = dict(profile.get_approvals().items())
+    result = []
+    while len(result) < n_winners:
+        non_winners = set(candidates) - set(result)
+        c_scores = {c:0 for c in non_winners}
+        for v_id, v_pref in approvals.items():
+            intersect = len(set(result).intersection(v_pref)) + 1
+            for c in non_winners:
+                if c in v_pref:
+                    c_scores[c] += 1.0 / intersect
+        order = [k for k in sorted(c_scores, key=c_scores.get, reverse=True)]
+        result.append(order[0])
+    return np.asarray(result), max_approval(profile, n_winners)[1]
+
+def irv_whalrus(profile, n_winners)->Tuple[np.ndarray, np.ndarray]:
+    import whalrus #imported on first use so workers that never run IRV do not pay for it
+    check_profile(profile)
+    rule = whalrus.RuleIRV(profile.get_whalrus_orders(), tie_break=whalrus.Priority.RANDOM)
+    return rule.strict_order_[:n_winners], np.ones(profile.get_n_cands())
+
+RULES = {'borda':borda, 'plurality':plurality, 'max_approval':max_approval, 'rav':rav, 'irv':irv_whalrus}
+
+## FRD
+
+class ReferenceFRD():
+    '''
+    Weighted voting with delegation as originally implemented: a float weight from every voter to every cand on every issue,
+    default weights and delegations set one voter at a time, and a per-issue weighted majority
+
+    NOTES
+    -----
+    Reps come from rep_ids (elections are not rerun). Draws delegators like FRD (same calls in the same order), so under the same
+    random state the delegators and weights are the same as FRD's. Weighted majority ties are compared in floats, so exact ties can be missed by rounding.
+    '''
+    def __init__(self, profile, rep_ids, n_reps:int, del_style, best_k, n_delegators, default='uniform') -> None:
+        check_profile(profile)
+        self.profile = profile
+        self.n_voters, self.n_cands = profile.get_n_voters(), profile.get_n_cands()
+        self.n_issues = profile.get_n_issues()
+        self.rep_ids = rep_ids
+        self.n_reps = n_reps
+        self.default = default
+        self.del_style = del_style
+        self.best_k = best_k
+        self.n_delegators = n_delegators
+        self.delegator_ids = []
+        self.weighting = {i:np.zeros((self.n_voters, self.n_cands)) for i in range(self.n_issues)}
+        self.rep_weights = {i:np.zeros(self.n_cands) for i in range(self.n_issues)}
+
+    def default_weighting(self):
+        if self.default != 'uniform':
+            raise ValueError(f'Default {self.default} not implemented for FRD')
+        for i in range(self.n_issues):
+            for v in range(self.n_voters):
+                self.weighting[i][v] = [1/self.n_reps if c in self.rep_ids else 0 for c in range(self.n_cands)]
+
+    def select_n_delegators(self):
+        self.delegator_ids = np.random.choice(self.n_voters, self.n_delegators, replace=False)
+        return self.delegator_ids
+
+    def intensity_delegators(self):
+        intensities = self.profile.get_v_intensities()
+        self.delegator_ids = []
+        for v in range(self.n_voters):
+            if np.random.binomial(1, 2*np.abs(intensities[v]-0.5), 1) == 1:
+                self.delegator_ids.append(v)
+        return self.delegator_ids
+
+    def incisive_delegation(self):
+        v_prefs, c_prefs = self.profile.get_issue_prefs()
+        for i in range(self.n_issues):
+            r0 = np.where(c_prefs[:,i] == 0)[0].tolist() #first cand who votes 0 on this issue
+            r1 = np.where(c_prefs[:,i] == 1)[0].tolist()
+            for v in self.delegator_ids:
+                if r0 and v_prefs[v,i] == 0:
+                    self.weighting[i][v] = np.zeros(self.n_cands)
+                    self.weighting[i][v,r0[0]] = 1
+                elif r1 and v_prefs[v,i] == 1:
+                    self.weighting[i][v] = np.zeros(self.n_cands)
+                    self.weighting[i][v,r1[0]] = 1
+
+    def find_best_k(self):
+        self.select_n_delegators()
+        orders = self.profile.get_orders()
+        best_ks = {v:[] for v in range(self.n_voters)}
+        for v in self.delegator_ids:
+            for c in orders[v]:
+                if c in self.rep_ids:
+                    best_ks[v].append([c])
+                    if len(best_ks[v]) == self.best_k:
+                        break
+        return best_ks
+
+    def best_k_delegation(self):
+        best_k = self.find_best_k()
+        for v in self.delegator_ids:
+            for r in best_k[v]:
+                for i in range(self.n_issues):
+                    self.weighting[i][v,r] = 1.0/len(best_k[v])
+
+    def weight_reps(self):
+        self.default_weighting()
+        if self.n_delegators is not None and self.profile.get_v_intensities() is None:
+            self.select_n_delegators()
+        elif self.n_delegators is None and self.profile.get_v_intensities() is not None:
+            self.intensity_delegators()
+        else:
+            raise ValueError('Cannot determine whether delegation is fixed n_delegators or using intensities')
+        if self.del_style == 'best_k':
+            self.best_k_delegation()
+        elif self.del_style == 'incisive':
+            self.incisive_delegation()
+        elif self.del_style is not None:
+            raise ValueError(f'Delegation style {self.del_style} has no reference implementation')
+        self.rep_weights = {i:np.sum(self.weighting[i], axis=0) for i in range(self.n_issues)}
+        return self.rep_weights
+
+    def weighted_majority(self)->list:
+        c_prefs = self.profile.get_issue_prefs()[1]
+        outcomes = []
+        for i in range(self.n_issues):
+            rep_weights = self.rep_weights[i]
+            vote_sum = np.sum((c_prefs.T * rep_weights).T[:,i])
+            weight_sum = np.sum(rep_weights, dtype=float)
+            outcomes += [1 if vote_sum > weight_sum/2.0
+                         else 0 if vote_sum < weight_sum/2.0
+                         else np.random.binomial(1, 0.5)]
+        return outcomes
+
+    def run(self)->float:
+        self.weight_reps()
+        outcomes = np.asarray(self.weighted_majority())
+        return np.count_nonzero(outcomes == self.profile.get_voter_majority()) / self.n_issues
@@ -0,0 +1,88 @@
+import collections
+import numpy as np
+from multiprocessing import shared_memory
+
+from . import helper as helper
+
+'''
+Shared-memory buffer of agreements indexed by (parameter combination, iteration).
+The parent creates one buffer per experiment run, workers attach to it by name and write the agreements of each iteration straight
+into their slots, so only completion notices go back to the parent through the pool's pipe instead of a pickled dict per iteration.
+Slots of combinations that are skipped (e.g. n_reps > n_cands) stay NaN.
+'''
+
+MAX_ATTACHED = 8 #buffers a worker keeps attached at once
+_attached = collections.OrderedDict() #buffers attached by this (worker) process, keyed by shared memory name, least recently used first
+
+def combo_keys(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict)->list:
+    '''
+    Keys of every parameter combination of an experiment (tuples of strings, as in the data dicts), in the order of the buffer rows
+    '''
+    experiment_params = helper.merge_dicts([profile_param_vals, election_param_vals, del_voting_param_vals])
+    return [tuple(str(x) for x in combo) for combo in helper.params_dict_to_tuples(experiment_params)[0]]
+
+class ResultBuffer():
+    def __init__(self, shm:shared_memory.SharedMemory, shape:tuple, keys:list, owner:bool) -> None:
+        self.shm = shm
+        self.shape = shape
+        self.keys = keys
+        self.rows = {k:i for i, k in enumerate(keys)}
+        self.array = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        self.owner = owner
+
+    @classmethod
+    def create(cls, keys:list, n_cols:int):
+        '''
+        Create a buffer with one row per parameter combination and one column per iteration, filled with NaN
+        '''
+        shape = (len(keys), n_cols)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 8*shape[0]*shape[1]))
+        buffer = cls(shm, shape, keys, owner=True)
+        buffer.array.fill(np.nan)
+        return buffer
+
+    @classmethod
+    def attach(cls, name:str, shape:tuple, profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict):
+        '''
+        Attach to a buffer created by another process for the experiment with the given params.
+        Attachments are cached per buffer so a worker attaches (and computes the row of each combination) once per buffer, even when
+        the iterations of several experiments interleave on a shared WorkerPool.
+
+        NOTES
+        -----
+        Workers cannot tell when an experiment is finished, so they keep the MAX_ATTACHED most recently used buffers attached
+        and detach from the least recently used one beyond that. The segment of a buffer freed by the parent stays mapped until then.
+        '''
+        if name in _attached:
+            _attached.move_to_end(name)
+        else:
+            while len(_attached) >= MAX_ATTACHED:
+                _attached.popitem(last=False)[1].release()
+            shm = shared_memory.SharedMemory(name=name) #pool workers share the parent's resource tracker, so attaching does not make them owners
+            _attached[name] = cls(shm, shape, combo_keys(profile_param_vals, election_param_vals, del_voting_param_vals), owner=False)
+        return _attached[name]
+
+    def get_name(self)->str:
+        return self.shm.name
+
+    def write(self, iter_data:dict, col:int)->None:
+        '''
+        Write the agreements of one iteration (output of single_iter) into column col
+        '''
+        for k, agreements in iter_data.items():
+            self.array[self.rows[k], col] = agreements[0]
+
+    def to_data(self)->dict:
+        '''
+        Convert to the data dict format (keys are tuples of param values, values are lists of agreements in iteration order),
+        dropping the combinations that were skipped
+        '''
+        return {k:self.array[i].tolist() for i, k in enumerate(self.keys) if not np.isnan(self.array[i]).all()}
+
+    def release(self)->None:
+        '''
+        Detach, and free the shared memory if this process created it
+        '''
+        del self.array
+        self.shm.close()
+        if self.owner: self.shm.unlink()
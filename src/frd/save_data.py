@@ -3,7 +3,6 @@ from os import listdir
 from os.path import isfile, join
 from pathlib import Path
 import logging
-import pandas as pd
 import pickle
 import numpy as np
 
@@ -92,18 +91,54 @@ def pickle_data(data:dict, experiment_params:dict=None, experiment_name:str = No
 
     NOTES
     --------
-    If a file exists pickel.dump() will overwrite the contents of that file.
+    If a file exists its contents are overwritten, unless they are already identical, in which case the file is left untouched
+    so its timestamp still tells build.py the data (and everything derived from it) is up to date.
     '''
     n_iter = len(list(data.values())[0])
     if experiment_name is None: experiment_name = name_experiment(experiment_params, n_iter)
     filename = experiment_name+'_data'
-    with open(os.path.join(data_dir,filename), 'w+b') as output_file:
-        logging.info('File is open for writing data with mode w+b')
-        pickle.dump(data, output_file)
+    write_if_changed(os.path.join(data_dir,filename), pickle.dumps(data))
     return filename
 
+def write_if_changed(path, content:bytes)->bool:
+    '''
+    Write content to path unless the file already has exactly that content. Returns whether the file was written.
+    '''
+    if os.path.isfile(path) and os.path.getsize(path) == len(content):
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                logging.info(f'{path} is unchanged, not rewriting it')
+                return False
+    with open(path, 'w+b') as output_file:
+        logging.info('File is open for writing data with mode w+b')
+        output_file.write(content)
+    return True
+
 def unpickle_data(filename, data_dir=Path("./data"))->dict:
     with open(os.path.join(data_dir,filename), 'rb') as input_file:
         data = pickle.load(input_file)
     return data
 
+
+
+def save_mem_peaks(mem_peaks:dict, param_names:list, experiment_name:str, data_dir=Path("./data"))->str:
+    '''
+    Save the peak memory per stage and parameter combination of an experiment as csv
+
+    PARAMS
+    ------
+    mem_peaks (dict): keys are (stage, params) where params is the tuple of param values the stage depends on (a prefix of param_names),
+                        values are peak bytes allocated during the stage
+    param_names (list): names of all params of the experiment, in the order of the data keys
+
+    RETURNS
+    -------
+    filename (str): Name of the csv file, <experiment_name>_memory.csv
+    '''
+    import pandas as pd
+    rows = [[stage]+list(params)+[None]*(len(param_names)-len(params))+[peak, peak/2**20] for (stage, params), peak in mem_peaks.items()]
+    df = pd.DataFrame(rows, columns=['stage']+param_names+['peak_bytes', 'peak_mib'])
+    filename = experiment_name+'_memory.csv'
+    df.to_csv(os.path.join(data_dir, filename))
+    logging.info(f'Peak memory per stage and parameter combination saved to {filename}')
+    return filename
\ No newline at end of file
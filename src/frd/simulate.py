@@ -1,6 +1,10 @@
 import multiprocessing as mp
-from multiprocessing import Pool
+import contextlib
 import logging
+import os
+import random
+import time
+import numpy as np
 from pathlib import Path
 
 from . import helper as helper
@@ -8,16 +12,26 @@ from . import profiles as profiles
 from . import election_rules as rules
 from . import delegative_voting as d_voting
 from . import save_data as save_data
+from . import worker_profiling as worker_profiling
+from . import memory as memory
+from . import cache as cache
+from . import result_buffer as result_buffer
+from . import streaming as streaming
+from . import log_queue as log_queue
+from . import progress as progress
+from . import reference as reference
 
 
-APPROVAL_RULES = ['max_approval', 'rav']
-ORDINAL_RULES = ['borda', 'plurality']
+APPROVAL_RULES = ['max_approval', 'rav', 'pav', 'cc', 'cc_ls', 'seq_phragmen', 'mes']
+ORDINAL_RULES = ['borda', 'plurality', 'cc_borda', 'cc_borda_ls']
 AGREEMENT_RULES = ['max_agreement']
 WHALRUS_RULES = ['irv']
+APPROVAL_DEL_STYLES = ['approval'] #delegation styles that read the approvals of the delegators
+APPROVAL_PARAMS = ['app_k', 'app_thresh'] #profile params that only change the approvals derived from a profile
 
-def profiles_needed(election_rules_list):
+def profiles_needed(election_rules_list, del_styles_list=()):
     election_rules_set = set(election_rules_list)
-    approvals = not election_rules_set.isdisjoint(APPROVAL_RULES) #bool
+    approvals = not election_rules_set.isdisjoint(APPROVAL_RULES) or not set(del_styles_list).isdisjoint(APPROVAL_DEL_STYLES) #bool
     ordinals = not set(election_rules_set).isdisjoint(ORDINAL_RULES) #bool
     agreements = not set(election_rules_set).isdisjoint(AGREEMENT_RULES) #bool
     whalrus = not set(election_rules_set).isdisjoint(WHALRUS_RULES) #bool
@@ -27,68 +41,373 @@ def tuple_to_hashable(tup):
     #Converts a tuple with non-hashable types into a tuple of strings (e.g. to be used as keys in dict)
     return tuple(str(x) for x in tup)
 
-def single_iter(profile_param_vals:tuple, election_param_vals:dict, del_voting_param_vals:dict)->dict:
-    ''''''
+def single_iter(profile_param_vals:tuple, election_param_vals:dict, del_voting_param_vals:dict, mem_tracker:memory.StageTracker=None, coupled:bool=False, compress:bool=False,
+                stream_chunk_size:int=None, log_counts:dict=None, log_detail:bool=True)->dict:
+    '''
+    Run one iteration of an experiment: a new profile for each combination of profile params (except approval params, see below),
+    then every election and (F)RD combination on it
+
+    NOTES
+    -----
+    If mem_tracker is given, the peak allocation of the profile, election, and voting stages is recorded per parameter combination
+    Profiles that differ only in app_k and app_thresh share one instance: its rankings are computed once and the approvals are rederived from them
+    If coupled is True, the issue prefs of every profile are derived from common random numbers drawn once at the largest grid size (see profiles.CoupledPrefs)
+    If compress is True, voters with identical issue prefs are collapsed into weighted voter types (see Profile.compress_voters)
+    If stream_chunk_size is given, profiles are streaming.StreamingProfiles that generate voters in chunks of that size and only keep aggregate counts,
+    which cannot be combined with compress
+    '''
+    if stream_chunk_size and compress:
+        raise ValueError('Streaming profiles keep only aggregate counts and cannot be compressed, set compress or stream_chunk_size but not both')
     data = {} #keys are tuples of all params, values are lists of agreements
+    crn = None
+    if coupled:
+        crn = profiles.CoupledPrefs(max(profile_param_vals['n_voters']), max(profile_param_vals['n_cands']), max(profile_param_vals['n_issues']))
 
-    for profile_params in helper.params_dict_to_tuples(profile_param_vals)[0]:
-        # create new profile instance
-        (n_voters, n_cands, n_issues, voters_p, cands_p, app_k, app_thresh, intensity_dist) = profile_params
-        prof = profiles.Profile(n_voters, n_cands, n_issues, voters_p, cands_p, app_k, app_thresh)
-        election_rules = election_param_vals.get('election_rules')
-        prof.new_instance(intensity_dist, **profiles_needed(election_rules)) # derive only the election profiles necessary
-        logging.info(f'New profile created with params: {profile_params}')
-
-        for election_params in helper.params_dict_to_tuples(election_param_vals)[0]:
-            # elect reps to get rep_ids and election_scores (if election rule provides scores)
-            election_rule_name, n_reps = election_params
-            if n_reps > n_cands: continue #skip nonsenical case where number of reps to elect is greater than number of cands
-            logging.info(f'New election being run: {election_rule_name} with {n_reps} reps')
-
-            #create rd and frd objects to be reused where necessary, depending on delegation params. Run elections only once per iter
-            made_rd=False
-            if None in del_voting_param_vals['delegation_style']:
-                rd = d_voting.RD(prof, election_rule_name, n_reps, default='uniform')
-                rd.elect_reps()
-                rd.pull_rep_prefs()
-                made_rd=True
-            if del_voting_param_vals['delegation_style'] != [None]:
-                frd = d_voting.FRD(prof, election_rule_name, n_reps, del_style=None, best_k=None, n_delegators = None, default='uniform')
-                if made_rd == True: frd.set_rep_ids(rd.get_rep_ids()) #avoid running same election twice, use same reps from rd object
-                else: frd.elect_reps()
+    #one profile per combination of the non-approval params, whose approvals are rederived (without new draws) for each (app_k, app_thresh)
+    approval_param_vals = {k:profile_param_vals[k] for k in APPROVAL_PARAMS if k in profile_param_vals}
+    base_param_vals = {k:v for k, v in profile_param_vals.items() if k not in approval_param_vals}
+    needed = profiles_needed(election_param_vals.get('election_rules'), del_voting_param_vals.get('delegation_style', [])) # derive only the election profiles necessary
+    for base_params in helper.params_dict_to_tuples(base_param_vals)[0]:
+        prof = None
+        for approval_params in helper.params_dict_to_tuples(approval_param_vals)[0]:
+            all_params = {**dict(zip(base_param_vals.keys(), base_params)), **dict(zip(approval_param_vals.keys(), approval_params))}
+            profile_params = tuple(all_params[k] for k in profile_param_vals.keys())
+            n_voters, n_cands, n_issues = all_params['n_voters'], all_params['n_cands'], all_params['n_issues']
+            voters_p, cands_p = all_params['voters_p'], all_params['cands_p']
+            app_k, app_thresh = all_params['app_k'], all_params['app_thresh']
+            intensity_dist, pref_model = all_params.get('intensity_dist'), all_params.get('pref_model') #optional profile params, in any position
+            with memory.stage(mem_tracker, 'profile', profile_params):
+                if prof is None and stream_chunk_size: # create new profile instance
+                    prof = streaming.StreamingProfile(n_voters, n_cands, n_issues, voters_p, cands_p, app_k, app_thresh, chunk_size=stream_chunk_size, pref_model=pref_model)
+                    prof.new_instance(intensity_dist, coupled=crn, **needed)
+                    log_queue.log_event(log_counts, log_detail, 'profiles', 'New streaming profile created with params: %s', profile_params)
+                elif prof is None:
+                    prof = profiles.Profile(n_voters, n_cands, n_issues, voters_p, cands_p, app_k, app_thresh, compress=compress, pref_model=pref_model)
+                    prof.new_instance(intensity_dist, coupled=crn, **needed)
+                    log_queue.log_event(log_counts, log_detail, 'profiles', 'New profile created with params: %s', profile_params)
+                else:
+                    prof.set_approval_params(app_k, app_thresh, derive=needed['approvals'])
+                    log_queue.log_event(log_counts, log_detail, 'approvals_rederived', 'Approvals rederived with params: %s', profile_params)
+
+            for election_params in helper.params_dict_to_tuples(election_param_vals)[0]:
+                # elect reps to get rep_ids and election_scores (if election rule provides scores)
+                election_rule_name, n_reps = election_params
+                if n_reps > n_cands: continue #skip nonsenical case where number of reps to elect is greater than number of cands
+                log_queue.log_event(log_counts, log_detail, 'elections', 'New election being run: %s with %s reps', election_rule_name, n_reps)
+
+                #create rd and frd objects to be reused where necessary, depending on delegation params. Run elections only once per iter
+                made_rd=False
+                with memory.stage(mem_tracker, 'election', profile_params+election_params):
+                    if None in del_voting_param_vals['delegation_style']:
+                        rd = d_voting.RD(prof, election_rule_name, n_reps, default='uniform')
+                        rd.elect_reps()
+                        rd.pull_rep_prefs()
+                        made_rd=True
+                    if del_voting_param_vals['delegation_style'] != [None]:
+                        frd = d_voting.FRD(prof, election_rule_name, n_reps, del_style=None, best_k=None, n_delegators = None, default='uniform')
+                        if made_rd == True: frd.set_rep_ids(rd.get_rep_ids()) #avoid running same election twice, use same reps from rd object
+                        else: frd.elect_reps()
             
-            for del_voting_params in helper.params_dict_to_tuples(del_voting_param_vals)[0]:
-                logging.debug(f'Running RD or delegative voting with params: {del_voting_params}')
-                default, del_style, best_k, n_delegators, intensities = del_voting_params
-                if n_delegators and n_delegators > n_voters: continue #skip nonsensical case
-                if best_k and best_k > n_reps: continue #skip nonsensical case
-                if del_style is None: #RD
-                    rd.set_default(default)
-                    agreement = rd.run_RD(quick=True)
-                else: #FRD
-                    frd.set_delegation_params(default=default, del_style=del_style, best_k=best_k, n_delegators = n_delegators)
-                    agreement = frd.run_FRD(quick=True)
-                data[tuple_to_hashable(profile_params+election_params+del_voting_params)] = [agreement]
+                frd_runs = [] #FRD combinations are run together after the loop, in one stacked weighted majority vote
+                for del_voting_params in helper.params_dict_to_tuples(del_voting_param_vals)[0]:
+                    log_queue.log_event(log_counts, log_detail, 'voting_runs', 'Running RD or delegative voting with params: %s', del_voting_params, level=logging.DEBUG)
+                    default, del_style, best_k, n_delegators, intensities = del_voting_params
+                    if n_delegators and n_delegators > n_voters: continue #skip nonsensical case
+                    if best_k and best_k > n_reps: continue #skip nonsensical case
+                    if del_style is None: #RD
+                        with memory.stage(mem_tracker, 'voting', profile_params+election_params+del_voting_params):
+                            rd.set_default(default)
+                            agreement = rd.run_RD(quick=True)
+                        data[tuple_to_hashable(profile_params+election_params+del_voting_params)] = [agreement]
+                    else: #FRD
+                        frd_runs.append(del_voting_params)
+                with memory.stage(mem_tracker, 'voting', profile_params+election_params):
+                    agreements = frd.run_FRD_batch([run[:4] for run in frd_runs]) if frd_runs else []
+                for del_voting_params, agreement in zip(frd_runs, agreements):
+                    data[tuple_to_hashable(profile_params+election_params+del_voting_params)] = [agreement]
     return data
 
+def n_scheduled_combos(profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict)->int:
+    '''
+    Number of parameter combinations single_iter runs per iteration: the grid without the nonsensical combinations it skips
+    (more reps than cands, more delegators than voters, or best_k above the number of reps)
+    '''
+    n_combos = 0
+    for profile_params in helper.params_dict_to_tuples(profile_param_vals)[0]:
+        all_params = dict(zip(profile_param_vals.keys(), profile_params))
+        for _, n_reps in helper.params_dict_to_tuples(election_param_vals)[0]:
+            if n_reps > all_params['n_cands']: continue
+            for _, _, best_k, n_delegators, _ in helper.params_dict_to_tuples(del_voting_param_vals)[0]:
+                if n_delegators and n_delegators > all_params['n_voters']: continue
+                if best_k and best_k > n_reps: continue
+                n_combos += 1
+    return n_combos
+
 def single_iter_unpacker(args):
-    return single_iter(*args)
-
-def sim_parallel(n_iter:int, profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, save:bool=True, experiment_name=None, data_dir=Path('../data/')):
-    data = {}
-    logging.info(f'Parallelizing iterations on up to {mp.cpu_count()-1} CPUs')
-    with Pool(mp.cpu_count()-1) as pool:
-        for iter_data in pool.imap_unordered(single_iter_unpacker, [[profile_param_vals, election_param_vals, del_voting_param_vals]]*n_iter):
-            helper.append_dict_values(data, iter_data)
-
-    experiment_params = helper.merge_dicts([profile_param_vals,election_param_vals, del_voting_param_vals])
-    param_names = helper.params_dict_to_tuples(experiment_params)[1]
-    if save:
-        logging.info('Saving agreements data to file using pickle')
-        filename = save_data.pickle_data(data, experiment_params, experiment_name=experiment_name,data_dir=data_dir)
-        return data, param_names, n_iter, experiment_params, filename
-    else:
-        return data, param_names, n_iter, experiment_params, None
-
-
-    
\ No newline at end of file
+    '''
+    Run one iteration in a worker.
+
+    PARAMS
+    ------
+    args (list): profile_param_vals, election_param_vals, del_voting_param_vals, and a dict of options for the iteration:
+        'profile_file': if not None, the iteration is run under cProfile and the stats are dumped to that file
+        'trace_memory': if True, the peak allocation of each stage is traced with tracemalloc
+        'seed': if not None, numpy's and python's global random generators are seeded with it before the iteration
+        'coupled': if True, profiles are generated from common random numbers across the sweep (see single_iter)
+        'compress': if True, profiles collapse voters into weighted voter types (see single_iter)
+        'stream_chunk_size': if not None, profiles stream voters in chunks of this size (see single_iter)
+        'log_detail': if True, the profiles and elections of the iteration are logged one by one, else only counted
+        'backend': implementations the iteration is run with, 'fast' or 'reference' (see reference.py)
+        'buffer': (name, shape) of the shared ResultBuffer of the experiment
+        'col': column of the buffer the agreements of this iteration are written to
+    
+    RETURNS
+    -------
+    col (int): Column of the buffer that was written, as a completion notice
+    iter_stats (dict): Instrumentation of the iteration ('log_counts' of its events, the 'worker' name, 'runtime' in seconds, the 'finished' time, 'mem_peaks' and 'max_rss' if memory was traced)
+    '''
+    profile_param_vals, election_param_vals, del_voting_param_vals, options = args
+    start = time.perf_counter()
+    iter_stats = {'log_counts':{}, 'worker':mp.current_process().name}
+    if options.get('seed') is not None:
+        np.random.seed(options['seed'])
+        random.seed(options['seed']) #used by whalrus for tiebreaking
+    mem_tracker = None
+    if options.get('trace_memory'):
+        mem_tracker = memory.StageTracker()
+        mem_tracker.start()
+    sim_kwargs = {'coupled':options.get('coupled', False), 'compress':options.get('compress', False), 'stream_chunk_size':options.get('stream_chunk_size'),
+                  'log_counts':iter_stats['log_counts'], 'log_detail':options.get('log_detail', True)}
+    with reference.use_backend(options.get('backend', 'fast')): #the backend set in the parent does not reach the workers
+        if options.get('profile_file') is None:
+            iter_data = single_iter(profile_param_vals, election_param_vals, del_voting_param_vals, mem_tracker=mem_tracker, **sim_kwargs)
+        else:
+            iter_data = worker_profiling.run_profiled(single_iter, options['profile_file'], profile_param_vals, election_param_vals, del_voting_param_vals, mem_tracker=mem_tracker, **sim_kwargs)
+    if mem_tracker is not None:
+        mem_tracker.stop()
+        iter_stats['mem_peaks'] = mem_tracker.get_peaks()
+        iter_stats['max_rss'] = memory.max_rss_bytes()
+    buffer = result_buffer.ResultBuffer.attach(*options['buffer'], profile_param_vals, election_param_vals, del_voting_param_vals)
+    buffer.write(iter_data, options['col'])
+    iter_stats['runtime'] = time.perf_counter() - start
+    iter_stats['finished'] = time.time() #wall clock, comparable across processes
+    return options['col'], iter_stats
+
+def pool_context(start_method:str=None):
+    '''
+    Multiprocessing context to create worker pools with
+
+    PARAMS
+    ------
+    start_method (str): 'fork', 'spawn', 'forkserver', or None for the platform default
+
+    NOTES
+    -----
+    With 'forkserver', workers are forked from a server process that has only imported frd.simulate (and so only numpy),
+    instead of from the parent, which may have loaded matplotlib, pandas, etc. This keeps per-worker startup time and RSS low.
+    '''
+    ctx = mp.get_context(start_method)
+    if start_method == 'forkserver':
+        ctx.set_forkserver_preload(['frd.simulate'])
+    return ctx
+
+class WorkerPool():
+    '''
+    Pool of warm workers shared by the experiments of a run, used as a context manager.
+    The workers are started on the first submission (so a run whose experiments are all cached starts none) and are reused by every
+    experiment after that, so they import the package and set up logging once per run instead of once per experiment.
+    Experiments submitted before earlier ones finish queue their iterations behind them, so workers that finish the last iterations
+    of one experiment move on to the next instead of idling.
+
+    PARAMS
+    ------
+    n_workers (int): Number of workers, defaults to one less than the number of CPUs (at least one)
+    start_method (str): How workers are started (see pool_context)
+    '''
+    def __init__(self, n_workers:int=None, start_method:str=None) -> None:
+        self.n_workers = n_workers if n_workers is not None else max(1, mp.cpu_count()-1)
+        self.start_method = start_method
+        self.stack = contextlib.ExitStack()
+        self.ctx = pool_context(start_method)
+        self.log_q, self.logging = None, False
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None and exc_type is None:
+            self.pool.close() #let the workers finish and exit cleanly, they are terminated on errors
+            self.pool.join()
+        return self.stack.__exit__(exc_type, exc_value, traceback)
+
+    def get_log_queue(self):
+        '''
+        Queue that workers send their log records to (see log_queue.queue_logging), started on first use.
+        Other process pools of the run (e.g. build.Pipeline) log through it too, so the log has a single writer
+        '''
+        if not self.logging:
+            self.log_q = self.stack.enter_context(log_queue.queue_logging(self.ctx))
+            self.logging = True
+        return self.log_q
+
+    def get_pool(self):
+        if self.pool is None:
+            log_q = self.get_log_queue()
+            self.pool = self.stack.enter_context(self.ctx.Pool(self.n_workers, initializer=log_queue.init_worker, initargs=(log_q, logging.getLogger().level)))
+            logging.info(f'Started {self.n_workers} workers')
+        return self.pool
+
+    def imap_unordered(self, func, tasks:list, chunksize:int=4):
+        '''
+        Queue tasks on the workers. Returns an iterator over the results in order of completion
+        '''
+        return self.get_pool().imap_unordered(func, tasks, chunksize=chunksize)
+
+class ExperimentRun():
+    '''
+    One experiment submitted to a WorkerPool. The iterations missing from the cache are queued on the workers when the run is created,
+    and finish() waits for them and returns the experiment's results (see sim_parallel for the params).
+    Several runs can be created before finishing any, to keep the workers busy across experiments.
+    '''
+    def __init__(self, pool:WorkerPool, n_iter:int, profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, save:bool=True, experiment_name=None,
+                 data_dir=Path('../data/'), profile_frac:float=0.0, profile_dir=Path('../profiles/'), trace_memory:bool=False, memory_budget=None, seed:int=None, cache_dir=None,
+                 coupled:bool=False, compress:bool=False, stream_chunk_size:int=None, log_every:int=1000, progress_file=None, progress_interval:float=10.0, backend:str=None):
+        if stream_chunk_size and compress: #checked before the cache key, which both would enter
+            raise ValueError('Streaming profiles keep only aggregate counts and cannot be compressed, set compress or stream_chunk_size but not both')
+        self.n_iter = n_iter
+        self.param_vals = (profile_param_vals, election_param_vals, del_voting_param_vals)
+        self.save, self.experiment_name, self.data_dir = save, experiment_name, data_dir
+        self.profile_dir, self.trace_memory, self.cache_dir = profile_dir, trace_memory, cache_dir
+        self.use_cache = seed is not None and cache_dir is not None
+        if backend is None: backend = reference.get_backend()
+        if backend not in reference.BACKENDS:
+            raise ValueError(f'Backend must be one of {reference.BACKENDS}, cannot be: {backend}')
+        sim_options = {k:v for k, v in [('coupled', coupled), ('compress', compress), ('stream_chunk_size', stream_chunk_size)] if v} #options that change results
+        if backend != 'fast': sim_options['backend'] = backend #left out for the fast backend, so default runs keep their cache keys
+        self.data, start_iter = {}, 0
+        if self.use_cache:
+            self.cache_key = cache.experiment_key(profile_param_vals, election_param_vals, del_voting_param_vals, seed, sim_options=sim_options or None)
+            self.data, start_iter = cache.load(self.cache_key, cache_dir)
+            if start_iter >= n_iter:
+                logging.info(f'Cache hit for experiment {experiment_name}, skipping simulation')
+            elif start_iter > 0:
+                logging.info(f'Cache has {start_iter} of {n_iter} iterations for experiment {experiment_name}, running the missing ones')
+        self.iters = range(start_iter, n_iter)
+        self.buffer, self.options, self.results, self.reporter = None, [], None, None
+        if not self.iters: return
+        memory.preflight(profile_param_vals, election_param_vals, del_voting_param_vals, pool.n_workers, memory_budget=memory_budget, experiment_name=experiment_name,
+                          coupled=coupled, compress=compress, stream_chunk_size=stream_chunk_size)
+        profiled_iters = worker_profiling.choose_profiled_iters(self.iters, profile_frac)
+        if profiled_iters:
+            os.makedirs(profile_dir, exist_ok=True)
+            logging.info(f'Profiling {len(profiled_iters)} of {len(self.iters)} iterations in the workers')
+        self.buffer = result_buffer.ResultBuffer.create(result_buffer.combo_keys(profile_param_vals, election_param_vals, del_voting_param_vals), len(self.iters))
+        self.options = [{'profile_file':worker_profiling.profile_file(profile_dir, experiment_name, i) if i in profiled_iters else None,
+                         'trace_memory':trace_memory,
+                         'seed':helper.iteration_seed(seed, i) if seed is not None else None,
+                         **sim_options,
+                         'buffer':(self.buffer.get_name(), self.buffer.shape),
+                         'col':i-start_iter,
+                         'log_detail':log_every is not None and (i-start_iter) % log_every == 0} for i in self.iters]
+        logging.info(f'Queueing {len(self.iters)} iterations of experiment {experiment_name} on {pool.n_workers} workers')
+        try:
+            if progress_interval is not None: #from submission, since the iterations may complete before finish() is called
+                self.reporter = progress.ProgressReporter(experiment_name, len(self.iters), n_scheduled_combos(*self.param_vals), progress_file=progress_file, interval=progress_interval)
+            self.results = pool.imap_unordered(single_iter_unpacker, [[*self.param_vals, o] for o in self.options], chunksize=4)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self)->None:
+        '''
+        Free the shared result buffer (if it has not been freed yet)
+        '''
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+
+    def finish(self, pipeline=None)->tuple:
+        '''
+        Wait for the iterations of the experiment, then cache and save its data.
+        If pipeline (a build.Pipeline) is given, the data is saved, and its moments and plots built, in the background instead
+
+        RETURNS
+        -------
+        data, param_names, n_iter, experiment_params, filename (None if not saved), as sim_parallel
+        '''
+        mem_peaks, max_rss, log_counts = {}, 0, {}
+        if self.results is not None:
+            try:
+                for _, iter_stats in self.results:
+                    if self.reporter is not None: self.reporter.update(iter_stats)
+                    log_queue.merge_counts(log_counts, iter_stats['log_counts'])
+                    if 'mem_peaks' in iter_stats:
+                        memory.merge_peaks(mem_peaks, iter_stats['mem_peaks'])
+                        max_rss = max(max_rss, iter_stats['max_rss'])
+                if self.reporter is not None: self.reporter.close()
+                logging.info(f'Events over {len(self.iters)} iterations ({sum(o["log_detail"] for o in self.options)} logged in detail): {log_counts}')
+                helper.append_dict_values(self.data, self.buffer.to_data()) #buffer columns are in iteration order, so cached data can be truncated and extended
+            finally:
+                self.release()
+            profile_files = [o['profile_file'] for o in self.options if o['profile_file'] is not None]
+            if profile_files:
+                worker_profiling.merge_profiles(profile_files, self.experiment_name, self.profile_dir)
+            if self.use_cache: cache.store(self.cache_key, self.data, self.n_iter, self.cache_dir)
+        data = cache.first_iters(self.data, self.n_iter)
+
+        experiment_params = helper.merge_dicts(list(self.param_vals))
+        param_names = helper.params_dict_to_tuples(experiment_params)[1]
+        if self.trace_memory and mem_peaks:
+            logging.info(f'Peak worker RSS: {max_rss/2**20:.0f} MiB, largest traced stage: {max(mem_peaks.values(), default=0)/2**20:.1f} MiB')
+            if self.save: save_data.save_mem_peaks(mem_peaks, param_names, experiment_name=self.experiment_name, data_dir=self.data_dir)
+        if self.save and pipeline is not None:
+            experiment_name = self.experiment_name if self.experiment_name is not None else save_data.name_experiment(experiment_params, self.n_iter)
+            filename = pipeline.submit(experiment_name, data, param_names)
+            return data, param_names, self.n_iter, experiment_params, filename
+        elif self.save:
+            logging.info('Saving agreements data to file using pickle')
+            filename = save_data.pickle_data(data, experiment_params, experiment_name=self.experiment_name,data_dir=self.data_dir)
+            return data, param_names, self.n_iter, experiment_params, filename
+        else:
+            return data, param_names, self.n_iter, experiment_params, None
+
+def sim_parallel(n_iter:int, profile_param_vals:dict, election_param_vals:dict, del_voting_param_vals:dict, save:bool=True, experiment_name=None, data_dir=Path('../data/'),
+                 profile_frac:float=0.0, profile_dir=Path('../profiles/'), trace_memory:bool=False, memory_budget=None, seed:int=None, cache_dir=None, start_method:str=None,
+                 coupled:bool=False, compress:bool=False, stream_chunk_size:int=None, log_every:int=1000, pool:WorkerPool=None, progress_file=None, progress_interval:float=10.0,
+                 backend:str=None):
+    '''
+    Run n_iter iterations of an experiment in parallel, optionally profiling a fraction of the iterations inside the workers
+
+    NOTES
+    -----
+    If seed is given, iteration i is seeded with helper.iteration_seed(seed, i), so results are reproducible and do not depend on the number of workers
+    If seed and cache_dir are both given, results are cached by a hash of the params, seed, and package version (see cache.py).
+    Only the iterations missing from the cache are run, and the data returned is always the first n_iter iterations.
+    The iterations run on pool (a WorkerPool shared by the experiments of a run), or on a pool started for this experiment if pool is None,
+    with start_method setting how its workers are started (see pool_context)
+    If coupled is True, each iteration derives all its profiles from one draw of common random numbers (see single_iter), which reduces the variance
+    of differences between neighbouring sweep points. Coupled and uncoupled runs are cached separately.
+    If compress is True, profiles collapse voters with identical issue prefs into weighted voter types, for many voters and few issues (see Profile.compress_voters)
+    If stream_chunk_size is given, profiles generate voters in chunks of that size and keep only aggregate counts, for very large electorates (see streaming.py),
+    and cannot be combined with compress
+    If profile_frac > 0, that fraction of the iterations is run under cProfile in the workers and the worker profiles are merged
+    into one pstats file and one text report per experiment in profile_dir (see worker_profiling.merge_profiles)
+    Workers write agreements into a shared-memory ResultBuffer indexed by (parameter combination, iteration) and only send back completion notices
+    Before launching, the peak memory of the grid is estimated and a warning is issued if it exceeds memory_budget (bytes, defaults to available memory)
+    If trace_memory is True, the peak allocation per stage and parameter combination is traced in the workers and saved to <experiment>_memory.csv
+    Workers log through a queue to a listener thread in the parent (see log_queue.py). Only the first iteration run and every log_every-th after it
+    log their profiles and elections one by one (None logs none of them), the others only count them, and the counts are logged once at the end
+    Every progress_interval seconds (None for no reports), throughput overall and per worker, completed and pending iterations and combinations,
+    and an ETA are printed, logged, and appended as a JSON line to progress_file if given (see progress.py)
+    The workers run the iterations with backend ('fast' or 'reference', see reference.py), which defaults to the backend set in the calling process.
+    Reference runs are cached separately.
+    '''
+    with contextlib.ExitStack() as stack:
+        if pool is None:
+            pool = stack.enter_context(WorkerPool(start_method=start_method))
+        run = ExperimentRun(pool, n_iter, profile_param_vals, election_param_vals, del_voting_param_vals, save=save, experiment_name=experiment_name, data_dir=data_dir,
+                            profile_frac=profile_frac, profile_dir=profile_dir, trace_memory=trace_memory, memory_budget=memory_budget, seed=seed, cache_dir=cache_dir,
+                            coupled=coupled, compress=compress, stream_chunk_size=stream_chunk_size, log_every=log_every,
+                            progress_file=progress_file, progress_interval=progress_interval, backend=backend)
+        return run.finish()
@@ -0,0 +1,238 @@
+from typing import Tuple
+import logging
+import numpy as np
+
+from . import helper as helper
+from . import intensities as intensities
+from . import profiles as profiles
+from . import pref_models as pref_models
+
+'''
+Streaming profiles for large electorates (e.g. millions of voters).
+Voters are generated in fixed-size chunks and only the sufficient statistics the rules and outcomes need are accumulated:
+issue vote counts (voter majority), position counts (scoring rules), approval counts (max_approval), and agreement sums (max_agreement).
+Each chunk has its own random stream (seeded from the instance seed and the chunk index), so chunks can be regenerated exactly
+to tally the prefs and orders of the delegators once they are drawn. Memory is bounded by the chunk size, not the number of voters
+(except with intensity dists, where the n_voters intensities are kept).
+'''
+
+class StreamingProfile():
+    '''
+    Drop-in replacement for profiles.Profile in single_iter for rules that only need aggregate counts
+    (random_winners, borda, plurality, max_approval, max_agreement) and for RD and FRD (incisive, best_k, and approval delegation).
+
+    NOTES
+    -----
+    RAV and IRV need every voter's ballot at once and are not supported. Neither are coupled profiles.
+    Ties in a voter's ranking are broken randomly within each chunk's stream, so results have the same distribution as with Profile
+    but not the same random draws.
+    '''
+    def __init__(self, n_voters:int, n_cands:int, n_issues:int, voters_p, cands_p, app_k, app_thresh, chunk_size:int=10000, pref_model:str=None):
+        self.n_voters, self.n_cands = n_voters, n_cands
+        self.pref_model = pref_model #spec of a structured pref model (see pref_models.py), None for independent Bernoulli prefs
+        self.world:dict = None #drawn once per instance and shared by every chunk
+        self.n_issues = n_issues
+        self.voters_p, self.cands_p = voters_p, cands_p
+        self.app_k, self.app_thresh = app_k, app_thresh
+        self.chunk_size = chunk_size
+
+        self.seed:int = None #seed of this instance, chunk streams are derived from it
+        self.v_intensities:np.ndarray = None
+        self.c_pref:np.ndarray = None
+
+        self.issue_counts:np.ndarray = None #number of voters preferring 1 on each issue
+        self.position_counts:np.ndarray = None #n_cands x n_cands, voters ranking cand c in position j
+        self.approval_counts:np.ndarray = None
+        self.agreement_sums:np.ndarray = None
+        self.voter_majority_outcomes = None
+
+    def chunk_bounds(self)->list:
+        return [(start, min(start+self.chunk_size, self.n_voters)) for start in range(0, self.n_voters, self.chunk_size)]
+
+    def chunk_prefs(self, chunk:int, start:int, stop:int)->Tuple[np.ndarray, np.random.RandomState]:
+        '''
+        (Re)generate the issue prefs of the voters of one chunk. Returns them and the chunk's random stream, which the chunk's tie-breakers are drawn from next.
+        '''
+        rs = np.random.RandomState(helper.iteration_seed(self.seed, chunk))
+        if not pref_models.is_bernoulli(self.pref_model):
+            return pref_models.draw_agents(self.pref_model, self.world, stop-start, self.n_issues, self.voters_p, rng=rs), rs
+        p = self.voters_p if self.v_intensities is None else self.v_intensities[start:stop, None]
+        return rs.binomial(1, p, size=(stop-start, self.n_issues)), rs
+
+    def chunk_rankings(self, v_pref:np.ndarray, rs:np.random.RandomState)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Distances and rankings (closest cand first, ties broken randomly) of the voters of one chunk, as in Profile.distances_to_rankings
+        '''
+        distances = np.sum(v_pref[:, None] != self.c_pref, axis=2) / self.n_issues
+        tiebreakers = rs.random_sample((len(v_pref), self.n_cands))
+        return distances, np.lexsort((tiebreakers, distances), axis=1)
+
+    def new_instance(self, intensity_dist=None, approvals=True, ordinals=True, agreements=True, whalrus_orders=False, coupled=None):
+        '''
+        Draw new cand prefs and a new instance seed, then stream over the voter chunks to accumulate the counts of the election profiles indicated by kwargs
+        '''
+        if whalrus_orders:
+            raise ValueError('IRV needs every ballot at once, it is not supported by StreamingProfile')
+        if coupled is not None:
+            raise ValueError('Coupled profiles are not supported by StreamingProfile')
+        if intensity_dist is None and self.voters_p is None:
+            raise ValueError(f'Intensity dist is None but voters_p is also None')
+        self.seed = int(np.random.randint(2**31))
+        self.v_intensities = None if intensity_dist is None else intensities.draw_intensities(intensity_dist, self.n_voters)
+        if pref_models.is_bernoulli(self.pref_model):
+            self.c_pref = np.random.binomial(1, self.cands_p, size=(self.n_cands, self.n_issues))
+        else:
+            if intensity_dist is not None:
+                raise ValueError(f'Pref model {self.pref_model} cannot be combined with intensity dists')
+            self.world = pref_models.draw_world(self.pref_model, self.n_issues)
+            self.c_pref = pref_models.draw_agents(self.pref_model, self.world, self.n_cands, self.n_issues, self.cands_p)
+        self.needed = {'approvals':approvals, 'ordinals':ordinals, 'agreements':agreements}
+        self.accumulate(**self.needed)
+        self.voter_majority_vote()
+        return vars(self)
+
+    def accumulate(self, approvals=True, ordinals=True, agreements=True)->None:
+        '''
+        One pass over the voter chunks, accumulating issue counts and the counts the rules need
+        '''
+        self.issue_counts = np.zeros(self.n_issues, dtype=np.int64)
+        self.position_counts = np.zeros((self.n_cands, self.n_cands), dtype=np.int64) if ordinals else None
+        self.approval_counts = np.zeros(self.n_cands, dtype=np.int64) if approvals else None
+        self.agreement_sums = np.zeros(self.n_cands) if agreements else None
+        positions = np.arange(self.n_cands)
+        for chunk, (start, stop) in enumerate(self.chunk_bounds()):
+            v_pref, rs = self.chunk_prefs(chunk, start, stop)
+            self.issue_counts += np.sum(v_pref, axis=0)
+            if not (approvals or ordinals or agreements): continue
+            distances, rankings = self.chunk_rankings(v_pref, rs)
+            if ordinals:
+                self.position_counts += np.bincount((rankings*self.n_cands + positions).ravel(), minlength=self.n_cands**2).reshape(self.n_cands, self.n_cands)
+            if approvals:
+                self.approval_counts += self.chunk_approval_counts(distances, rankings)
+            if agreements:
+                self.agreement_sums += np.sum(1 - distances, axis=0)
+        logging.debug('Streamed %s voters in %s chunks', self.n_voters, len(self.chunk_bounds()))
+
+    def chunk_approval_counts(self, distances:np.ndarray, rankings:np.ndarray)->np.ndarray:
+        '''
+        Approval counts of the voters of one chunk: each approves the first min(app_k, number below app_thresh) cands of their ranking
+        '''
+        return self.chunk_approvals(distances, rankings).counts()
+
+    def chunk_approvals(self, distances:np.ndarray, rankings:np.ndarray)->profiles.ApprovalSets:
+        '''
+        Approvals of the voters of one chunk: each approves the first min(app_k, number below app_thresh) cands of their ranking
+        '''
+        n_approved = np.minimum(np.count_nonzero(distances < self.app_thresh, axis=1), max(0, self.app_k))
+        return profiles.ApprovalSets.from_rankings(rankings, n_approved)
+
+    def voter_majority_vote(self)->np.ndarray:
+        '''
+        Voter majority on every issue from the issue counts, ties broken randomly (as in Profile.voter_majority_vote)
+        '''
+        self.voter_majority_outcomes = np.random.binomial(1, 0.5, size=(self.n_issues))
+        self.voter_majority_outcomes[self.issue_counts > self.n_voters / 2] = 1
+        self.voter_majority_outcomes[self.issue_counts < self.n_voters / 2] = 0
+        return self.voter_majority_outcomes
+
+    def set_approval_params(self, k, threshold, derive=False):
+        '''
+        Change app_k and app_thresh. If derive is True, the approval counts are reaccumulated by streaming over the chunks again (same draws)
+        '''
+        self.app_k, self.app_thresh = k, threshold
+        self.approval_counts = None
+        if derive:
+            self.approval_counts = np.zeros(self.n_cands, dtype=np.int64)
+            for chunk, (start, stop) in enumerate(self.chunk_bounds()):
+                distances, rankings = self.chunk_rankings(*self.chunk_prefs(chunk, start, stop))
+                self.approval_counts += self.chunk_approval_counts(distances, rankings)
+
+    def chunks_of(self, voter_ids)->dict:
+        '''
+        Group voter ids by chunk. Keys are chunk indices, values are the (sorted) offsets of the voters within the chunk
+        '''
+        voter_ids = np.sort(np.asarray(voter_ids, dtype=int))
+        chunks = voter_ids // self.chunk_size
+        return {int(c):voter_ids[chunks == c] - int(c)*self.chunk_size for c in np.unique(chunks)}
+
+    def issue_tallies(self, voter_ids)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Number of the given voters (e.g. delegators) who prefer 0 and who prefer 1 on each issue, regenerating only the chunks they are in
+        '''
+        n_ones = np.zeros(self.n_issues, dtype=np.int64)
+        bounds = self.chunk_bounds()
+        for chunk, offsets in self.chunks_of(voter_ids).items():
+            v_pref, _ = self.chunk_prefs(chunk, *bounds[chunk])
+            n_ones += np.sum(v_pref[offsets], axis=0)
+        return len(voter_ids) - n_ones, n_ones
+
+    def voter_orders(self, voter_ids)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        Orders of the given voters (one row per voter) and the number of voters with each row (all 1), regenerating only the chunks they are in
+        '''
+        orders = [np.empty((0, self.n_cands), dtype=int)]
+        bounds = self.chunk_bounds()
+        for chunk, offsets in self.chunks_of(voter_ids).items():
+            _, rankings = self.chunk_rankings(*self.chunk_prefs(chunk, *bounds[chunk]))
+            orders.append(rankings[offsets])
+        orders = np.vstack(orders)
+        return orders, np.ones(len(orders), dtype=int)
+
+    def voter_approvals(self, voter_ids)->Tuple[profiles.ApprovalSets, np.ndarray]:
+        '''
+        Approvals of the given voters (one row per voter) and the number of voters with each row (all 1), regenerating only the chunks they are in
+        '''
+        cand_ids, lengths = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+        bounds = self.chunk_bounds()
+        for chunk, offsets in self.chunks_of(voter_ids).items():
+            distances, rankings = self.chunk_rankings(*self.chunk_prefs(chunk, *bounds[chunk]))
+            approvals = self.chunk_approvals(distances[offsets], rankings[offsets])
+            cand_ids.append(approvals.cand_ids)
+            lengths.append(approvals.lengths())
+        lengths = np.concatenate(lengths)
+        approvals = profiles.ApprovalSets(np.concatenate(cand_ids), np.concatenate(([0], np.cumsum(lengths))), self.n_cands)
+        return approvals, np.ones(len(lengths), dtype=int)
+
+    ##Getters
+
+    def get_v_intensities(self):
+        return self.v_intensities
+
+    def get_n_cands(self):
+        return self.n_cands
+
+    def get_n_voters(self):
+        return self.n_voters
+
+    def get_n_issues(self):
+        return self.n_issues
+
+    def get_ballot_weights(self):
+        return None
+
+    def get_approval_params(self):
+        return self.app_k, self.app_thresh
+
+    def get_issue_prefs(self):
+        return None, self.c_pref #voter prefs are never materialized
+
+    def get_position_counts(self):
+        return self.position_counts
+
+    def get_approval_counts(self):
+        return self.approval_counts
+
+    def get_agreement_sums(self):
+        return self.agreement_sums
+
+    def get_voter_majority(self):
+        return self.voter_majority_outcomes
+
+    def get_approvals(self):
+        raise ValueError('Per-voter approvals (used by RAV) are not available in a StreamingProfile')
+
+    def get_orders(self):
+        raise ValueError('Per-voter orders are not available in a StreamingProfile, use get_position_counts or voter_orders')
+
+    def get_whalrus_orders(self):
+        raise ValueError('IRV needs every ballot at once, it is not supported by StreamingProfile')
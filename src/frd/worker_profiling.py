@@ -0,0 +1,80 @@
+import cProfile
+import pstats
+import random
+import os
+import logging
+
+
+def choose_profiled_iters(iters:range, profile_frac:float, seed=0)->set:
+    '''
+    Choose which iterations of an experiment get profiled inside the worker that runs them
+
+    PARAMS
+    ------
+    iters (range): Indices of the iterations that will be run
+    profile_frac (float): Fraction of iterations to profile, in [0,1]. If > 0 at least one iteration is profiled.
+    **seed: Seed for the (private) random generator used to pick the iterations
+
+    RETURNS
+    -------
+    set of iteration indices (ints) to profile
+
+    NOTES
+    -----
+    Uses its own random.Random instance so the numpy global random state (and therefore the simulation results) is untouched
+    '''
+    if not 0 <= profile_frac <= 1:
+        raise ValueError(f'profile_frac must be in [0,1], cannot be: {profile_frac}')
+    if profile_frac == 0 or len(iters) == 0:
+        return set()
+    n_profiled = min(len(iters), max(1, round(profile_frac*len(iters))))
+    return set(random.Random(seed).sample(iters, n_profiled))
+
+def profile_file(profile_dir, experiment_name, iteration:int)->str:
+    '''
+    Name of the file a worker dumps its cProfile stats to for one iteration
+    '''
+    return os.path.join(profile_dir, f'{experiment_name}_iter{iteration}.prof')
+
+def run_profiled(func, outfile, *args, **kwargs):
+    '''
+    Call func(*args, **kwargs) under cProfile and dump the stats to outfile. Returns the output of func.
+    '''
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    profiler.dump_stats(outfile)
+    return result
+
+def merge_profiles(profile_files:list, experiment_name, profile_dir, sort_by='cumulative', n_lines=50, cleanup=True):
+    '''
+    Merge the per-iteration worker profiles of an experiment into one pstats file and one text report
+
+    PARAMS
+    ------
+    profile_files (list): Paths of the .prof files dumped by the workers
+    experiment_name (str): Prefix of the merged files
+    profile_dir: Directory to write the merged files to
+    **sort_by (str): pstats sort key for the text report
+    **n_lines (int): Number of functions listed in the text report
+    **cleanup (bool): Delete the per-iteration files once merged
+
+    RETURNS
+    -------
+    statsfile (str): Merged stats, loadable with pstats.Stats or snakeviz
+    reportfile (str): Human readable report sorted by sort_by
+    '''
+    profile_files = [f for f in profile_files if os.path.isfile(f)]
+    if not profile_files:
+        logging.warning(f'No worker profiles found to merge for experiment {experiment_name}')
+        return None, None
+    statsfile = os.path.join(profile_dir, f'{experiment_name}_workers.pstats')
+    reportfile = os.path.join(profile_dir, f'{experiment_name}_workers_profile.txt')
+    with open(reportfile, 'w') as report:
+        stats = pstats.Stats(*profile_files, stream=report)
+        report.write(f'Merged cProfile stats from {len(profile_files)} worker iterations of experiment {experiment_name}\n\n')
+        stats.sort_stats(sort_by).print_stats(n_lines)
+    stats.dump_stats(statsfile)
+    if cleanup:
+        for f in profile_files: os.remove(f)
+    logging.info(f'Merged {len(profile_files)} worker profiles into {statsfile}')
+    return statsfile, reportfile
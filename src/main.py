@@ -1,15 +1,11 @@
 import logging
 import time
-import numpy as np
 import json
 from pathlib import Path
-import os
 
 
-import frd.save_data as save_data
 import frd.simulate as simulate
-import frd.analysis as analysis
-import frd.plot as plot
+import frd.build as build
 
 
 
@@ -22,8 +18,23 @@ def main():
     EXPERIMENTS = [] #Set which experiments to run. Runs all if list is empty
     N_ITER = 10000
     save=True
-    show=False
     data_dir=Path("../data")
+    plot_dir=Path("../plots")
+    SEED = 10 #each iteration is seeded from this seed and its index
+    cache_dir=Path("../data/cache") #set to None to always rerun experiments from scratch
+    PROFILE_FRAC = 0.0 #fraction of iterations to run under cProfile inside the workers, merged into one report per experiment
+    profile_dir=Path("../profiles")
+    TRACE_MEMORY = False #trace peak allocation per stage and parameter combination in the workers, saved to <experiment>_memory.csv
+    MEMORY_BUDGET = None #bytes, warn before running an experiment estimated to exceed it. None uses the available memory
+    START_METHOD = 'forkserver' #workers are forked from a lean server process that has only imported frd.simulate
+    N_WORKERS = None #workers in the pool shared by all experiments. None uses one less than the number of CPUs
+    PIPELINE_WORKERS = 1 #background workers that save data and build moments and plots of finished experiments
+    PROGRESS_INTERVAL = 10 #seconds between progress reports (throughput, pending iterations, ETA) of the running experiment. None disables them
+    progress_file=Path("../data/progress.jsonl") #each progress report is appended as a JSON line
+    COUPLED = False #derive all profiles of an iteration from common random numbers, lowers the variance of differences between sweep points
+    COMPRESS = False #collapse voters with identical issue prefs into weighted voter types (worth it for many voters and few issues)
+    STREAM_CHUNK_SIZE = None #generate voters in chunks of this size and keep only aggregate counts (for million-voter electorates, no RAV/IRV)
+    LOG_EVERY = 1000 #log the profiles and elections of every LOG_EVERY-th iteration one by one, the others are only counted. None logs only the counts
 
     # p = Path(__file__).with_name('config.json')
     p = Path(__file__).with_name('experiment_intensities_1.json')
@@ -31,36 +42,49 @@ def main():
         experiments = json.load(f)
         f.close()
 
-    np.random.seed(10)
-
-    for experiment_name in experiments.keys():
-        if EXPERIMENTS and experiment_name not in EXPERIMENTS: continue #which experiments to run
-        print('Starting Experiment '+str(experiment_name) +' running '+str(N_ITER) +' iterations')
-        logging.info('')
-        logging.info('Starting Experiment '+str(experiment_name) +' running '+str(N_ITER) +' iterations')
-        #unpack experiment parameters
-        experiment_params = experiments[experiment_name]
-        profile_param_vals = experiment_params["profile_param_vals"]
-        election_param_vals = experiment_params["election_param_vals"]
-        del_voting_param_vals = experiment_params["del_voting_param_vals"]
-    
-        start = time.perf_counter()
-
-        #run simulation for this experiment
-        _, param_names, n_iter, experiment_params, filename = simulate.sim_parallel(N_ITER,profile_param_vals, election_param_vals, del_voting_param_vals, save=save, experiment_name = experiment_name,data_dir=data_dir)
-
-        #save data and analysis (i.e. moments) and generate plots
-        if save == True:
-            logging.info('Experiment data saved to '+str(filename)+' using pickle')
-            _, momentsfile = analysis.get_moments(filename, param_names, save=True, data_dir=data_dir)
-            logging.info('Moments computed and saved as csv')
-            plot.plot_moments(momentsfile, y_var='mean', save=True, show=show, data_dir=data_dir) #will generate one plot for each independent variable, up to two
-            logging.info('Plots created for mean agreement')
-        
-        #Report runtime
-        end = time.perf_counter()
-        logging.info(f'Total runtime: {end-start}')
-        logging.info(f'Avg runtime per iteration: {(end-start)/n_iter}')
+    start = time.perf_counter()
+
+    #one pool of warm workers for the whole run. Every experiment is queued on it before waiting for any, so the workers move on to the next
+    #experiment as soon as they finish the iterations of the previous one
+    #saving, moments, and plots of each finished experiment are built by background workers while the next experiments run
+    with simulate.WorkerPool(n_workers=N_WORKERS, start_method=START_METHOD) as pool, build.Pipeline(pool, n_workers=PIPELINE_WORKERS, data_dir=data_dir, plot_dir=plot_dir, y_var='mean') as pipeline:
+        runs = {}
+        try:
+            for experiment_name in experiments.keys():
+                if EXPERIMENTS and experiment_name not in EXPERIMENTS: continue #which experiments to run
+                print('Starting Experiment '+str(experiment_name) +' running '+str(N_ITER) +' iterations')
+                logging.info('')
+                logging.info('Starting Experiment '+str(experiment_name) +' running '+str(N_ITER) +' iterations')
+                #unpack experiment parameters
+                experiment_params = experiments[experiment_name]
+                profile_param_vals = experiment_params["profile_param_vals"]
+                election_param_vals = experiment_params["election_param_vals"]
+                del_voting_param_vals = experiment_params["del_voting_param_vals"]
+
+                #queue the iterations of this experiment on the workers
+                runs[experiment_name] = simulate.ExperimentRun(pool, N_ITER, profile_param_vals, election_param_vals, del_voting_param_vals, save=save, experiment_name=experiment_name, data_dir=data_dir,
+                                                               profile_frac=PROFILE_FRAC, profile_dir=profile_dir,
+                                                               trace_memory=TRACE_MEMORY, memory_budget=MEMORY_BUDGET,
+                                                               seed=SEED, cache_dir=cache_dir,
+                                                               coupled=COUPLED, compress=COMPRESS,
+                                                               stream_chunk_size=STREAM_CHUNK_SIZE, log_every=LOG_EVERY,
+                                                               progress_file=progress_file, progress_interval=PROGRESS_INTERVAL)
+
+            for experiment_name, experiment_run in runs.items():
+                _, param_names, n_iter, experiment_params, filename = experiment_run.finish(pipeline=pipeline)
+                if save == True:
+                    logging.info('Experiment data queued to be saved to '+str(filename)+' using pickle')
+
+                #Report runtime (experiments overlap on the workers, so this is the time from the start of the run)
+                end = time.perf_counter()
+                logging.info(f'Experiment {experiment_name} finished {end-start:.1f}s into the run')
+
+            #wait for the background builds. Only the moments and plots that are stale (their data or the code that builds them changed) were rebuilt
+            built = pipeline.collect() #one plot for each independent variable, up to two
+            logging.info(f'Rebuilt moments: {built["moments"]}')
+            logging.info(f'Rebuilt plots for mean agreement: {built["plots"]}')
+        finally:
+            for experiment_run in runs.values(): experiment_run.release() #free the result buffers of experiments not finished because of an error
 
     logging.info('Done')
 
@@ -0,0 +1,52 @@
+import unittest
+import warnings
+import numpy as np
+
+import frd.analysis as analysis
+
+class Test_analysis(unittest.TestCase):
+
+    def test_grouped_moments(self):
+        rng = np.random.default_rng(0)
+        groups = [rng.random(50), rng.integers(0, 10, 200) / 9, rng.normal(0.6, 0.1, 7), np.full(30, 0.7), np.full(5, 1/3), np.array([0.2])]
+        group_ids = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+        order = rng.permutation(len(group_ids)) #groups interleaved, as in the long format of several parameterizations
+        moments = analysis.grouped_moments(group_ids[order], np.concatenate(groups)[order], len(groups))
+        for g, values in enumerate(groups):
+            with warnings.catch_warnings(): #scipy warns about the constant groups
+                warnings.simplefilter('ignore', RuntimeWarning)
+                expected = analysis.four_moments(values)
+            np.testing.assert_allclose(moments[g], expected, rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=f'group {g}')
+        self.assertTrue(np.isnan(moments[3:, 2:]).all()) #constant groups have no skew or kurtosis
+        np.testing.assert_array_equal(moments[3:, 1], 0)
+
+    def test_data_to_long(self):
+        data = {('a', '1'):[0.5, 0.25], ('b', '1'):[1.0], ('c', '1'):[0.0, 0.5, 0.75]}
+        keys, group_ids, values = analysis.data_to_long(data)
+        self.assertEqual(keys, list(data))
+        np.testing.assert_array_equal(group_ids, [0, 0, 1, 2, 2, 2])
+        np.testing.assert_array_equal(values, [0.5, 0.25, 1.0, 0.0, 0.5, 0.75])
+
+    def test_bootstrap_mean_ci(self):
+        rng = np.random.default_rng(1)
+        n_groups = 5
+        group_ids = rng.integers(0, n_groups, 2000)
+        values = rng.integers(0, 11, 2000) / 10
+        one = analysis.bootstrap_mean_ci(group_ids, values, n_groups, n_boot=500, seed=3, n_procs=1)
+        two = analysis.bootstrap_mean_ci(group_ids, values, n_groups, n_boot=500, seed=3, n_procs=2)
+        np.testing.assert_array_equal(one, two) #each group has its own random stream
+        means = np.bincount(group_ids, weights=values) / np.bincount(group_ids)
+        self.assertTrue(np.all((one[:, 0] < means) & (means < one[:, 1])))
+        se = np.sqrt(np.bincount(group_ids, weights=(values - means[group_ids])**2) / np.bincount(group_ids)**2)
+        np.testing.assert_allclose(one[:, 1] - one[:, 0], 2*1.96*se, rtol=0.2) #close to the normal interval
+        self.assertFalse(np.array_equal(one, analysis.bootstrap_mean_ci(group_ids, values, n_groups, n_boot=500, seed=4)))
+
+    def test_moments_from_data(self):
+        data = {('a',):[0.5, 0.25, 0.75], ('b',):[1.0, 1.0]}
+        df = analysis.moments_from_data(data, ['param'], n_boot=200)
+        self.assertEqual(list(df.columns), ['param'] + analysis.STAT_COLS)
+        self.assertEqual(list(df.loc[1, ['mean', 'mean_ci_low', 'mean_ci_high']]), [1.0, 1.0, 1.0])
+        self.assertEqual(list(analysis.moments_from_data(data, ['param'], n_boot=None).columns), ['param'] + analysis.STAT_COLS[:4])
+
+if __name__ == '__main__':
+    unittest.main()
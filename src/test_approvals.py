@@ -0,0 +1,79 @@
+import unittest
+from fractions import Fraction
+import numpy as np
+
+import frd.profiles as profiles
+import frd.delegative_voting as d_voting
+
+def brute_force_weights(profile:profiles.Profile, rep_ids, delegator_ids)->dict:
+    '''
+    Total weight of each rep as an exact fraction of a vote: every voter gives 1/n_reps to each rep, except delegators who approve
+    at least one rep, who give 1/m to each of the m reps they approve
+    '''
+    approvals = profile.get_approvals()
+    delegators = set(int(v) for v in delegator_ids)
+    weights = {int(r):Fraction(0) for r in rep_ids}
+    for v in range(profile.get_n_voters()):
+        approved_reps = [int(c) for c in approvals[v] if int(c) in weights]
+        if v in delegators and approved_reps:
+            for r in approved_reps:
+                weights[r] += Fraction(1, len(approved_reps))
+        else:
+            for r in weights:
+                weights[r] += Fraction(1, len(rep_ids))
+    return weights
+
+def approval_frd(n_voters, n_cands, n_issues, app_k, n_reps, n_delegators, seed):
+    np.random.seed(seed)
+    profile = profiles.Profile(n_voters, n_cands, n_issues, 0.5, 0.5, app_k, 0.5)
+    profile.new_instance()
+    frd = d_voting.FRD(profile, 'random_winners', n_reps, 'approval', None, n_delegators)
+    frd.set_rep_ids(np.random.choice(n_cands, n_reps, replace=False))
+    frd.weight_reps()
+    return profile, frd
+
+class Test_approvals(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        for n_reps, app_k, seed in [(3, 2, 0), (7, 4, 1), (21, 10, 2), (60, 30, 3)]:
+            profile, frd = approval_frd(100, 60, 5, app_k, n_reps, 40, seed)
+            expected = brute_force_weights(profile, frd.rep_ids, frd.delegator_ids)
+            fast = frd.rep_weights / frd.weight_scale()
+            for r, w in expected.items():
+                np.testing.assert_allclose(fast[:, r], float(w), rtol=1e-12, err_msg=f'n_reps {n_reps}, rep {r}')
+            self.assertTrue(np.all(np.delete(fast, frd.rep_ids, axis=1) == 0))
+            np.testing.assert_allclose(fast.sum(axis=1), profile.get_n_voters(), rtol=1e-12)
+
+    def test_many_reps(self):
+        #shares 1/m for every m up to n_reps have no practical common integer unit
+        for n_reps in [21, 37, 50, 60]:
+            profile, frd = approval_frd(100, 60, 9, 100, n_reps, 50, n_reps)
+            self.assertTrue(0 <= frd.outcome_agreement() <= 1)
+            expected = brute_force_weights(profile, frd.rep_ids, frd.delegator_ids)
+            np.testing.assert_allclose(frd.rep_weights[:, list(expected)] / frd.weight_scale(), np.tile([float(w) for w in expected.values()], (9, 1)), rtol=1e-12)
+
+    def test_exact_ties(self):
+        #two reps whose float weights differ only by rounding tie on the issues where they disagree
+        c_prefs = np.array([[1, 0, 1], [0, 1, 1], [1, 1, 1]])
+        rep_weights = np.tile(np.array([0.1+0.2, 0.3, 0.0]), (3, 1))
+        np.random.seed(0)
+        outcomes = d_voting.stacked_weighted_majority(c_prefs, rep_weights, rtol=d_voting.TIE_RTOL)
+        self.assertEqual(outcomes[2], 1)
+        n_ones = sum(d_voting.stacked_weighted_majority(c_prefs, rep_weights, rtol=d_voting.TIE_RTOL)[0] for _ in range(200))
+        self.assertTrue(40 < n_ones < 160) #coin flips, not a strict majority by rounding
+
+    def test_approval_sets_round_trip(self):
+        rankings = np.array([[2, 0, 1, 3], [3, 1, 0, 2], [0, 1, 2, 3]])
+        n_approved = np.array([2, 0, 3])
+        approvals = profiles.ApprovalSets.from_rankings(rankings, n_approved)
+        self.assertEqual(len(approvals), 3)
+        self.assertEqual([list(a) for _, a in approvals.items()], [[2, 0], [], [0, 1, 2]])
+        round_trip = profiles.ApprovalSets.from_dict(dict(approvals.items()), approvals.n_cands)
+        np.testing.assert_array_equal(round_trip.cand_ids, approvals.cand_ids)
+        np.testing.assert_array_equal(round_trip.offsets, approvals.offsets)
+        np.testing.assert_array_equal(round_trip.to_indicators(), [[1, 0, 1, 0], [0, 0, 0, 0], [1, 1, 1, 0]])
+        np.testing.assert_array_equal(approvals.counts(), [2, 1, 2, 0])
+        np.testing.assert_array_equal(approvals.rows([2, 0]).to_indicators(), [[1, 1, 1, 0], [1, 0, 1, 0]])
+
+if __name__ == '__main__':
+    unittest.main()
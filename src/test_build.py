@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import frd.simulate as simulate
+import frd.build as build
+import frd.analysis as analysis
+
+PROFILE_PARAMS = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda'], n_winners=[4])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive'], best_k=[None], n_delegators=[4, 8], mask=[None])
+
+class Test_build(unittest.TestCase):
+
+    def run_pipeline(self, data_dir:str, plot_dir:str)->tuple:
+        with simulate.WorkerPool(n_workers=1) as pool, build.Pipeline(pool, data_dir=data_dir, plot_dir=plot_dir) as pipeline:
+            run = simulate.ExperimentRun(pool, 12, PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, experiment_name='pipe', data_dir=data_dir,
+                                         seed=1, progress_interval=None)
+            data, param_names, _, _, filename = run.finish(pipeline=pipeline)
+            built = pipeline.collect()
+        return data, param_names, filename, built
+
+    def test_pipeline(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            plot_dir = os.path.join(data_dir, 'plots')
+            data, param_names, filename, built = self.run_pipeline(data_dir, plot_dir)
+            self.assertEqual(filename, 'pipe_data')
+            self.assertEqual(built['moments'], ['pipe_moments.csv'])
+            self.assertEqual(len(built['plots']), 1)
+            self.assertTrue(os.path.exists(built['plots'][0]))
+
+            #moments built in the background from the data in memory match those computed from the saved file
+            expected = analysis.get_moments(filename, param_names, save=False, data_dir=data_dir)[0]
+            saved = pd.read_csv(os.path.join(data_dir, 'pipe_moments.csv'), index_col=0)
+            np.testing.assert_allclose(saved[analysis.STAT_COLS].to_numpy(), expected[analysis.STAT_COLS].to_numpy(), rtol=1e-12)
+            self.assertEqual(set(build.load_manifest(data_dir)), {os.path.join(data_dir, 'pipe_moments.csv'), built['plots'][0]})
+
+            #the same data again leaves the moments and plots up to date
+            self.assertEqual(self.run_pipeline(data_dir, plot_dir)[3], {'moments':[], 'plots':[]})
+
+if __name__ == '__main__':
+    unittest.main()
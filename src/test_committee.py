@@ -0,0 +1,165 @@
+import itertools
+import unittest
+from fractions import Fraction
+import numpy as np
+
+import frd.profiles as profiles
+import frd.committee as committee
+import frd.election_rules as rules
+
+def random_approvals(n_ballots, n_cands, p, seed)->profiles.ApprovalSets:
+    rng = np.random.default_rng(seed)
+    return profiles.ApprovalSets.from_dict({b:np.flatnonzero(rng.random(n_cands) < p) for b in range(n_ballots)}, n_cands)
+
+def thiele_score(approvals, weights, winners, marginal)->Fraction:
+    '''
+    Exact Thiele score of a committee, marginal(k) is the value of a ballot's (k+1)th approved winner
+    '''
+    winners = set(winners)
+    score = Fraction(0)
+    for b, approved in approvals.items():
+        k = len(winners.intersection(int(c) for c in approved))
+        score += int(weights[b]) * sum((marginal(j) for j in range(k)), Fraction(0))
+    return score
+
+def pav_marginal(k): return Fraction(1, k+1)
+def cc_marginal(k): return Fraction(int(k == 0))
+
+def greedy(approvals, weights, n_winners, marginal)->list:
+    '''
+    Sequential Thiele rule with exact gains, ties to the lowest id
+    '''
+    winners = []
+    for _ in range(min(n_winners, approvals.n_cands)):
+        base = thiele_score(approvals, weights, winners, marginal)
+        gains = {c:thiele_score(approvals, weights, winners+[c], marginal) - base for c in range(approvals.n_cands) if c not in winners}
+        best = max(gains.values())
+        winners.append(min(c for c, g in gains.items() if g == best))
+    return winners
+
+def seq_phragmen(approvals, weights)->list:
+    '''
+    Sequential Phragmén with exact loads, ties to the lowest id, then the cands nobody approves
+    '''
+    loads = [Fraction(0)]*len(approvals)
+    approvers = {c:[b for b, approved in approvals.items() if c in approved] for c in range(approvals.n_cands)}
+    order = []
+    while True:
+        new_loads = {c:(1 + sum(int(weights[b])*loads[b] for b in bs)) / sum(int(weights[b]) for b in bs)
+                     for c, bs in approvers.items() if bs and c not in order}
+        if not new_loads: break
+        best = min(new_loads.values())
+        c = min(c for c, load in new_loads.items() if load == best)
+        for b in approvers[c]:
+            loads[b] = best
+        order.append(c)
+    return order + [c for c in range(approvals.n_cands) if c not in order]
+
+def mes(approvals, weights, n_winners)->list:
+    '''
+    Method of Equal Shares with exact budgets, ties to the lowest id, completed by approval count
+    '''
+    budgets = [Fraction(n_winners)]*len(approvals)
+    cost = int(sum(weights))
+    approvers = {c:[b for b, approved in approvals.items() if c in approved] for c in range(approvals.n_cands)}
+    order = []
+    while True:
+        rhos = {}
+        for c, bs in approvers.items():
+            if c in order or sum(int(weights[b])*budgets[b] for b in bs) < cost: continue
+            bs = sorted(bs, key=lambda b: budgets[b])
+            paid = 0
+            for i, b in enumerate(bs):
+                rho = (cost - paid) / sum(int(weights[x]) for x in bs[i:])
+                if rho <= budgets[b]:
+                    rhos[c] = rho
+                    break
+                paid += int(weights[b])*budgets[b]
+        if not rhos: break
+        best = min(rhos.values())
+        c = min(c for c, rho in rhos.items() if rho == best)
+        for b in approvers[c]:
+            budgets[b] = max(budgets[b] - best, 0)
+        order.append(c)
+    support = {c:sum(int(weights[b]) for b in bs) for c, bs in approvers.items()}
+    return order + sorted((c for c in range(approvals.n_cands) if c not in order), key=lambda c: -support[c])
+
+class Test_committee(unittest.TestCase):
+
+    def test_pav_marginals(self):
+        self.assertEqual(committee.pav_marginals(3, 100).dtype, float)
+        marginals = committee.pav_marginals(45, 100)
+        self.assertEqual(marginals.dtype, object) #lcm(1..46) > 2**53
+        unit = marginals[0]
+        self.assertTrue(all(m*(k+1) == unit for k, m in enumerate(marginals)))
+
+    def test_greedy_matches_exact(self):
+        for seed in range(5):
+            approvals = random_approvals(12, 7, 0.4, seed)
+            weights = np.random.default_rng(seed).integers(1, 4, 12).astype(float)
+            for n_winners in [1, 3, 5]:
+                for marginals, marginal in [(committee.pav_marginals(n_winners, weights.sum()), pav_marginal), (committee.cc_marginals(n_winners), cc_marginal)]:
+                    self.assertEqual(committee.thiele_greedy(approvals, weights, n_winners, marginals), greedy(approvals, weights, n_winners, marginal))
+
+    def test_many_winners_exact(self):
+        #beyond 40 winners the PAV unit does not fit in a float, and ties must still go to the lowest id
+        approvals = random_approvals(30, 50, 0.3, 7)
+        weights = np.ones(30)
+        marginals = committee.pav_marginals(45, weights.sum())
+        self.assertEqual(committee.thiele_greedy(approvals, weights, 45, marginals), greedy(approvals, weights, 45, pav_marginal))
+        winners = committee.thiele_local_search(approvals, weights, committee.thiele_greedy(approvals, weights, 45, marginals), marginals)
+        self.assertEqual(len(set(winners)), 45)
+
+    def test_many_winners_tie(self):
+        #44 fillers (cands 2..45) are picked first thanks to heavy ballots, leaving ballots 0..3 with 3, 5, 2 and 11 winners.
+        #Cand 0 (ballots 0, 1) and cand 1 (ballots 2, 3) then gain exactly 1/4 + 1/6 = 1/3 + 1/12, which float units round apart
+        fillers = list(range(2, 46))
+        approvals = {0:[0] + fillers[:3], 1:[0] + fillers[:5], 2:[1] + fillers[:2], 3:[1] + fillers[:11]}
+        approvals.update({4+j:[c] for j, c in enumerate(fillers)})
+        approvals = profiles.ApprovalSets.from_dict(approvals, 46)
+        weights = np.array([1.0]*4 + [1000.0]*44)
+        winners = committee.thiele_greedy(approvals, weights, 45, committee.pav_marginals(45, weights.sum()))
+        self.assertEqual(sorted(winners[:44]), fillers)
+        self.assertEqual(winners[44], 0)
+
+    def test_local_search_exhaustive(self):
+        for seed in range(5):
+            approvals = random_approvals(10, 7, 0.4, seed)
+            weights = np.ones(10)
+            n_winners = 3
+            for marginals, marginal in [(committee.pav_marginals(n_winners, weights.sum()), pav_marginal), (committee.cc_marginals(n_winners), cc_marginal)]:
+                start = committee.thiele_greedy(approvals, weights, n_winners, marginals)
+                winners = committee.thiele_local_search(approvals, weights, start, marginals)
+                score = thiele_score(approvals, weights, winners, marginal)
+                best = max(thiele_score(approvals, weights, c, marginal) for c in itertools.combinations(range(7), n_winners))
+                self.assertTrue(thiele_score(approvals, weights, start, marginal) <= score <= best)
+                self.assertGreaterEqual(float(thiele_score(approvals, weights, start, marginal)), (1-1/np.e)*float(best)) #greedy guarantee
+                for w, c in itertools.product(winners, set(range(7)) - set(winners)): #no single swap improves
+                    swapped = [c if x == w else x for x in winners]
+                    self.assertLessEqual(thiele_score(approvals, weights, swapped, marginal), score)
+
+    def test_pav_rule_compressed(self):
+        #ballots of voter types count once per voter
+        np.random.seed(3)
+        compressed = profiles.Profile(200, 8, 4, 0.5, 0.5, 3, 0.5, compress=True)
+        compressed.new_instance()
+        approvals = compressed.get_approvals()
+        weights = rules.ballot_weights_of(compressed, len(approvals))
+        winners = rules.pav(compressed, 4, local_search=False)[0]
+        self.assertEqual(list(winners), greedy(approvals, weights, 4, pav_marginal))
+
+    def test_seq_phragmen_exact(self):
+        for seed in range(10):
+            approvals = random_approvals(15, 8, 0.3, seed)
+            weights = np.random.default_rng(seed).integers(1, 4, 15).astype(float)
+            self.assertEqual(committee.seq_phragmen_order(approvals, weights), seq_phragmen(approvals, weights))
+
+    def test_mes_exact(self):
+        for seed in range(10):
+            approvals = random_approvals(15, 8, 0.3, seed)
+            weights = np.random.default_rng(seed).integers(1, 4, 15).astype(float)
+            for n_winners in [2, 3, 5]:
+                self.assertEqual(committee.mes_order(approvals, weights, n_winners), mes(approvals, weights, n_winners))
+
+if __name__ == '__main__':
+    unittest.main()
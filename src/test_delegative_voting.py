@@ -0,0 +1,143 @@
+import unittest
+import numpy as np
+
+import frd.profiles as profiles
+import frd.reference as reference
+import frd.delegative_voting as d_voting
+
+def fast_and_reference(n_voters, n_cands, n_issues, n_reps, del_style, best_k, n_delegators, seed)->tuple:
+    '''
+    Rep weights (in votes, n_issues x n_cands) and agreement of FRD and of reference.ReferenceFRD, from the same profile, reps, and random state
+    '''
+    np.random.seed(seed)
+    profile = profiles.Profile(n_voters, n_cands, n_issues, 0.5, 0.5, n_cands, 0.5)
+    profile.new_instance()
+    rep_ids = np.random.choice(n_cands, n_reps, replace=False)
+    state = np.random.get_state()
+    frd = d_voting.FRD(profile, 'random_winners', n_reps, del_style, best_k, n_delegators)
+    frd.set_rep_ids(rep_ids)
+    frd.weight_reps()
+    fast = (frd.rep_weights / frd.weight_scale(), frd.outcome_agreement())
+    np.random.set_state(state)
+    ref = reference.ReferenceFRD(profile, rep_ids, n_reps, del_style, best_k, n_delegators)
+    agreement = ref.run()
+    return fast, (np.array([ref.rep_weights[i] for i in range(n_issues)]), agreement), frd
+
+def n_ties(frd:d_voting.FRD)->int:
+    c_prefs = frd.profile.get_issue_prefs()[1]
+    return int(np.count_nonzero(2*np.sum(c_prefs.T * frd.rep_weights, axis=-1) == np.sum(frd.rep_weights, axis=-1)))
+
+class Test_delegative_voting(unittest.TestCase):
+
+    def test_incisive_matches_reference(self):
+        #few cands and issues, so reps are often unanimous (delegators stick with default) and even numbers of reps often tie
+        ties = 0
+        for seed in range(30):
+            for n_delegators in [0, 5, 12]: #delegation rates 0, 5/12, and 1
+                fast, ref, frd = fast_and_reference(12, 4, 3, 2 + seed % 3, 'incisive', None, n_delegators, seed)
+                np.testing.assert_allclose(fast[0], ref[0], rtol=0, atol=1e-12, err_msg=f'seed {seed}, {n_delegators} delegators')
+                self.assertEqual(fast[1], ref[1], f'seed {seed}, {n_delegators} delegators')
+                np.testing.assert_allclose(fast[0].sum(axis=1), 12)
+                ties += n_ties(frd)
+        self.assertGreater(ties, 0)
+
+    def test_incisive_edge_rates(self):
+        fast, _, frd = fast_and_reference(10, 5, 6, 3, 'incisive', None, 0, 1)
+        np.testing.assert_allclose(fast[0][:, frd.rep_ids], 10/3) #no delegators: default weights only
+        fast, _, frd = fast_and_reference(10, 5, 6, 3, 'incisive', None, 10, 1)
+        v_prefs, c_prefs = frd.profile.get_issue_prefs()
+        for i in range(6): #every voter delegates to the first cand with their pref, if any
+            expected = np.zeros(5)
+            for v in range(10):
+                with_pref = np.nonzero(c_prefs[:, i] == v_prefs[v, i])[0]
+                if len(with_pref): expected[with_pref[0]] += 1
+                else: expected[frd.rep_ids] += 1/3
+            np.testing.assert_allclose(fast[0][i], expected, err_msg=f'issue {i}')
+
+    def test_best_k_matches_reference(self):
+        #two issues give few distinct distances, so voters often rank reps equally; best_k at and above n_reps gives every rep 1/n_reps.
+        #Shares are powers of 1/2, so the float weights of the reference are exact and its ties match
+        ties = 0
+        for seed in range(20):
+            for n_reps, best_k in [(4, 1), (4, 2), (4, 4), (4, 6), (2, 1), (2, 2), (2, 3)]:
+                fast, ref, frd = fast_and_reference(12, 6, 2, n_reps, 'best_k', best_k, 6, seed)
+                params = f'seed {seed}, n_reps {n_reps}, best_k {best_k}'
+                np.testing.assert_allclose(fast[0], ref[0], rtol=0, atol=1e-12, err_msg=params)
+                self.assertEqual(fast[1], ref[1], params)
+                ties += n_ties(frd)
+        self.assertGreater(ties, 0)
+
+    def test_find_best_k_ties(self):
+        np.random.seed(2)
+        profile = profiles.Profile(12, 6, 2, 0.5, 0.5, 6, 0.5)
+        profile.new_instance()
+        distances = profile.get_distances()
+        for best_k in [2, 4, 7]:
+            frd = d_voting.FRD(profile, 'random_winners', 4, 'best_k', best_k, 6)
+            frd.set_rep_ids(np.array([0, 2, 3, 5]))
+            best_ks, n_delegators = frd.find_best_k()
+            self.assertEqual(best_ks.shape, (6, min(best_k, 4)))
+            np.testing.assert_array_equal(n_delegators, 1)
+            for v, best in zip(np.sort(frd.delegator_ids), best_ks): #one row per ballot, in voter id order
+                self.assertEqual(len(set(best)), len(best))
+                self.assertTrue(set(best) <= {0, 2, 3, 5})
+                worst_kept = distances[v, best].max() #reps tied with the kth best may be kept or not, closer ones always are
+                self.assertTrue(all(distances[v, r] >= worst_kept for r in {0, 2, 3, 5} - set(best)), f'voter {v}, best_k {best_k}')
+
+    def test_stacked_majority_matches_baseline(self):
+        #small integer weights tie exactly on many issues; the baseline draws one coin flip per tied issue, in order
+        rng = np.random.RandomState(3)
+        c_prefs = rng.randint(0, 2, (5, 40))
+        weights = rng.randint(0, 3, (3, 40, 5))
+        np.random.seed(4)
+        outcomes = d_voting.stacked_weighted_majority(c_prefs, weights)
+        np.random.seed(4)
+        expected = [[d_voting.weighted_majority(c_prefs[:, [i]], weights[w, i])[0] for i in range(40)] for w in range(3)]
+        np.testing.assert_array_equal(outcomes, expected)
+        self.assertGreater(np.count_nonzero(2*np.sum(c_prefs.T * weights, axis=-1) == weights.sum(axis=-1)), 10)
+        np.random.seed(4)
+        np.testing.assert_array_equal(d_voting.stacked_weighted_majority(c_prefs, weights[0]), expected[0]) #a single weighting
+        uniform = np.ones((40, 5), dtype=int)
+        np.random.seed(5)
+        outcomes = d_voting.stacked_weighted_majority(c_prefs[:4], uniform[:, :4]) #unweighted, as majority
+        np.random.seed(5)
+        np.testing.assert_array_equal(outcomes, d_voting.majority(c_prefs[:4]))
+
+    def test_stacked_majority_rtol(self):
+        #on issue 0, 0.1+0.2 against 0.3 ties only within the tolerance; on issue 1 the float sums tie exactly. Each tie takes one coin flip
+        c_prefs = np.array([[0, 1, 1, 0], [0, 1, 1, 1], [1, 0, 1, 1]])
+        float_weights = np.tile([0.1, 0.2, 0.3], (4, 1))
+        weights = np.stack([float_weights, np.tile([1, 2, 3], (4, 1)), float_weights])
+        for rtols, tied in [(np.zeros((3, 1)), [(0, 1), (1, 0), (1, 1), (2, 1)]),
+                            (np.array([[d_voting.TIE_RTOL], [0.0], [d_voting.TIE_RTOL]]), [(w, i) for w in range(3) for i in range(2)])]:
+            np.random.seed(6)
+            outcomes = d_voting.stacked_weighted_majority(c_prefs, weights, rtol=rtols)
+            after = np.random.random_sample()
+            np.random.seed(6)
+            flips = np.random.binomial(1, 0.5, size=len(tied))
+            self.assertEqual(after, np.random.random_sample(), f'{len(tied)} ties') #no other draws
+            expected = np.array([[0, 0, 1, 1]]*3) #a strict majority of 0 on issue 0 when the rounding error is not tolerated
+            expected[tuple(zip(*tied))] = flips
+            np.testing.assert_array_equal(outcomes, expected)
+
+    def test_weight_scale(self):
+        #one vote is weight_scale units, so that the default and delegated shares are exact integers
+        np.random.seed(7)
+        profile = profiles.Profile(20, 8, 5, 0.5, 0.5, 8, 0.5)
+        profile.new_instance()
+        for del_style, n_reps, best_k, scale in [('best_k', 4, 6, 12), ('best_k', 6, 4, 12), ('best_k', 5, 5, 5), ('best_k', 3, 7, 21), ('incisive', 4, None, 4), ('approval', 6, None, 6)]:
+            frd = d_voting.FRD(profile, 'random_winners', n_reps, del_style, best_k, 10)
+            frd.set_rep_ids(np.arange(n_reps))
+            self.assertEqual(frd.weight_scale(), scale)
+            weights = frd.weight_reps()
+            #every voter gives one vote on every issue, except that best_k delegators keep their default on the reps outside their best k
+            extra = 10*(n_reps - min(best_k, n_reps))*(scale//n_reps) if del_style == 'best_k' else 0
+            np.testing.assert_allclose(weights.sum(axis=1), 20*scale + extra)
+            if del_style == 'approval':
+                self.assertEqual(frd.tie_rtol(), d_voting.TIE_RTOL)
+            else:
+                self.assertEqual(weights.dtype, np.int64)
+                self.assertEqual(frd.tie_rtol(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import tempfile
+import unittest
+import numpy as np
+
+import frd.exact as exact
+import frd.simulate as simulate
+
+PROFILE_PARAMS = dict(n_voters=[10, 11], n_cands=[6], n_issues=[20], voters_p=[0.6], cands_p=[0.4], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['random_winners'], n_reps=[3, 4])
+DEL_VOTING_PARAMS = dict(default_style=['uniform'], delegation_style=[None], best_k=[None], n_delegators=[None], intensities=[None])
+
+class Test_exact(unittest.TestCase):
+
+    def test_closed_form_matches_enumeration(self):
+        #voters and reps both odd and even, so majority ties are covered
+        for n_voters, n_cands, n_issues, voters_p, cands_p, n_reps in [(2, 3, 2, 0.6, 0.3, 2), (3, 2, 2, 0.5, 0.8, 1), (1, 4, 3, 0.7, 0.4, 3), (2, 3, 3, 0.3, 0.5, 3)]:
+            params = dict(n_voters=n_voters, n_cands=n_cands, n_issues=n_issues, voters_p=voters_p, cands_p=cands_p, n_reps=n_reps,
+                          election_rules='random_winners', default_style='uniform', delegation_style=None)
+            moments, pmf = exact.enumerate_exact(n_voters, n_cands, n_issues, voters_p, cands_p, 'random_winners', n_reps)
+            self.assertAlmostEqual(pmf.sum(), 1.0)
+            np.testing.assert_allclose(moments, exact.exact_moments(params), rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=str(params))
+
+    def test_not_tractable(self):
+        params = dict(n_voters=5, n_cands=4, n_issues=3, voters_p=0.5, cands_p=0.5, n_reps=2, election_rules='borda', default_style='uniform', delegation_style=None)
+        self.assertFalse(exact.is_tractable(params))
+        with self.assertRaises(ValueError):
+            exact.exact_moments(params)
+        with self.assertRaises(ValueError):
+            exact.enumerate_exact(5, 4, 3, 0.5, 0.5, 'borda', 2)
+
+    def test_simulation_matches_exact(self):
+        #seeded iterations are independent, so the simulated means are within a few standard errors of the exact ones
+        with tempfile.TemporaryDirectory() as data_dir, simulate.WorkerPool(n_workers=1) as pool:
+            _, param_names, _, _, filename = simulate.sim_parallel(400, PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, experiment_name='exact',
+                                                                   data_dir=data_dir, seed=7, pool=pool, progress_interval=None)
+            df = exact.validate_against_data(filename, param_names, data_dir=data_dir)
+        self.assertEqual(len(df), 4)
+        self.assertTrue((df['n_iter'] == 400).all())
+        self.assertTrue((df['z'].abs() < 4).all(), df)
+        self.assertTrue((df['lag1_autocorr'].abs() < 0.2).all(), df)
+        np.testing.assert_allclose(df['mc_variance'], df['exact_variance'], rtol=0.3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+
+import frd.intensities as intensities
+import frd.profiles as profiles
+import frd.reference as reference
+import frd.delegative_voting as d_voting
+
+class Test_intensities(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(intensities.parse_intensity_dist('uniform'), [(1.0, 'uniform', [])])
+        self.assertEqual(intensities.parse_intensity_dist(' truncnorm( 0.75, 0.1 ) '), [(1.0, 'truncnorm', [0.75, 0.1])])
+        self.assertEqual(intensities.parse_intensity_dist('0.5*beta(8,2)+0.5*beta(2,8)'), [(0.5, 'beta', [8.0, 2.0]), (0.5, 'beta', [2.0, 8.0])])
+        self.assertEqual(intensities.parse_intensity_dist('1*uniform(0,1) + 3*beta(2,2)'), [(0.25, 'uniform', [0.0, 1.0]), (0.75, 'beta', [2.0, 2.0])])
+        self.assertEqual(intensities.parse_intensity_dist('0*uniform+2*beta(1,1)'), [(0.0, 'uniform', []), (1.0, 'beta', [1.0, 1.0])])
+
+    def test_bad_specs(self):
+        for spec in ['gamma(2)', 'beta(2', 'uniform()x', '', '0.5*', 'uniform++beta(1,1)', '-1*uniform', '0*uniform', '0*uniform+0.0*beta(1,1)']:
+            with self.assertRaises(ValueError, msg=spec):
+                intensities.parse_intensity_dist(spec)
+        with self.assertRaises(ValueError):
+            intensities.register_intensity_dist('my dist', intensities.uniform_intensities)
+
+    def test_register(self):
+        intensities.register_intensity_dist('constant', lambda n_voters, p: np.full(n_voters, p))
+        try:
+            np.testing.assert_array_equal(intensities.draw_intensities('constant(0.9)', 4), 0.9)
+            values = intensities.draw_intensities('0.5*constant(0.9)+0.5*constant(0.1)', 1000)
+            self.assertTrue(set(values) == {0.1, 0.9} and 400 < np.count_nonzero(values == 0.9) < 600)
+        finally:
+            del intensities.INTENSITY_DISTS['constant']
+
+    def test_draw(self):
+        #one component draws all voters at once; a mixture draws the component of each voter, then each component in order
+        np.random.seed(0)
+        values = intensities.draw_intensities('beta(2,5)', 50)
+        np.random.seed(0)
+        np.testing.assert_array_equal(values, np.random.beta(2, 5, size=50))
+        np.random.seed(1)
+        values = intensities.draw_intensities('0.3*uniform+0.7*beta(8,2)', 50)
+        np.random.seed(1)
+        labels = np.random.choice(2, size=50, p=[0.3, 0.7])
+        expected = np.empty(50)
+        expected[labels == 0] = np.random.uniform(0.5, 1.0, size=np.count_nonzero(labels == 0))
+        expected[labels == 1] = np.random.beta(8, 2, size=np.count_nonzero(labels == 1))
+        np.testing.assert_array_equal(values, expected)
+        np.random.seed(2)
+        for spec, mean in [('uniform', 0.75), ('truncnorm(0.75,0.1)', 0.75), ('0.5*beta(8,2)+0.5*beta(2,8)', 0.5), ('0.25*uniform(0,1)+0.75*uniform(0.5,1)', 0.6875)]:
+            values = intensities.draw_intensities(spec, 20000)
+            self.assertTrue(np.all((0 <= values) & (values <= 1)), spec)
+            self.assertAlmostEqual(values.mean(), mean, delta=0.01, msg=spec)
+
+    def test_intensity_delegators(self):
+        #one binomial draw for all voters, the same draws as the per-voter loop of the reference
+        for seed in range(5):
+            np.random.seed(seed)
+            profile = profiles.Profile(200, 6, 5, None, 0.5, 3, 0.5)
+            profile.new_instance('0.5*beta(8,2)+0.5*uniform(0.4,0.6)')
+            rep_ids = np.random.choice(6, 3, replace=False)
+            state = np.random.get_state()
+            frd = d_voting.FRD(profile, 'random_winners', 3, 'incisive', None, None)
+            frd.set_rep_ids(rep_ids)
+            delegators = frd.intensity_delegators()
+            np.random.set_state(state)
+            ref = reference.ReferenceFRD(profile, rep_ids, 3, 'incisive', None, None)
+            np.testing.assert_array_equal(delegators, ref.intensity_delegators())
+        np.random.seed(5)
+        profile = profiles.Profile(20000, 2, 1, None, 0.5, 1, 0.5)
+        profile.new_instance('uniform(0,1)')
+        frd = d_voting.FRD(profile, 'random_winners', 1, 'incisive', None, None)
+        self.assertAlmostEqual(len(frd.intensity_delegators()) / 20000, 0.5, delta=0.02) #E[2|p-0.5|] = 1/2 for p uniform on [0,1]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import logging
+import logging.handlers
+import multiprocessing as mp
+import unittest
+
+import frd.log_queue as log_queue
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def worker_log(msg:str)->str:
+    logging.info(msg)
+    logging.debug('not at the level of the parent')
+    return mp.current_process().name
+
+class Test_log_queue(unittest.TestCase):
+
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.saved = (list(self.root.handlers), self.root.level)
+        self.handler = ListHandler()
+        self.root.handlers = [self.handler]
+        self.root.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.root.handlers, level = self.saved
+        self.root.setLevel(level)
+
+    def test_log_event(self):
+        counts = {}
+        log_queue.log_event(counts, True, 'profiles', 'profile %s', 1)
+        log_queue.log_event(counts, False, 'profiles', 'profile %s', 2)
+        log_queue.log_event(counts, False, 'elections', 'election')
+        self.assertEqual(counts, {'profiles':2, 'elections':1})
+        self.assertEqual([r.getMessage() for r in self.handler.records], ['profile 1']) #only the detailed iteration is logged
+        self.assertEqual(self.handler.records[0].funcName, 'test_log_event') #attributed to the caller
+        log_queue.log_event(None, False, 'profiles', 'profile') #no counts
+        self.assertEqual(log_queue.merge_counts(counts, {'profiles':3, 'voting_runs':4}), {'profiles':5, 'elections':1, 'voting_runs':4})
+
+    def test_no_handlers(self):
+        self.root.handlers = []
+        with log_queue.queue_logging(mp.get_context()) as queue:
+            self.assertIsNone(queue)
+        self.assertEqual(self.root.handlers, [])
+
+    def test_workers_log_through_queue(self):
+        ctx = mp.get_context()
+        with log_queue.queue_logging(ctx) as queue:
+            self.assertIsInstance(self.root.handlers[0], logging.handlers.QueueHandler)
+            with ctx.Pool(2, initializer=log_queue.init_worker, initargs=(queue, logging.INFO)) as pool:
+                workers = pool.map(worker_log, ['a', 'b', 'c'], chunksize=1)
+            logging.info('parent')
+        self.assertEqual(self.root.handlers, [self.handler]) #restored
+        messages = {(r.getMessage(), r.processName) for r in self.handler.records}
+        self.assertEqual(messages, {('a', workers[0]), ('b', workers[1]), ('c', workers[2]), ('parent', 'MainProcess')})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import frd.memory as memory
+import frd.simulate as simulate
+
+PROFILE_PARAMS = dict(n_voters=[31, 61], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda'], n_winners=[3, 4])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive', None], best_k=[None], n_delegators=[8], mask=[None])
+
+class Test_memory(unittest.TestCase):
+
+    def test_stage_tracker(self):
+        tracker = memory.StageTracker()
+        tracker.start()
+        try:
+            for n in [10**6, 10**5]:
+                with memory.stage(tracker, 'profile', ('a',)):
+                    x = np.ones(n)
+                    del x
+            with memory.stage(tracker, 'election', ('a', 'b')):
+                pass
+        finally:
+            tracker.stop()
+        peaks = tracker.get_peaks()
+        self.assertGreaterEqual(peaks[('profile', ('a',))], 8*10**6) #max over the runs of a stage, freed memory included
+        self.assertLess(peaks[('election', ('a', 'b'))], 10**5)
+        with memory.stage(None, 'profile', ('a',)): #untraced
+            pass
+        self.assertEqual(memory.merge_peaks({'x':3, 'y':1}, {'y':2, 'z':5}), {'x':3, 'y':2, 'z':5})
+
+    def test_estimates(self):
+        params = (dict(n_voters=[1000, 100000], n_cands=[50], n_issues=[10], app_k=[5]), dict(election_rules=['borda']), dict(delegation_style=['incisive']))
+        full = memory.estimate_grid_bytes(*params)
+        self.assertEqual(full, memory.estimate_iter_bytes(100000, 50, 10, frd=True, approvals=False, ordinals=True, agreements=False, app_k=5)) #the largest combination
+        self.assertLess(memory.estimate_grid_bytes(*params, compress=True), full) #at most 2**10 voter types
+        self.assertLess(memory.estimate_grid_bytes(*params, stream_chunk_size=1000), full)
+        self.assertEqual(memory.estimate_grid_bytes(*params, coupled=True), full + 8*(100000+50)*10)
+        with self.assertLogs(level='WARNING'):
+            estimate = memory.preflight(*params, 4, memory_budget=10**6, experiment_name='exp')
+        self.assertEqual(estimate, 4*(memory.WORKER_BASELINE_BYTES + full))
+        with self.assertNoLogs(level='WARNING'):
+            memory.preflight(*params, 1, memory_budget=10**12)
+
+    def test_mem_peaks_output(self):
+        #one row per stage and combination of the params the stage depends on, with the params it does not depend on left empty
+        with tempfile.TemporaryDirectory() as data_dir, simulate.WorkerPool(n_workers=1) as pool:
+            data, param_names, _, _, filename = simulate.sim_parallel(3, PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, experiment_name='mem', data_dir=data_dir,
+                                                                      trace_memory=True, seed=1, pool=pool, progress_interval=None)
+            df = pd.read_csv(os.path.join(data_dir, 'mem_memory.csv'), index_col=0)
+        self.assertEqual(list(df.columns), ['stage'] + param_names + ['peak_bytes', 'peak_mib'])
+        counts = df['stage'].value_counts().to_dict()
+        self.assertEqual(counts, {'profile':2, 'election':4, 'voting':4 + 4}) #FRD runs batched per election, RD per del voting combination
+        self.assertTrue(df.loc[df['stage'] == 'profile', 'n_winners'].isna().all())
+        self.assertTrue(df.loc[df['stage'] == 'election', 'n_winners'].notna().all() and df.loc[df['stage'] == 'election', 'delegation_style'].isna().all())
+        self.assertTrue((df['peak_bytes'] > 0).all())
+        profile_peaks = df[df['stage'] == 'profile'].set_index('n_voters')['peak_bytes']
+        self.assertGreater(profile_peaks[61], profile_peaks[31])
+        self.assertEqual(len(data), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+import frd.plot as plot
+
+class Test_plot(unittest.TestCase):
+
+    def tearDown(self):
+        plt.close('all')
+
+    def test_error_bands_match_lines(self):
+        #numeric levels out of order, and a level with no data (no line), so lines and levels are not in the same positions
+        x = [1, 2, 3]
+        df = pd.DataFrame({'n_reps':np.repeat([9, 3, 5, 7], 3), 'n_cands':x*4,
+                           'mean':[0.8, 0.85, 0.9, 0.5, 0.55, 0.6, np.nan, np.nan, np.nan, 0.65, 0.7, 0.75]})
+        df['mean_ci_low'], df['mean_ci_high'] = df['mean'] - 0.02, df['mean'] + 0.02
+        palette = plot.hue_palette(df, 'n_reps')
+        self.assertEqual(list(palette), [3, 5, 7, 9])
+        p = sns.lineplot(data=df, x='n_cands', y='mean', hue='n_reps', hue_order=list(palette), palette=palette)
+        plot.add_error_bands(p, df, 'n_cands', 'mean', l_var='n_reps', colors=palette)
+        line_colors = {round(float(line.get_ydata()[0]), 2):mcolors.to_rgb(line.get_color()) for line in p.get_lines() if len(line.get_xdata())}
+        bands = [c for c in p.collections if len(c.get_paths())]
+        self.assertEqual(len(bands), 3) #the level without data has no band
+        for band in bands:
+            band_low = band.get_paths()[0].vertices[:, 1].min()
+            level_mean = round(band_low + 0.02, 2) #mean of the level at its first x
+            self.assertEqual(mcolors.to_rgb(band.get_facecolor()[0]), line_colors[level_mean])
+        self.assertEqual(set(line_colors), {0.5, 0.65, 0.8})
+        self.assertEqual(line_colors[0.8], mcolors.to_rgb(palette[9]))
+
+    def test_no_bands_without_intervals(self):
+        df = pd.DataFrame({'n_cands':[1, 2], 'mean':[0.5, 0.6]})
+        p = sns.lineplot(data=df, x='n_cands', y='mean')
+        n_collections = len(p.collections)
+        plot.add_error_bands(p, df, 'n_cands', 'mean')
+        plot.add_error_bands(p, df.assign(mean_ci_low=0.4, mean_ci_high=0.7), 'n_cands', 'variance')
+        self.assertEqual(len(p.collections), n_collections)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+
+import frd.profiles as profiles
+import frd.streaming as streaming
+import frd.pref_models as pref_models
+import frd.simulate as simulate
+
+SPECS = ['bernoulli', 'polarized(0.8)', 'spatial(2)', 'spatial(3,0.5)', 'mallows(0.25)', 'mallows(0.25,3)']
+
+class Test_pref_models(unittest.TestCase):
+
+    def test_shapes(self):
+        rng = np.random.RandomState(0)
+        for spec in SPECS:
+            v_pref, c_pref = pref_models.draw_issue_prefs(spec, 30, 7, 5, 0.4, 0.6, rng=rng)
+            self.assertEqual((v_pref.shape, c_pref.shape), ((30, 5), (7, 5)), spec)
+            v_pref, c_pref = pref_models.draw_issue_prefs(spec, 30, 7, 5, 0.4, 0.6, rng=rng, batch=4)
+            self.assertEqual((v_pref.shape, c_pref.shape), ((4, 30, 5), (4, 7, 5)), spec)
+            self.assertTrue(np.isin(v_pref, [0, 1]).all() and np.isin(c_pref, [0, 1]).all(), spec)
+
+    def test_mallows_flip_rate(self):
+        rng = np.random.RandomState(1)
+        for phi in [0.1, 0.5, 1.0]:
+            world = pref_models.draw_world(f'mallows({phi})', 50, rng=rng, batch=20)
+            prefs = pref_models.draw_agents(f'mallows({phi})', world, 500, 50, None, rng=rng, batch=20)
+            flip_rate = np.mean(prefs != world['references']) #one reference, shared by every agent of a batch
+            self.assertAlmostEqual(flip_rate, phi/(1+phi), delta=0.01)
+
+    def test_spatial_p(self):
+        rng = np.random.RandomState(2)
+        for spec in ['spatial(2)', 'spatial(4,1.0)']:
+            for p in [0.2, 0.5, 0.7]:
+                prefs = pref_models.draw_issue_prefs(spec, 2000, 1, 10, p, 0.5, rng=rng, batch=10)[0]
+                self.assertAlmostEqual(prefs.mean(), p, delta=0.02, msg=spec)
+
+    def test_rejects_coupled_and_intensities(self):
+        np.random.seed(3)
+        profile = profiles.Profile(20, 5, 4, 0.5, 0.5, 2, 0.5, pref_model='mallows(0.5)')
+        with self.assertRaises(ValueError):
+            profile.new_instance(coupled=profiles.CoupledPrefs(20, 5, 4))
+        with self.assertRaises(ValueError):
+            profile.new_instance('uniform')
+        with self.assertRaises(ValueError):
+            streaming.StreamingProfile(20, 5, 4, 0.5, 0.5, 2, 0.5, chunk_size=8, pref_model='mallows(0.5)').new_instance('uniform')
+
+    def test_single_iter_by_name(self):
+        #pref_model is read by name, wherever it is among the profile params
+        profile_params = dict(pref_model=['polarized(0.9)'], n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5],
+                              app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+        election_params = dict(election_rules=['borda'], n_winners=[4])
+        del_voting_params = dict(default=['uniform'], delegation_style=['incisive', None], best_k=[None], n_delegators=[8], mask=[None])
+        np.random.seed(4)
+        data = simulate.single_iter(profile_params, election_params, del_voting_params)
+        self.assertEqual(len(data), 2)
+        self.assertTrue(all(key[0] == 'polarized(0.9)' for key in data))
+
+if __name__ == '__main__':
+    unittest.main()
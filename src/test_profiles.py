@@ -0,0 +1,116 @@
+import unittest
+import numpy as np
+
+import frd.profiles as profiles
+import frd.streaming as streaming
+import frd.simulate as simulate
+import frd.election_rules as rules
+import frd.delegative_voting as d_voting
+
+PROFILE_PARAMS = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda', 'max_approval'], n_winners=[4])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive', None], best_k=[None], n_delegators=[8], mask=[None])
+
+def coupled_prefs(crn:profiles.CoupledPrefs, n_voters, n_cands, n_issues, voters_p, cands_p, intensity_dist=None)->tuple:
+    profile = profiles.Profile(n_voters, n_cands, n_issues, voters_p, cands_p, 3, 0.5)
+    profile.new_instance(intensity_dist, coupled=crn)
+    return profile.get_issue_prefs()
+
+class Test_profiles(unittest.TestCase):
+
+    def test_coupled_share_draws(self):
+        #profiles differing only in the swept param threshold the same uniforms
+        np.random.seed(0)
+        crn = profiles.CoupledPrefs(40, 10, 12)
+        v_pref, c_pref = coupled_prefs(crn, 40, 10, 12, 0.5, 0.5)
+        np.testing.assert_array_equal(v_pref, crn.v_uniforms < 0.5)
+        np.testing.assert_array_equal(c_pref, crn.c_uniforms < 0.5)
+        for n_voters, n_cands, n_issues in [(25, 10, 12), (40, 6, 12), (40, 10, 7)]: #a prefix of the voters, cands, or issues
+            swept = coupled_prefs(crn, n_voters, n_cands, n_issues, 0.5, 0.5)
+            np.testing.assert_array_equal(swept[0], v_pref[:n_voters, :n_issues])
+            np.testing.assert_array_equal(swept[1], c_pref[:n_cands, :n_issues])
+        more_ones = coupled_prefs(crn, 40, 10, 12, 0.7, 0.3)
+        self.assertTrue(np.all(more_ones[0] >= v_pref) and np.all(more_ones[1] <= c_pref)) #prefs move monotonically with p
+        np.testing.assert_array_equal(coupled_prefs(crn, 40, 10, 12, 0.5, 0.5)[0], v_pref) #no new draws
+        with_intensities = profiles.Profile(25, 10, 12, None, 0.5, 3, 0.5)
+        with_intensities.new_instance('beta(2,2)', coupled=crn)
+        fewer_voters = profiles.Profile(15, 10, 12, None, 0.5, 3, 0.5)
+        fewer_voters.new_instance('beta(2,2)', coupled=crn)
+        np.testing.assert_array_equal(fewer_voters.get_v_intensities(), with_intensities.get_v_intensities()[:15]) #drawn once at max_voters
+        np.testing.assert_array_equal(with_intensities.get_issue_prefs()[0], crn.v_uniforms[:25] < with_intensities.get_v_intensities()[:, None])
+
+    def test_coupled_iteration(self):
+        #in a coupled iteration the first sweep point draws the same as alone, and the others reuse its prefs
+        np.random.seed(1)
+        alone = simulate.single_iter(PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, coupled=True)
+        np.random.seed(1)
+        swept = simulate.single_iter({**PROFILE_PARAMS, 'voters_p':[0.5, 0.6]}, ELECTION_PARAMS, DEL_VOTING_PARAMS, coupled=True)
+        self.assertEqual(len(swept), 2*len(alone))
+        self.assertEqual({k:v for k, v in swept.items() if k[3] == '0.5'}, alone)
+
+    def test_streaming_rejects_coupled(self):
+        np.random.seed(2)
+        crn = profiles.CoupledPrefs(20, 5, 4)
+        with self.assertRaises(ValueError):
+            streaming.StreamingProfile(20, 5, 4, 0.5, 0.5, 2, 0.5, chunk_size=8).new_instance(coupled=crn)
+        with self.assertRaises(ValueError):
+            simulate.single_iter(PROFILE_PARAMS, {**ELECTION_PARAMS, 'election_rules':['borda']}, {**DEL_VOTING_PARAMS, 'delegation_style':[None]},
+                                 coupled=True, stream_chunk_size=10)
+
+    def test_derived_approvals_match_fresh(self):
+        #approvals rederived for each (app_k, app_thresh) match those of a profile created with those params from the same seed
+        for compress in [False, True]:
+            for seed in range(3):
+                np.random.seed(seed)
+                derived = profiles.Profile(60, 9, 4, 0.5, 0.5, 3, 0.5, compress=compress)
+                derived.new_instance()
+                state = np.random.get_state()
+                for app_k, app_thresh in [(3, 0.5), (1, 0.5), (9, 0.3), (2, 0.8), (5, 1.0)]:
+                    derived.set_approval_params(app_k, app_thresh, derive=True)
+                    self.assertTrue(all(np.array_equal(a, b) for a, b in zip(np.random.get_state(), state)), 'rederiving draws nothing')
+                    np.random.seed(seed)
+                    fresh = profiles.Profile(60, 9, 4, 0.5, 0.5, app_k, app_thresh, compress=compress)
+                    fresh.new_instance()
+                    params = f'compress {compress}, seed {seed}, app_k {app_k}, app_thresh {app_thresh}'
+                    np.testing.assert_array_equal(derived.get_approvals().cand_ids, fresh.get_approvals().cand_ids, err_msg=params)
+                    np.testing.assert_array_equal(derived.get_approvals().offsets, fresh.get_approvals().offsets, err_msg=params)
+                    np.testing.assert_array_equal(derived.get_approval_counts(), fresh.get_approval_counts(), err_msg=params)
+                    for rule in ['max_approval', 'rav', 'pav']: #elections from the same random state elect the same reps
+                        fresh_state = np.random.get_state()
+                        fresh_reps = rules.rule_dispatcher(rule)(fresh, 4)[0]
+                        np.random.set_state(fresh_state)
+                        np.testing.assert_array_equal(rules.rule_dispatcher(rule)(derived, 4)[0], fresh_reps, err_msg=f'{params}, {rule}')
+                    np.random.set_state(state)
+
+    def test_compressed_matches_uncompressed(self):
+        #the results that do not depend on ranking tie-breaks (shared by the voters of a type when compressed) are the same from the same seed.
+        #app_k is n_cands, so approvals are only thresholded
+        for seed in range(5):
+            instances = []
+            for compress in [False, True]:
+                np.random.seed(seed)
+                profile = profiles.Profile(200, 6, 4, 0.5, 0.5, 6, 0.5, compress=compress)
+                profile.new_instance(whalrus_orders=False)
+                instances.append(profile)
+            full, compressed = instances
+            self.assertLessEqual(compressed.get_n_ballots(), 16)
+            self.assertEqual(compressed.get_ballot_weights().sum(), 200)
+            np.testing.assert_array_equal(compressed.get_voter_majority(), full.get_voter_majority())
+            np.testing.assert_array_equal(compressed.get_approval_counts(), full.get_approval_counts())
+            np.testing.assert_array_equal(compressed.get_agreement_sums(), full.get_agreement_sums())
+            delegators = np.arange(0, 200, 3)
+            np.testing.assert_array_equal(compressed.issue_tallies(delegators), full.issue_tallies(delegators))
+            state = np.random.get_state()
+            for rule in ['random_winners', 'max_approval', 'max_agreement']:
+                agreements = []
+                for profile in instances:
+                    np.random.set_state(state)
+                    rd = d_voting.RD(profile, rule, 3, default='uniform')
+                    frd = d_voting.FRD(profile, rule, 3, del_style=None, best_k=None, n_delegators=None)
+                    frd.set_rep_ids(rd.elect_reps()[0])
+                    rd.pull_rep_prefs()
+                    agreements.append([rd.run_RD(quick=True)] + frd.run_FRD_batch([('uniform', 'incisive', None, 50), ('uniform', 'approval', None, 120)]))
+                self.assertEqual(agreements[1], agreements[0], f'seed {seed}, {rule}')
+
+if __name__ == '__main__':
+    unittest.main()
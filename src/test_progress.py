@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import frd.progress as progress
+
+def run_updates(reporter:progress.ProgressReporter, updates:list, consumed:float=None)->None:
+    '''
+    Feed (finished, worker, runtime) completion notices to the reporter, read at their completion times or all at the consumed time
+    '''
+    for finished, worker, runtime in updates:
+        with mock.patch.object(progress.time, 'time', return_value=finished if consumed is None else consumed):
+            reporter.update({'worker':worker, 'runtime':runtime, 'finished':finished})
+
+UPDATES = [(10.0, 'A', 2.0), (11.0, 'B', 2.0), (12.0, 'A', 2.0), (13.0, 'C', 5.0)]
+
+class Test_progress(unittest.TestCase):
+
+    def test_record(self):
+        reporter = progress.ProgressReporter('exp', 10, 3, interval=1e9, console=False)
+        run_updates(reporter, UPDATES)
+        record = reporter.record(16.0)
+        self.assertEqual(record['elapsed_seconds'], 5.0) #from the start of the first iteration, at 10 - 2, to the last completion
+        self.assertEqual((record['iterations_done'], record['iterations_pending']), (4, 6))
+        self.assertEqual((record['combos_done'], record['combos_pending']), (12, 18))
+        self.assertEqual(record['iterations_per_second'], 0.8)
+        self.assertEqual(record['eta_seconds'], 4.5) #7.5s at 0.8 it/s, 3s of which have passed since the last completion
+        self.assertEqual(record['worker_iterations_per_second'], {'A':0.5, 'B':0.5, 'C':0.2})
+        self.assertEqual(record['stragglers'], ['C']) #5s per iteration against a median of 2s
+
+    def test_late_consumption(self):
+        #iterations that finished while the parent waited on another experiment count at their completion times
+        on_time = progress.ProgressReporter('exp', 10, 3, interval=1e9, console=False)
+        run_updates(on_time, UPDATES)
+        late = progress.ProgressReporter('exp', 10, 3, interval=1e9, console=False)
+        run_updates(late, UPDATES[::-1], consumed=100.0)
+        self.assertEqual(late.record(100.0), on_time.record(100.0))
+        self.assertEqual(late.record(100.0)['eta_seconds'], 0.0) #overdue rather than negative
+
+    def test_record_before_start(self):
+        record = progress.ProgressReporter('exp', 10, 3, console=False).record(5.0)
+        self.assertEqual((record['iterations_per_second'], record['eta_seconds'], record['stragglers']), (0.0, None, []))
+        self.assertEqual(progress.format_seconds(None), '?')
+        self.assertEqual(progress.format_seconds(3725), '1h02m05s')
+
+    def test_progress_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            progress_file = os.path.join(tmp, 'new_dir', 'progress.jsonl')
+            reporter = progress.ProgressReporter('exp', 4, 3, progress_file=progress_file, interval=2.0, console=False)
+            reporter.last_report = 9.0
+            run_updates(reporter, UPDATES) #reports at 11 and 13, when the last report is 2s old
+            reporter.close()
+            with open(progress_file) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([(r['iterations_done'], r['finished']) for r in records], [(2, False), (4, False), (4, True)])
+            self.assertEqual(records[-1]['experiment'], 'exp')
+
+    def test_unwritable_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            blocker = os.path.join(tmp, 'file')
+            open(blocker, 'w').close()
+            with self.assertLogs(level='WARNING'):
+                reporter = progress.ProgressReporter('exp', 4, 3, progress_file=os.path.join(blocker, 'progress.jsonl'), console=False)
+            self.assertIsNone(reporter.progress_file)
+            reporter = progress.ProgressReporter('exp', 4, 3, progress_file=tmp, console=False) #a directory cannot be appended to
+            with self.assertLogs(level='WARNING'):
+                record = reporter.close()
+            self.assertTrue(record['finished'])
+            self.assertIsNone(reporter.progress_file)
+            reporter.close() #later reports skip the file
+
+if __name__ == '__main__':
+    unittest.main()
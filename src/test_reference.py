@@ -0,0 +1,64 @@
+import random
+import unittest
+import numpy as np
+
+import frd.helper as helper
+import frd.profiles as profiles
+import frd.simulate as simulate
+import frd.reference as reference
+import frd.equivalence as equivalence
+
+class Test_reference(unittest.TestCase):
+
+    def test_use_backend(self):
+        self.assertEqual(reference.get_backend(), 'fast')
+        with reference.use_backend('reference'):
+            self.assertTrue(reference.is_reference())
+        self.assertEqual(reference.get_backend(), 'fast')
+        with self.assertRaises(ValueError):
+            reference.set_backend('slow')
+
+    def test_rejects_compressed(self):
+        np.random.seed(0)
+        profile = profiles.Profile(20, 5, 4, 0.5, 0.5, 2, 0.5, compress=True)
+        profile.new_instance()
+        with self.assertRaises(ValueError):
+            reference.borda(profile, 2)
+
+    def test_exact_checks(self):
+        df = equivalence.run_exact_checks(3, 31, 8, 9, 0.5, 0.5, 3, 0.5, 4, seed=1)
+        ran = df[df['passed'].notna()] #irv is skipped where whalrus does not run
+        self.assertTrue(ran['passed'].all(), ran[ran['passed'] == False])
+
+    def test_compare_moments(self):
+        profile_params = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+        election_params = dict(election_rules=['borda', 'rav'], n_winners=[4])
+        del_voting_params = dict(default=['uniform'], delegation_style=['incisive'], best_k=[None], n_delegators=[8], mask=[None])
+        df = equivalence.compare_moments(profile_params, election_params, del_voting_params, n_iter=10, seed=2)
+        self.assertEqual(len(df), 2)
+        self.assertTrue((np.abs(df['z']) < 6).all())
+
+    def test_workers_use_backend(self):
+        #the backend is passed to the workers with the iteration options, the one set in the parent is not inherited by forkserver or spawn workers
+        params = (dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None]),
+                  dict(election_rules=['borda', 'max_approval'], n_winners=[4]),
+                  dict(default=['uniform'], delegation_style=['incisive', None], best_k=[None], n_delegators=[8], mask=[None]))
+        expected = {}
+        with reference.use_backend('reference'):
+            for i in range(4):
+                np.random.seed(helper.iteration_seed(1, i))
+                random.seed(helper.iteration_seed(1, i))
+                helper.append_dict_values(expected, simulate.single_iter(*params))
+        with simulate.WorkerPool(n_workers=1, start_method='spawn') as pool:
+            data = simulate.sim_parallel(4, *params, save=False, seed=1, pool=pool, progress_interval=None, backend='reference')[0]
+            with reference.use_backend('reference'): #defaults to the parent's backend
+                inherited = simulate.sim_parallel(4, *params, save=False, seed=1, pool=pool, progress_interval=None)[0]
+            fast = simulate.sim_parallel(4, *params, save=False, seed=1, pool=pool, progress_interval=None)[0]
+        self.assertEqual(data, expected)
+        self.assertEqual(inherited, expected)
+        self.assertNotEqual(fast, expected) #the reference backend breaks ties with other draws
+        with self.assertRaises(ValueError):
+            simulate.ExperimentRun(None, 2, *params, save=False, backend='slow')
+
+if __name__ == '__main__':
+    unittest.main()
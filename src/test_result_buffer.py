@@ -0,0 +1,80 @@
+import random
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+import numpy as np
+
+import frd.helper as helper
+import frd.result_buffer as result_buffer
+import frd.save_data as save_data
+import frd.simulate as simulate
+
+PROFILE_PARAMS = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda'], n_winners=[4, 9])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive'], best_k=[None], n_delegators=[8], mask=[None])
+
+def detach_all():
+    while result_buffer._attached:
+        result_buffer._attached.popitem()[1].release()
+
+class Test_result_buffer(unittest.TestCase):
+
+    def tearDown(self):
+        detach_all()
+
+    def test_create_attach_write(self):
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        keys = result_buffer.combo_keys(*params)
+        self.assertEqual([k[9] for k in keys], ['4', '9'])
+        buffer = result_buffer.ResultBuffer.create(keys, 3)
+        try:
+            self.assertTrue(np.isnan(buffer.array).all())
+            attached = result_buffer.ResultBuffer.attach(buffer.get_name(), buffer.shape, *params)
+            attached.write({keys[0]:[0.5]}, 2)
+            attached.write({keys[0]:[0.25]}, 0)
+            np.testing.assert_array_equal(buffer.array[0], [0.25, np.nan, 0.5]) #written through the shared segment
+            self.assertEqual(list(buffer.to_data()), [keys[0]]) #the skipped combination (9 reps of 8 cands) is dropped
+        finally:
+            detach_all()
+            buffer.release()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=buffer.get_name())
+
+    def test_attachments_cached_per_buffer(self):
+        #experiments interleaving on a shared pool do not make workers detach and reattach
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        buffers = [result_buffer.ResultBuffer.create(result_buffer.combo_keys(*params), 2) for _ in range(result_buffer.MAX_ATTACHED + 1)]
+        try:
+            first, second = [result_buffer.ResultBuffer.attach(b.get_name(), b.shape, *params) for b in buffers[:2]]
+            self.assertIs(result_buffer.ResultBuffer.attach(buffers[0].get_name(), buffers[0].shape, *params), first)
+            self.assertIs(result_buffer.ResultBuffer.attach(buffers[1].get_name(), buffers[1].shape, *params), second)
+            for b in buffers[2:]:
+                result_buffer.ResultBuffer.attach(b.get_name(), b.shape, *params)
+            self.assertEqual(len(result_buffer._attached), result_buffer.MAX_ATTACHED)
+            self.assertNotIn(buffers[0].get_name(), result_buffer._attached) #least recently used
+            self.assertIn(buffers[1].get_name(), result_buffer._attached)
+        finally:
+            detach_all()
+            for b in buffers: b.release()
+
+    def test_experiment_buffer(self):
+        #the segment is freed once the experiment finishes, and the data saved matches iterations run in this process
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        with tempfile.TemporaryDirectory() as data_dir, simulate.WorkerPool(n_workers=1) as pool:
+            run = simulate.ExperimentRun(pool, 5, *params, experiment_name='buf', data_dir=data_dir, seed=2, progress_interval=None)
+            name = run.buffer.get_name()
+            data, _, _, _, filename = run.finish()
+            self.assertIsNone(run.buffer)
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+            saved = save_data.unpickle_data(filename, data_dir=data_dir)
+        expected = {}
+        for i in range(5):
+            np.random.seed(helper.iteration_seed(2, i))
+            random.seed(helper.iteration_seed(2, i))
+            helper.append_dict_values(expected, simulate.single_iter(*params))
+        self.assertEqual(saved, expected)
+        self.assertEqual(data, expected)
+
+if __name__ == '__main__':
+    unittest.main()
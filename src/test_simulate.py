@@ -0,0 +1,65 @@
+import json
+import tempfile
+import unittest
+import numpy as np
+
+import frd.simulate as simulate
+
+PROFILE_PARAMS = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda'], n_winners=[4])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive'], best_k=[None], n_delegators=[8], mask=[None])
+
+class Test_simulate(unittest.TestCase):
+
+    def test_stream_rejects_compress(self):
+        with self.assertRaises(ValueError):
+            simulate.single_iter(PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, compress=True, stream_chunk_size=10)
+        with self.assertRaises(ValueError):
+            simulate.ExperimentRun(None, 2, PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, save=False, compress=True, stream_chunk_size=10)
+        np.random.seed(0)
+        self.assertEqual(len(simulate.single_iter(PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS, stream_chunk_size=10)), 1)
+
+    def test_shared_pool_matches_separate(self):
+        #seeded iterations give the same data whether each experiment starts its own workers or they share one pool
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        separate = [simulate.sim_parallel(n, *params, save=False, seed=s, progress_interval=None)[0] for s, n in [(1, 6), (2, 3)]]
+        with simulate.WorkerPool(n_workers=2) as pool:
+            runs = [simulate.ExperimentRun(pool, n, *params, save=False, seed=s, progress_interval=None) for s, n in [(1, 6), (2, 3)]]
+            shared = [run.finish()[0] for run in runs]
+        self.assertEqual(shared, separate)
+        self.assertEqual([len(v) for v in shared[0].values()], [6])
+
+    def test_pool_starts_lazily(self):
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with simulate.WorkerPool(n_workers=1) as pool:
+                self.assertIsNone(pool.pool)
+                data = simulate.ExperimentRun(pool, 4, *params, save=False, seed=3, cache_dir=cache_dir, progress_interval=None).finish()[0]
+                self.assertIsNotNone(pool.pool)
+            with simulate.WorkerPool(n_workers=1) as pool: #every iteration is cached, so no worker is started
+                cached = simulate.ExperimentRun(pool, 4, *params, save=False, seed=3, cache_dir=cache_dir, progress_interval=None).finish()[0]
+                self.assertIsNone(pool.pool)
+        self.assertEqual(cached, data)
+
+    def test_scheduled_combos(self):
+        #the combinations single_iter skips are not counted as pending in the progress reports
+        profile_params = {**PROFILE_PARAMS, 'n_voters':[6, 31]}
+        election_params = {**ELECTION_PARAMS, 'n_winners':[4, 9]}
+        del_voting_params = {**DEL_VOTING_PARAMS, 'delegation_style':['incisive', None], 'best_k':[None, 2, 5], 'n_delegators':[8]}
+        np.random.seed(1)
+        data = simulate.single_iter(profile_params, election_params, del_voting_params)
+        self.assertEqual(simulate.n_scheduled_combos(profile_params, election_params, del_voting_params), len(data))
+        self.assertEqual(len(data), 4) #31 voters, 4 winners, best_k None or 2, both styles
+
+    def test_progress_counts_scheduled_combos(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            progress_file = tmp + '/progress.jsonl'
+            with simulate.WorkerPool(n_workers=1) as pool:
+                simulate.sim_parallel(2, PROFILE_PARAMS, ELECTION_PARAMS, {**DEL_VOTING_PARAMS, 'n_delegators':[8, 40]}, save=False, seed=1, pool=pool,
+                                      progress_file=progress_file, progress_interval=1e9)
+            with open(progress_file) as f:
+                record = json.loads(f.readlines()[-1])
+        self.assertEqual((record['combos_done'], record['combos_pending'], record['finished']), (2, 0, True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import pstats
+import tempfile
+import unittest
+import numpy as np
+
+import frd.worker_profiling as worker_profiling
+import frd.simulate as simulate
+
+PROFILE_PARAMS = dict(n_voters=[31], n_cands=[8], n_issues=[9], voters_p=[0.5], cands_p=[0.5], app_k=[3], app_thresh=[0.5], intensity_dist=[None])
+ELECTION_PARAMS = dict(election_rules=['borda'], n_winners=[4])
+DEL_VOTING_PARAMS = dict(default=['uniform'], delegation_style=['incisive'], best_k=[None], n_delegators=[8], mask=[None])
+
+def work(n:int)->int:
+    return sum(i*i for i in range(n))
+
+class Test_worker_profiling(unittest.TestCase):
+
+    def test_choose_profiled_iters(self):
+        self.assertEqual(worker_profiling.choose_profiled_iters(range(10), 0.0), set())
+        self.assertEqual(worker_profiling.choose_profiled_iters(range(5, 5), 0.5), set())
+        self.assertEqual(len(worker_profiling.choose_profiled_iters(range(10), 0.01)), 1) #at least one
+        np.random.seed(0)
+        state = np.random.get_state()
+        chosen = worker_profiling.choose_profiled_iters(range(10, 30), 0.25)
+        self.assertTrue(len(chosen) == 5 and chosen <= set(range(10, 30)))
+        self.assertEqual(worker_profiling.choose_profiled_iters(range(10, 30), 0.25), chosen)
+        self.assertTrue(all(np.array_equal(a, b) for a, b in zip(np.random.get_state(), state))) #numpy's random state is untouched
+        with self.assertRaises(ValueError):
+            worker_profiling.choose_profiled_iters(range(10), 1.5)
+
+    def test_merge_profiles(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            files = [worker_profiling.profile_file(profile_dir, 'exp', i) for i in range(3)]
+            for n, f in zip([1000, 2000, 3000], files):
+                self.assertEqual(worker_profiling.run_profiled(work, f, n), work(n))
+            statsfile, reportfile = worker_profiling.merge_profiles(files + [os.path.join(profile_dir, 'missing.prof')], 'exp', profile_dir)
+            self.assertEqual(sorted(os.listdir(profile_dir)), ['exp_workers.pstats', 'exp_workers_profile.txt']) #per-iteration files removed
+            calls = {func[2]:stat[1] for func, stat in pstats.Stats(statsfile).stats.items()}
+            self.assertEqual(calls['work'], 3) #one call per merged iteration
+            with open(reportfile) as f:
+                self.assertTrue(f.readline().startswith('Merged cProfile stats from 3 worker iterations of experiment exp'))
+            with self.assertLogs(level='WARNING'):
+                self.assertEqual(worker_profiling.merge_profiles(files, 'exp', profile_dir), (None, None))
+
+    def test_profiled_experiment(self):
+        #profiling iterations in the workers does not change the results
+        params = (PROFILE_PARAMS, ELECTION_PARAMS, DEL_VOTING_PARAMS)
+        with tempfile.TemporaryDirectory() as profile_dir, simulate.WorkerPool(n_workers=1) as pool:
+            profiled = simulate.sim_parallel(6, *params, save=False, experiment_name='exp', profile_frac=0.5, profile_dir=profile_dir, seed=1, pool=pool, progress_interval=None)[0]
+            self.assertEqual(sorted(os.listdir(profile_dir)), ['exp_workers.pstats', 'exp_workers_profile.txt'])
+            self.assertEqual(sum(stat[0] for func, stat in pstats.Stats(os.path.join(profile_dir, 'exp_workers.pstats')).stats.items() if func[2] == 'single_iter'), 3)
+            plain = simulate.sim_parallel(6, *params, save=False, seed=1, pool=pool, progress_interval=None)[0]
+        self.assertEqual(profiled, plain)
+
+if __name__ == '__main__':
+    unittest.main()